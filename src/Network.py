@@ -9,7 +9,6 @@ https://guillaumegenthial.github.io/sequence-tagging-with-tensorflow.html
 import logging
 import os
 import time
-import cPickle as pkl
 
 import math
 import numpy as np
@@ -21,9 +20,11 @@ from config.HiddenLayerConfig import HiddenLayerConfig
 from config.TaskConfig import TaskConfig
 from constants import CLASSIFIER_CRF, DATA_TYPE_TRAIN, DATA_TYPE_DEV, TOKEN_PADDING, PREFIX_MODEL_WEIGHTS, \
     CHAR_CNN, CHAR_LSTM, DIR_TENSOR_BOARD, ITERATION_RANDOM_ALL, ITERATION_RANDOM_FAIR, \
-    ITERATION_SEQUENTIAL_ALL, ITERATION_SEQUENTIAL_FAIR
+    ITERATION_SEQUENTIAL_ALL, ITERATION_SEQUENTIAL_FAIR, ITERATION_RANDOM_PROPORTIONAL, ITERATION_RANDOM_TEMPERATURE
 from data.Batch import Batch
-from data.Batches import Batches
+from data.Batches import load_batches, find_joint_task_groups, iterate_mixed_batches
+from data.prefetch import prefetch
+from data.preprocess import oov_bucket_tokens
 from eval.ResultList import ResultList
 from network.BaseNeuralNetwork import BaseNeuralNetwork
 from util import append_to_csv
@@ -56,9 +57,19 @@ class Network(BaseNeuralNetwork):
         self._input_word = None
         self._input_characters = None
         self._inputs_label = {}
+        # Rows of a mixed batch that belong to each task (only used if `mixed_batches` is configured)
+        self._task_row_masks = {}
         self._input_sequence_length = None
         self._input_word_length = None
+        # Input queue (only used if `use_input_queue` is configured)
+        self._enqueue = None
+        self._enqueue_placeholders = []
+        self._queue_components = {}
+        # Feed-ready prediction inputs for each data type (built on first use and kept across epochs)
+        self._prediction_inputs = {}
         self._embeddings_layer = None
+        self._embeddings_variable = None
+        self._embeddings_placeholder = None
         self._shared_layers_output = {}
         self._projections = {}
         self._losses = {}
@@ -67,6 +78,14 @@ class Network(BaseNeuralNetwork):
         self._transition_params = {}
         self._operations_train = {}
         self._gradient_norms = {}
+        # Train operations for tasks that are trained on the same sentences (keyed by the first task of each group)
+        self._joint_losses = {}
+        self._joint_operations_train = {}
+        self._joint_gradient_norms = {}
+        # Train operation for the weighted sum of all task losses (only used if `mixed_batches` is configured)
+        self._mixed_loss = None
+        self._mixed_operation_train = None
+        self._mixed_gradient_norm = None
 
         # dropout placeholders
         self._rnn_dropout_input_keep_probability = None
@@ -102,6 +121,73 @@ class Network(BaseNeuralNetwork):
         logger.debug("Build global variable initialization node.")
         self._init = tf.global_variables_initializer()
 
+    def _get_saver(self):
+        """
+        Create a saver for all variables but the frozen pre-trained embeddings.
+        The embeddings are stored once per experiment by the configuration and do not need to be part of the
+        checkpoints.
+
+        Returns:
+            tf.train.Saver: The saver
+        """
+        return tf.train.Saver(var_list=[
+            variable
+            for variable
+            in tf.global_variables()
+            if variable is not self._embeddings_variable
+        ])
+
+    def _get_init_feed_dict(self):
+        """
+        Get the `feed_dict` required to initialize the variables, i.e. the pre-trained embeddings if there are any.
+
+        Returns:
+            dict: The `feed_dict` for the initialization
+        """
+        if self._embeddings_placeholder is None:
+            return {}
+
+        return {self._embeddings_placeholder: self.config.embedding_weights}
+
+    def _get_input_queue_depth(self):
+        """
+        Get the number of batches that are enqueued in advance if the input queue is used.
+
+        Returns:
+            int: Number of batches
+        """
+        return max(self.config.prefetch_batches, 1)
+
+    def _enqueue_inputs(self, sess, items):
+        """
+        Move the network inputs of `feed_dict`s into the input queue in a background thread.
+        The graph dequeues the inputs in the same order in which the items are returned, i.e. each item has to be used
+        for exactly one `sess.run` call that depends on the inputs.
+
+        Args:
+            sess (object): Tensorflow session
+            items (iterable of tuple): Tuples consisting of an arbitrary payload and a `feed_dict`
+
+        Returns:
+            generator: A generator of tuples consisting of the payload and the remaining `feed_dict` (without the
+                inputs, e.g. the dropout keep probabilities).
+        """
+        def enqueue():
+            for payload, feed_dict in items:
+                enqueue_feed_dict = {}
+                for tensor in feed_dict.keys():
+                    if tensor in self._queue_components:
+                        placeholder = self._enqueue_placeholders[self._queue_components[tensor]]
+                        # The labels of further tasks of a joint batch share the component and are fed directly
+                        if placeholder not in enqueue_feed_dict:
+                            enqueue_feed_dict[placeholder] = feed_dict.pop(tensor)
+
+                sess.run(self._enqueue, feed_dict=enqueue_feed_dict)
+                yield payload, feed_dict
+
+        # The queue has room for two more batches than are prefetched so that the enqueue operation never blocks
+        return prefetch(enqueue(), self._get_input_queue_depth())
+
     def _build_placeholders(self):
         """
         Build placeholder nodes, i.e. nodes for the network input.
@@ -109,28 +195,75 @@ class Network(BaseNeuralNetwork):
         logger = logging.getLogger("%s.Network._build_placeholders" % self.config.name)
         logger.debug("Creating placeholders")
 
+        input_shapes = [
+            # word indices, shape = (batch size, max length of sentence in batch)
+            [None, None],
+            # label indices, shape = (batch size, max length of sentence in batch)
+            [None, None],
+            # sequence lengths, shape = (batch size)
+            [None],
+        ]
+        if self.config.character_level_information:
+            input_shapes += [
+                # character indices, shape = (batch size, max length of sentence in batch, max length of word in batch)
+                [None, None, None],
+                # word lengths, shape = (batch size, max length of sentence in batch)
+                [None, None],
+            ]
+
+        if self.config.use_input_queue:
+            # The inputs are enqueued by a background thread and dequeued by the TensorFlow runtime for each step.
+            # They are still placeholders (with a default value), i.e. they can be fed as well.
+            capacity = self._get_input_queue_depth() + 2
+            logger.debug("Creating input queue with capacity %d", capacity)
+            queue = tf.FIFOQueue(capacity, [tf.int32] * len(input_shapes), name="input_queue")
+            self._enqueue_placeholders = [
+                tf.placeholder(tf.int32, shape=shape, name="enqueue_input_%d" % idx)
+                for idx, shape
+                in enumerate(input_shapes)
+            ]
+            self._enqueue = queue.enqueue(self._enqueue_placeholders)
+            dequeued = queue.dequeue()
+
+            def create_input(component, name):
+                placeholder = tf.placeholder_with_default(dequeued[component], input_shapes[component], name=name)
+                self._queue_components[placeholder] = component
+                return placeholder
+        else:
+            def create_input(component, name):
+                return tf.placeholder(tf.int32, shape=input_shapes[component], name=name)
+
         # Placeholder for word inputs
         # shape = (batch size, max length of sentence in batch)
-        self._input_word = tf.placeholder(tf.int32, shape=[None, None], name="word_indices")
+        self._input_word = create_input(0, "word_indices")
 
         # Placeholder for sequence length input
         # shape = (batch size)
-        self._input_sequence_length = tf.placeholder(tf.int32, shape=[None], name="sequence_lengths")
+        self._input_sequence_length = create_input(2, "sequence_lengths")
 
         # Placeholder for label input (separate input for each task)
         # shape = (batch size, max length of sentence in batch)
         self._inputs_label = {
-            task.name: tf.placeholder(tf.int32, shape=[None, None], name="label_indices_%s" % task.name)
+            task.name: create_input(1, "label_indices_%s" % task.name)
             for task in self.config.tasks
         }
 
-        # Placeholder for character inputs
-        # shape = (batch size, max length of sentence in batch, max length of word in batch)
-        self._input_characters = tf.placeholder(tf.int32, shape=[None, None, None], name="character_indices")
+        if self.config.mixed_batches:
+            # Placeholder for the rows of a mixed batch that belong to the task (1.0) and to other tasks (0.0)
+            # shape = (batch size)
+            self._task_row_masks = {
+                task.name: tf.placeholder(tf.float32, shape=[None], name="row_mask_%s" % task.name)
+                for task in self.config.tasks
+            }
 
-        # Placeholder for word lengths
-        # shape = (batch size, max length of sentence in batch)
-        self._input_word_length = tf.placeholder(tf.int32, shape=[None, None], name="word_lengths")
+        if self.config.character_level_information:
+            # Placeholder for character inputs
+            # shape = (batch size, max length of sentence in batch, max length of word in batch)
+            self._input_characters = create_input(3, "character_indices")
+
+            # Placeholder for word lengths
+            # shape = (batch size, max length of sentence in batch)
+            self._input_word_length = create_input(4, "word_lengths")
 
         # Placeholder for dropout keep probabilities
         self._rnn_dropout_input_keep_probability = tf.placeholder(tf.float32, name="rnn_dropout_input_keep_probability")
@@ -217,12 +350,24 @@ class Network(BaseNeuralNetwork):
         with tf.variable_scope("words"):
             if self.config.embedding_weights is not None:
                 logger.debug("Using pre-trained embeddings")
+                # The weights are fed through a placeholder when the variable is initialized. Otherwise they would be
+                # stored as a constant in the graph definition.
+                self._embeddings_placeholder = tf.placeholder(
+                    tf.float32,
+                    shape=self.config.embedding_weights.shape,
+                    name="embeddings_placeholder"
+                )
                 embeddings_variable = tf.Variable(
-                    self.config.embedding_weights,
+                    self._embeddings_placeholder,
                     name="embeddings_variable",
                     dtype=tf.float32,
                     trainable=False
                 )
+                self._embeddings_variable = embeddings_variable
+                embeddings_layer = tf.nn.embedding_lookup(embeddings_variable, self._input_word)
+
+                if self.config.num_oov_buckets > 0:
+                    embeddings_layer = self._build_oov_bucket_embeddings(embeddings_layer)
             else:
                 logger.debug("Using randomly initialized embeddings")
                 embeddings_variable = tf.get_variable(
@@ -231,12 +376,9 @@ class Network(BaseNeuralNetwork):
                     # Hardcoded 300 dimensional embeddings if no pre-trained embeddings are used
                     shape=[len(self.config.word2idx), 300]
                 )
+                embeddings_layer = tf.nn.embedding_lookup(embeddings_variable, self._input_word)
 
-            self._embeddings_layer = tf.nn.embedding_lookup(
-                embeddings_variable,
-                self._input_word,
-                name="word_embeddings"
-            )
+            self._embeddings_layer = tf.identity(embeddings_layer, name="word_embeddings")
 
         if self.config.character_level_information:
             logger.debug("Concatenating word and character-level information")
@@ -247,6 +389,36 @@ class Network(BaseNeuralNetwork):
 
         self._embeddings_layer = tf.nn.dropout(self._embeddings_layer, self._word_dropout_keep_probability)
 
+    def _build_oov_bucket_embeddings(self, embeddings_layer):
+        """
+        Replace the (randomly initialized) rows of the out-of-vocabulary buckets in the frozen pre-trained embeddings
+        by a trainable variable. The buckets are only useful if their embeddings are learned, but a trainable copy of
+        the whole embedding matrix would be too large.
+
+        Args:
+            embeddings_layer (tf.Tensor): Looked up frozen embeddings with shape (batch size, sequence length, size)
+
+        Returns:
+            tf.Tensor: The embeddings with the rows of the buckets taken from the trainable variable
+        """
+        num_buckets = self.config.num_oov_buckets
+        # The buckets have consecutive indices (see `ExperimentConfig.prepare`)
+        first_bucket = self.config.word2idx[oov_bucket_tokens(num_buckets)[0]]
+
+        bucket_variable = tf.Variable(
+            self._embeddings_placeholder[first_bucket:first_bucket + num_buckets],
+            name="oov_bucket_embeddings_variable",
+            dtype=tf.float32
+        )
+
+        bucket_ids = self._input_word - first_bucket
+        in_bucket = tf.logical_and(bucket_ids >= 0, bucket_ids < num_buckets)
+        bucket_layer = tf.nn.embedding_lookup(bucket_variable, tf.clip_by_value(bucket_ids, 0, num_buckets - 1))
+
+        # Select the rows with a mask instead of `tf.where` so that the condition does not have to be broadcast
+        mask = tf.expand_dims(tf.cast(in_bucket, tf.float32), -1)
+        return embeddings_layer * (1.0 - mask) + bucket_layer * mask
+
     def _build_shared_layers(self):
         """
         Build the shared layers. The number of layers and their size depends on the configuration.
@@ -385,7 +557,13 @@ class Network(BaseNeuralNetwork):
                     self._inputs_label[task.name],
                     self._input_sequence_length
                 )
-            self._losses[task.name] = tf.reduce_mean(-log_likelihood)
+            if self._task_row_masks:
+                # Mixed batch: only the rows of the task count
+                row_mask = self._task_row_masks[task.name]
+                self._losses[task.name] = tf.reduce_sum(-log_likelihood * row_mask) / \
+                    tf.maximum(tf.reduce_sum(row_mask), 1.0)
+            else:
+                self._losses[task.name] = tf.reduce_mean(-log_likelihood)
         else:
             # Softmax
             logger.debug("Softmax classifier")
@@ -410,9 +588,19 @@ class Network(BaseNeuralNetwork):
                 name="softmax_%s" % task.name
             )
             # Add Mask for padded sentences
-            mask = tf.sequence_mask(self._input_sequence_length, name="softmax_mask_%s" % task.name)
-            losses = tf.boolean_mask(losses, mask, name="softmax_mask_layer_%s" % task.name)
-            self._losses[task.name] = tf.reduce_mean(losses)
+            # The mask has the width of the padded batch even if no sentence of the batch reaches this width
+            mask = tf.sequence_mask(
+                self._input_sequence_length,
+                maxlen=tf.shape(losses)[1],
+                name="softmax_mask_%s" % task.name
+            )
+            if self._task_row_masks:
+                # Mixed batch: only the tokens of the rows of the task count
+                weights = tf.cast(mask, tf.float32) * tf.expand_dims(self._task_row_masks[task.name], -1)
+                self._losses[task.name] = tf.reduce_sum(losses * weights) / tf.maximum(tf.reduce_sum(weights), 1.0)
+            else:
+                losses = tf.boolean_mask(losses, mask, name="softmax_mask_layer_%s" % task.name)
+                self._losses[task.name] = tf.reduce_mean(losses)
 
 
     def _build_optimizers(self):
@@ -423,20 +611,55 @@ class Network(BaseNeuralNetwork):
 
         for task in self.config.tasks:
             logger.debug("Attaching optimizer for task %s" % task.name)
-            optimizer_function = OPTIMIZER_MAPPING[self.config.training.optimizer]
-            optimizer = optimizer_function(**self.config.training.optimizer_params)
+            self._operations_train[task.name], self._gradient_norms[task.name] = self._build_train_operation(
+                self._losses[task.name], task.name, logger
+            )
 
-            gradients, variables = zip(*optimizer.compute_gradients(self._losses[task.name]))
+        if self.config.joint_training:
+            # Tasks that are trained on the same sentences share one training step (see `Batches`)
+            for task_names in find_joint_task_groups(self.config):
+                logger.debug("Attaching joint optimizer for tasks %s" % ", ".join(task_names))
+                self._joint_losses[task_names[0]] = tf.add_n([self._losses[task_name] for task_name in task_names])
+                self._joint_operations_train[task_names[0]], self._joint_gradient_norms[task_names[0]] = \
+                    self._build_train_operation(self._joint_losses[task_names[0]], "-".join(task_names), logger)
+
+        if self.config.mixed_batches:
+            # Tasks that are missing in a mixed batch have a loss of 0 (see `_build_task_prediction`)
+            logger.debug("Attaching optimizer for the weighted sum of all task losses")
+            self._mixed_loss = tf.add_n([
+                task.loss_weight * self._losses[task.name]
+                for task in self.config.tasks
+            ])
+            self._mixed_operation_train, self._mixed_gradient_norm = self._build_train_operation(
+                self._mixed_loss, "-".join([task.name for task in self.config.tasks]), logger
+            )
 
-            if self.config.training.use_gradient_clipping:
-                logger.debug("Adding node for performing gradient clipping for task %s.", task.name)
-                gradients, self._gradient_norms[task.name] = tf.clip_by_global_norm(
-                    gradients, self.config.training.clip_norm
-                )
-            else:
-                self._gradient_norms[task.name] = tf.global_norm(gradients)
+    def _build_train_operation(self, loss, name, logger):
+        """
+        Attach an optimizer that minimizes the loss to the graph.
+
+        Args:
+            loss (tf.Tensor): The loss
+            name (str): Name of the task(s) for logging
+            logger (Logger): A logger instance
+
+        Returns:
+            `tuple` of tf.Tensor: The train operation and the global norm of the gradients
+        """
+        optimizer_function = OPTIMIZER_MAPPING[self.config.training.optimizer]
+        optimizer = optimizer_function(**self.config.training.optimizer_params)
+
+        gradients, variables = zip(*optimizer.compute_gradients(loss))
+
+        if self.config.training.use_gradient_clipping:
+            logger.debug("Adding node for performing gradient clipping for task %s.", name)
+            gradients, gradient_norm = tf.clip_by_global_norm(
+                gradients, self.config.training.clip_norm
+            )
+        else:
+            gradient_norm = tf.global_norm(gradients)
 
-            self._operations_train[task.name] = optimizer.apply_gradients(zip(gradients, variables))
+        return optimizer.apply_gradients(zip(gradients, variables)), gradient_norm
 
     def build(self):
         """
@@ -470,8 +693,8 @@ class Network(BaseNeuralNetwork):
         if logger is None:
             logger = logging.getLogger("%s.Network._pre_process_input" % self.config.name)
 
-        # NOTE: it is assumed that all sentences within a batch are of the same length.
-        #       See implementation of Batches for further information.
+        # NOTE: sentences within a batch are padded to the same length if length buckets are used. The true lengths are
+        #       fed as sequence lengths. See implementation of Batches for further information.
 
         # Special case for sentences of length 1
         sentences, labels = pad_sentences_of_length_one(batch.tokens, batch.labels, self.config.word2idx)
@@ -511,6 +734,131 @@ class Network(BaseNeuralNetwork):
 
         return feed_dict
 
+    def _create_train_feed_dict(self, task_name, batch, logger=None, verbose=False):
+        """
+        Create the `feed_dict` for a training step, i.e. the network input including the dropout settings.
+
+        Args:
+            task_name (str): Name of the task the batch belongs to
+            batch (Batch): A batch object containing the batch's samples.
+            logger (Logger, optional): A logger instance
+            verbose (bool, optional): Whether to log something or not
+
+        Returns:
+            dict: `feed_dict` for the Tensorflow network
+        """
+        assert isinstance(batch, Batch)
+        if verbose:
+            logger.debug("Running batch from task %s", task_name)
+
+        feed_dict = self._pre_process_input(task_name, batch, logger, verbose=verbose)
+
+        # Add dropout
+        feed_dict[self._rnn_dropout_input_keep_probability] = self.config.rnn_dropout_input_keep_probability
+        feed_dict[self._rnn_dropout_output_keep_probability] = self.config.rnn_dropout_output_keep_probability
+        feed_dict[self._rnn_dropout_state_keep_probability] = self.config.rnn_dropout_state_keep_probability
+        feed_dict[self._word_dropout_keep_probability] = self.config.word_dropout_keep_probability
+        feed_dict[self._task_dropout[task_name]] = self._task_by_name[task_name].dropout_keep_probability
+
+        if batch.task_labels:
+            # Joint batch: add the labels of the further tasks that are trained on the same sentences
+            for joint_task_name, joint_labels in batch.task_labels.items():
+                # Special case for sentences of length 1
+                _, joint_labels = pad_sentences_of_length_one(batch.tokens, joint_labels, self.config.word2idx)
+                feed_dict[self._inputs_label[joint_task_name]] = joint_labels
+                feed_dict[self._task_dropout[joint_task_name]] = \
+                    self._task_by_name[joint_task_name].dropout_keep_probability
+
+        # for task_name in self._task_dropout:
+        #     feed_dict[self._task_dropout[task_name]] = self._task_by_name[task_name].dropout_keep_probability
+
+        return feed_dict
+
+    def _create_mixed_train_feed_dict(self, items, logger=None, verbose=False):
+        """
+        Create the `feed_dict` for a training step on a mixed batch, i.e. on batches of several tasks at once.
+        The sentences of all batches are stacked into one (padded) batch and the rows of each task are marked by its
+        row mask. Tasks that are not part of the mixed batch get empty row masks.
+
+        Args:
+            items (`list` of tuple): Tuples consisting of the task name and the batch (see `iterate_mixed_batches`)
+            logger (Logger, optional): A logger instance
+            verbose (bool, optional): Whether to log something or not
+
+        Returns:
+            dict: `feed_dict` for the Tensorflow network
+        """
+        if verbose:
+            logger.debug("Running mixed batch from tasks %s", ", ".join([task_name for task_name, _ in items]))
+
+        num_rows = sum([batch.tokens.shape[0] for _, batch in items])
+        # Sentences of length 1 are padded (see `pad_sentences_of_length_one`)
+        width = max([2] + [batch.tokens.shape[1] for _, batch in items])
+
+        tokens = np.full((num_rows, width), self.config.word2idx[TOKEN_PADDING], dtype=np.int32)
+        sequence_lengths = np.zeros(num_rows, dtype=np.int32)
+        labels = {task.name: np.zeros((num_rows, width), dtype=np.int32) for task in self.config.tasks}
+        row_masks = {task.name: np.zeros(num_rows, dtype=np.float32) for task in self.config.tasks}
+
+        characters = None
+        word_lengths = None
+        if self.config.character_level_information:
+            word_length = max([batch.characters.shape[2] for _, batch in items])
+            characters = np.full(
+                (num_rows, width, word_length),
+                self.config.char2idx[TOKEN_PADDING],
+                dtype=np.int32
+            )
+            word_lengths = np.zeros((num_rows, width), dtype=np.int32)
+
+        start = 0
+        for task_name, batch in items:
+            assert isinstance(batch, Batch)
+            end = start + batch.tokens.shape[0]
+            length = batch.tokens.shape[1]
+
+            tokens[start:end, :length] = batch.tokens
+            sequence_lengths[start:end] = batch.sequence_lengths
+
+            # Joint batches hold the labels of further tasks for the same sentences
+            batch_labels = {task_name: batch.labels}
+            batch_labels.update(batch.task_labels or {})
+            for label_task_name, task_labels in batch_labels.items():
+                labels[label_task_name][start:end, :length] = task_labels
+                row_masks[label_task_name][start:end] = 1.0
+
+            if characters is not None:
+                characters[start:end, :length, :batch.characters.shape[2]] = batch.characters
+                word_lengths[start:end, :length] = batch.word_lengths
+
+            start = end
+
+        if verbose:
+            logger.debug(" - Batch size is %d", num_rows)
+            logger.debug(" - Sequence length is %d", width)
+
+        feed_dict = {
+            self._input_word: tokens,
+            self._input_sequence_length: sequence_lengths,
+        }
+
+        for task in self.config.tasks:
+            feed_dict[self._inputs_label[task.name]] = labels[task.name]
+            feed_dict[self._task_row_masks[task.name]] = row_masks[task.name]
+            feed_dict[self._task_dropout[task.name]] = task.dropout_keep_probability
+
+        if characters is not None:
+            feed_dict[self._input_characters] = characters
+            feed_dict[self._input_word_length] = word_lengths
+
+        # Add dropout
+        feed_dict[self._rnn_dropout_input_keep_probability] = self.config.rnn_dropout_input_keep_probability
+        feed_dict[self._rnn_dropout_output_keep_probability] = self.config.rnn_dropout_output_keep_probability
+        feed_dict[self._rnn_dropout_state_keep_probability] = self.config.rnn_dropout_state_keep_probability
+        feed_dict[self._word_dropout_keep_probability] = self.config.word_dropout_keep_probability
+
+        return feed_dict
+
     @staticmethod
     def _get_tf_sess_config():
         """
@@ -557,7 +905,7 @@ class Network(BaseNeuralNetwork):
 
         # NOTE: chosen to be float("-inf") so that the first epoch always saves the model
         best_score = float("-inf")
-        saver = tf.train.Saver()
+        saver = self._get_saver()
         model_out_path = os.path.join(self._paths["runs"][self._run_idx]["model"], PREFIX_MODEL_WEIGHTS)
         logger.debug("Best model weights will be stored in %s", self._paths["runs"][self._run_idx]["model"])
         logger.debug("The full path with prefix for model storage is %s", model_out_path)
@@ -567,12 +915,14 @@ class Network(BaseNeuralNetwork):
         num_actual_epochs = 0
         stopped_early = False
 
-        batches = Batches(self.config, data_type=DATA_TYPE_TRAIN)
+        batches = load_batches(self.config, self._paths["batches_cache"], data_type=DATA_TYPE_TRAIN)
+        # Cached batches are shared by all runs --> compose different batches in each run and each epoch
+        shuffle_seed = np.random.randint(np.iinfo(np.int32).max)
         logger.debug("Loaded batches of training data.")
 
         with tf.Session(config=self._get_tf_sess_config()) as sess:
             logger.debug("Initialize the network")
-            sess.run(self._init)
+            sess.run(self._init, feed_dict=self._get_init_feed_dict())
 
             logger.debug("Logging the network graph")
             tf_writer = tf.summary.FileWriter(
@@ -588,6 +938,7 @@ class Network(BaseNeuralNetwork):
                 logger.info("Running epoch %d of %d epochs", epoch + 1, epochs)
                 logger.info("*" * 80)
 
+                batches.reshuffle((shuffle_seed + epoch) % 2 ** 32)
                 num_batches = batches.find_total_num_batches()
                 num_finished_batches = 0
 
@@ -599,33 +950,64 @@ class Network(BaseNeuralNetwork):
                     iteration_generator = batches.iterate_tasks()
                 elif self.config.curriculum == ITERATION_SEQUENTIAL_FAIR:
                     iteration_generator = batches.iterate_batches()
+                elif self.config.curriculum == ITERATION_RANDOM_PROPORTIONAL:
+                    iteration_generator = batches.iterate_batches_proportionally()
+                elif self.config.curriculum == ITERATION_RANDOM_TEMPERATURE:
+                    iteration_generator = batches.iterate_batches_with_temperature(self.config.curriculum_temperature)
                 else:
                     iteration_generator = batches.iterate_batches_fair()
 
-                for task_name, batch in iteration_generator:
-                    assert isinstance(batch, Batch)
-                    batch_start = time.time()
-                    if verbose:
-                        logger.debug("Running batch from task %s", task_name)
+                if self.config.mixed_batches:
+                    # Combine batches of different tasks into one training step
+                    feed_dicts = (
+                        (
+                            [task_name for task_name, _ in items],
+                            self._create_mixed_train_feed_dict(items, logger, verbose)
+                        )
+                        for items
+                        in iterate_mixed_batches(iteration_generator)
+                    )
+                else:
+                    feed_dicts = (
+                        (task_name, self._create_train_feed_dict(task_name, batch, logger, verbose))
+                        for task_name, batch
+                        in iteration_generator
+                    )
 
-                    feed_dict = self._pre_process_input(task_name, batch, logger, verbose=verbose)
+                if self.config.use_input_queue:
+                    # Assemble and enqueue the inputs of the next batches in the background
+                    feed_dicts = self._enqueue_inputs(sess, feed_dicts)
+                elif self.config.prefetch_batches > 0:
+                    # Assemble the inputs of the next batches in the background while the current batch is running
+                    feed_dicts = prefetch(feed_dicts, self.config.prefetch_batches)
 
-                    # Add dropout
-                    feed_dict[self._rnn_dropout_input_keep_probability] = self.config.rnn_dropout_input_keep_probability
-                    feed_dict[self._rnn_dropout_output_keep_probability] = self.config.rnn_dropout_output_keep_probability
-                    feed_dict[self._rnn_dropout_state_keep_probability] = self.config.rnn_dropout_state_keep_probability
-                    feed_dict[self._word_dropout_keep_probability] = self.config.word_dropout_keep_probability
-                    feed_dict[self._task_dropout[task_name]] = self._task_by_name[task_name].dropout_keep_probability
+                for task_name, feed_dict in feed_dicts:
+                    batch_start = time.time()
 
-                    # for task_name in self._task_dropout:
-                    #     feed_dict[self._task_dropout[task_name]] = self._task_by_name[task_name].dropout_keep_probability
+                    if self.config.mixed_batches:
+                        # One step for the weighted losses of all tasks of the mixed batch (`task_name` is a list)
+                        operations = [
+                            self._mixed_operation_train,
+                            self._mixed_loss,
+                            self._mixed_gradient_norm,
+                        ]
+                    elif task_name in self._joint_operations_train:
+                        # One step for the losses of all tasks that are trained on the sentences of the batch
+                        operations = [
+                            self._joint_operations_train[task_name],
+                            self._joint_losses[task_name],
+                            self._joint_gradient_norms[task_name],
+                        ]
+                    else:
+                        operations = [
+                            self._operations_train[task_name],
+                            self._losses[task_name],
+                            self._gradient_norms[task_name],
+                        ]
 
-                    _, loss, norms = sess.run(
-                        [self._operations_train[task_name], self._losses[task_name], self._gradient_norms[task_name]],
-                        feed_dict=feed_dict
-                    )
+                    _, loss, norms = sess.run(operations, feed_dict=feed_dict)
 
-                    num_finished_batches += 1
+                    num_finished_batches += len(task_name) if self.config.mixed_batches else 1
 
                     logger.debug(
                         "Finished batch after %.4f seconds. Loss is %.4f. Gradient norm is: %.4f",
@@ -735,6 +1117,48 @@ class Network(BaseNeuralNetwork):
         self.log_duration_csv(duration, "train", num_actual_epochs, stopped_early)
         return num_actual_epochs, stopped_early
 
+    def _get_prediction_inputs(self, data_type, logger=None):
+        """
+        Get the inputs for the prediction on data of the specified type. They are built once (from the batch cache) and
+        kept in memory so that repeated predictions, e.g. after each epoch, only need to run the network.
+
+        Args:
+            data_type (str): Which type of data to use for prediction (usually dev or test)
+            logger (Logger, optional): A logger instance
+
+        Returns:
+            `list` of tuple: For each batch, a tuple consisting of the task name, the batch, the input `feed_dict`, the
+                token matrix, the label matrix, and the sequence lengths (padded for sentences of length one).
+        """
+        if data_type in self._prediction_inputs:
+            return self._prediction_inputs[data_type]
+
+        if logger is None:
+            logger = logging.getLogger("%s.Network._get_prediction_inputs" % self.config.name)
+
+        batches = load_batches(self.config, self._paths["batches_cache"], data_type=data_type, no_mini_batches=True)
+        logger.debug("Finished loading batches")
+
+        prediction_inputs = []
+        for task_name, batch in batches.iterate_tasks():
+            assert isinstance(batch, Batch)
+            # Special case for sentences of length 1
+            sentences, labels = pad_sentences_of_length_one(batch.tokens, batch.labels, self.config.word2idx)
+
+            prediction_inputs.append((
+                task_name,
+                batch,
+                self._pre_process_input(task_name, batch, logger),
+                sentences,
+                labels,
+                # NOTE: sentences within a batch are padded to the same length if length buckets are used.
+                #       See implementation of Batches for further information.
+                batch.sequence_lengths.astype(np.int64)
+            ))
+
+        self._prediction_inputs[data_type] = prediction_inputs
+        return prediction_inputs
+
     def predict(self, sess, data_type=DATA_TYPE_DEV, only_main=False):
         """
         Perform prediction for data of the specified type and return the prediction results together with metrics.
@@ -748,19 +1172,7 @@ class Network(BaseNeuralNetwork):
         logger = logging.getLogger("%s.Network.predict" % self.config.name)
         logger.debug("Starting prediction on %s data set", data_type)
 
-        batches_pkl = os.path.join(self._paths["runs"][self._run_idx]["batches"], "prediction_%s.pkl" % data_type)
-
-        if os.path.isfile(batches_pkl):
-            logger.debug("Loading %s batches from pickle file.", data_type)
-            with open(batches_pkl, "rb") as f:
-                batches = pkl.load(f)
-        else:
-            logger.debug("No pickle file for %s batches. Creating them from scratch.", data_type)
-            batches = Batches(self.config, data_type=data_type, no_mini_batches=True)
-            logger.debug("Storing batches for %s in pickle file.", data_type)
-            with open(batches_pkl, "wb") as f:
-                pkl.dump(batches, f, -1)
-        logger.debug("Finished loading batches")
+        prediction_inputs = self._get_prediction_inputs(data_type, logger)
 
         prediction_results = {
             task.name: []
@@ -773,34 +1185,30 @@ class Network(BaseNeuralNetwork):
             for task in self.config.tasks
         }
 
-        for task_name, batch in batches.iterate_tasks():
-            if only_main and self.config.early_stopping is not None and task_name != self.config.early_stopping.task_name:
-                # logger.debug(
-                #     "Skipping prediction for task %s because only main task (%s) is predicted.",
-                #     task_name,
-                #     self.config.early_stopping.task_name
-                # )
-                continue
+        def create_feed_dicts():
+            for task_name, batch, input_feed_dict, sentences, labels, sequence_lengths in prediction_inputs:
+                if only_main and self.config.early_stopping is not None and \
+                        task_name != self.config.early_stopping.task_name:
+                    continue
 
-            assert isinstance(batch, Batch)
-            samples = batch.samples
-            # NOTE: it is assumed that all sentences within a batch are of the same length.
-            #       See implementation of Batches for further information.
+                # Copy the inputs because the input queue removes them from the `feed_dict`
+                feed_dict = dict(input_feed_dict)
 
-            # Special case for sentences of length 1
-            sentences, labels = pad_sentences_of_length_one(batch.tokens, batch.labels, self.config.word2idx)
+                # Dropout (fix to 1 during prediction)
+                feed_dict[self._rnn_dropout_input_keep_probability] = 1.0
+                feed_dict[self._rnn_dropout_output_keep_probability] = 1.0
+                feed_dict[self._rnn_dropout_state_keep_probability] = 1.0
+                feed_dict[self._word_dropout_keep_probability] = 1.0
+                feed_dict[self._task_dropout[task_name]] = 1.0
 
-            feed_dict = self._pre_process_input(task_name, batch, logger)
+                yield (task_name, batch, sentences, labels, sequence_lengths), feed_dict
 
-            # Dropout (fix to 1 during prediction)
-            feed_dict[self._rnn_dropout_input_keep_probability] = 1.0
-            feed_dict[self._rnn_dropout_output_keep_probability] = 1.0
-            feed_dict[self._rnn_dropout_state_keep_probability] = 1.0
-            feed_dict[self._word_dropout_keep_probability] = 1.0
-            feed_dict[self._task_dropout[task_name]] = 1.0
+        feed_dicts = create_feed_dicts()
+        if self.config.use_input_queue:
+            feed_dicts = self._enqueue_inputs(sess, feed_dicts)
 
-            # for task_name in self._task_dropout:
-            #     feed_dict[self._task_dropout[task_name]] = 1.0
+        for (task_name, batch, sentences, labels, sequence_lengths), feed_dict in feed_dicts:
+            samples = batch.samples
 
             if uses_crf[task_name]:
                 projections, transition_params = sess.run(
@@ -809,17 +1217,23 @@ class Network(BaseNeuralNetwork):
                 )
 
                 predictions = []
-                for projection in projections:
+                for projection, sequence_length in zip(projections, sequence_lengths):
+                    # Only decode the true sequence (without padding)
                     viterbi_sequence, _ = tf.contrib.crf.viterbi_decode(
-                        projection,
+                        projection[:sequence_length],
                         transition_params
                     )
                     predictions += [viterbi_sequence]
-
-                prediction_results[task_name].append((sentences, labels, predictions, samples))
             else:
-                predictions = sess.run([self._predictions[task_name]], feed_dict=feed_dict)
-                prediction_results[task_name].append((sentences, labels, predictions[0], samples))
+                predictions = sess.run([self._predictions[task_name]], feed_dict=feed_dict)[0]
+
+            # Remove the padding
+            prediction_results[task_name].append((
+                [sentence[:length] for sentence, length in zip(sentences, sequence_lengths)],
+                [label_sequence[:length] for label_sequence, length in zip(labels, sequence_lengths)],
+                [prediction[:length] for prediction, length in zip(predictions, sequence_lengths)],
+                samples
+            ))
 
         for task_name, result_list in prediction_results.items():
             if len(result_list) == 0:
@@ -862,12 +1276,17 @@ class Network(BaseNeuralNetwork):
         logger.debug("Evaluating %s data.", data_type)
 
         with tf.Session(config=self._get_tf_sess_config()) as sess:
-            saver = tf.train.Saver()
+            saver = self._get_saver()
             model_path = model_path if model_path is not None else self._paths["runs"][self._run_idx]["model"]
             model_out_path = os.path.join(model_path, PREFIX_MODEL_WEIGHTS)
             logger.debug("Restoring session from %s.", model_out_path)
             saver.restore(sess, model_out_path)
 
+            # The pre-trained embeddings are not part of the checkpoint
+            if self._embeddings_variable is not None:
+                logger.debug("Initializing the pre-trained embeddings")
+                sess.run(self._embeddings_variable.initializer, feed_dict=self._get_init_feed_dict())
+
             result_lists = self.predict(sess, data_type=data_type)
 
             for task_name, result_list in result_lists.items():
@@ -1013,9 +1432,9 @@ def pad_character_sentences_of_length_one(characters, word_lengths_matrix, char2
         # Do not change if the length is not one
         return characters, word_lengths_matrix
 
-    character_padding = np.ones((1, word_length)) * char2idx[TOKEN_PADDING]
-    word_length_scalar = word_lengths_matrix[0][0]
-    word_length_padding = np.ones((1,)) * word_length_scalar
+    character_padding = np.full((1, word_length), char2idx[TOKEN_PADDING], dtype=characters.dtype)
+    # The padding token has no characters
+    word_length_padding = np.zeros((1,), dtype=word_lengths_matrix.dtype)
 
     padded_characters = []
     padded_word_lengths = []
@@ -6,21 +6,28 @@ from constants import CHAR_CNN, CHAR_LSTM
 
 class CharacterLevelInformationConfig(BaseConfig):
 
-    def __init__(self, network_type, dimensionality, hidden_units):
+    def __init__(self, network_type, dimensionality, hidden_units, max_word_length=None, group_by_word_length=False):
         """Initialize the character level information configuration.
 
         Args:
             network_type (str): Which type of network to use for character level information (LSTM or CNN).
             dimensionality (int): Dimensionality of character embeddings
             hidden_units (int): Number of hidden units (only necessary for LSTM extractor)
+            max_word_length (int, optional): Maximum number of characters per token. Longer tokens are cropped.
+            group_by_word_length (bool, optional): Whether or not to group sentences with similar maximum token lengths
+                into the same batches
         """
         assert network_type in [CHAR_CNN, CHAR_LSTM]
         assert isinstance(dimensionality, int) and dimensionality > 0
         assert isinstance(hidden_units, int) and hidden_units > 0
+        assert max_word_length is None or (isinstance(max_word_length, int) and max_word_length > 0)
+        assert isinstance(group_by_word_length, bool)
 
         self._network_type = network_type
         self._dimensionality = dimensionality
         self._hidden_units = hidden_units
+        self._max_word_length = max_word_length
+        self._group_by_word_length = group_by_word_length
 
         self._prepared = False
         self._paths = {}
@@ -41,11 +48,23 @@ class CharacterLevelInformationConfig(BaseConfig):
         """int: Number of hidden units (only necessary for LSTM extractor)"""
         return self._hidden_units
 
+    @property
+    def max_word_length(self):
+        """int or None: Maximum number of characters per token. Longer tokens are cropped."""
+        return self._max_word_length
+
+    @property
+    def group_by_word_length(self):
+        """bool: Whether or not to group sentences with similar maximum token lengths into the same batches"""
+        return self._group_by_word_length
+
     def to_dict(self):
         return {
             "network_type": self.network_type,
             "dimensionality": self.dimensionality,
-            "hidden_units": self.hidden_units
+            "hidden_units": self.hidden_units,
+            "max_word_length": self.max_word_length,
+            "group_by_word_length": self.group_by_word_length,
         }
 
     def sanity_check(self):
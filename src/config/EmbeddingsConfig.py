@@ -1,11 +1,19 @@
 """Class for loading embeddings"""
 
 import logging
-import codecs
+import cPickle as pkl
+import hashlib
+import os
+import struct
+import sys
 from os import path
 from gzip import open as gzopen
 
+import numpy as np
+
 from BaseConfig import BaseConfig
+from constants import EMBEDDINGS_FORMAT_TEXT, EMBEDDINGS_FORMAT_FASTTEXT, EMBEDDINGS_FORMAT_WORD2VEC, \
+    VALID_EMBEDDINGS_FORMATS
 
 
 class EmbeddingsConfig(BaseConfig):
@@ -16,7 +24,9 @@ class EmbeddingsConfig(BaseConfig):
             separator,
             encoding,
             size,
-            gzip
+            gzip,
+            cache=False,
+            file_format=EMBEDDINGS_FORMAT_TEXT
     ):
         """Initialize the embeddings configuration.
 
@@ -27,6 +37,10 @@ class EmbeddingsConfig(BaseConfig):
             encoding (str): Encoding of the file
             size (int): Number of dimensions of the embeddings
             gzip (bool): Whether or not the embeddings file is gzipped (usually True)
+            cache (bool, optional): Whether or not to convert the embeddings file once into a binary cache (a float32
+                matrix and a vocabulary) that is loaded with memory mapping.
+            file_format (str, optional): Format of the embeddings file, i.e. plain text, fastText text with a header line,
+                or binary word2vec
         """
 
         assert isinstance(path, str)
@@ -35,6 +49,8 @@ class EmbeddingsConfig(BaseConfig):
         assert isinstance(encoding, str)
         assert isinstance(size, int)
         assert isinstance(gzip, bool)
+        assert isinstance(cache, bool)
+        assert isinstance(file_format, str)
 
         self._path = path
         self._lower = lower
@@ -42,6 +58,8 @@ class EmbeddingsConfig(BaseConfig):
         self._encoding = encoding
         self._size = size
         self._gzip = gzip
+        self._cache = cache
+        self._file_format = file_format
 
         self._vectors = {}
         self._prepared = False
@@ -78,16 +96,247 @@ class EmbeddingsConfig(BaseConfig):
         """bool: Whether or not the embeddings file is gzipped"""
         return self._gzip
 
+    @property
+    def cache(self):
+        """bool: Whether or not the embeddings are converted into a binary cache that is loaded with memory mapping"""
+        return self._cache
+
+    @property
+    def file_format(self):
+        """str: Format of the embeddings file"""
+        return self._file_format
+
     @property
     def vectors(self):
-        """`dict` of `list` of float: A mapping from words to their corresponding word vectors"""
+        """
+        `dict` of np.ndarray or EmbeddingVectors: A mapping from words to their corresponding word vectors.
+        If the binary cache is used, the vectors are rows of a memory-mapped matrix that are only read on access.
+        """
         return self._vectors
 
-    def prepare(self):
+    def iterate_vectors(self, words=None):
+        """
+        Lazily read the embeddings file. Gzipped files are decompressed on the fly.
+
+        Args:
+            words (set of str, optional): If specified, only the vectors of these words are returned. The values of all
+                other words are not parsed.
+
+        Returns:
+            generator: A generator of tuples consisting of a word and its vector (np.ndarray).
+        """
+        # The file is read in binary mode, only the words are decoded
+        f = gzopen(self.path, mode="rb") if self.gzip else open(self.path, mode="rb")
+
+        if self.file_format == EMBEDDINGS_FORMAT_WORD2VEC:
+            vectors = self._iterate_word2vec_binary(f, words)
+        else:
+            # fastText files start with a header line consisting of the number of words and the dimensionality
+            if self.file_format == EMBEDDINGS_FORMAT_FASTTEXT:
+                f.readline()
+
+            vectors = self._iterate_text(f, words)
+
+        try:
+            for word, vec in vectors:
+                yield word, vec
+        finally:
+            # Close file
+            f.close()
+
+    def _iterate_text(self, lines, words):
+        """
+        Parse the lines of a text embeddings file. Each line consists of a word followed by the values of its vector.
+
+        Args:
+            lines (iterable of str): The (encoded) lines of the file
+            words (set of str or None): If specified, only the vectors of these words are returned
+
+
+        Returns:
+            generator: A generator of tuples consisting of a word and its vector (np.ndarray).
+        """
+        logger = logging.getLogger("shared.embeddings_config._iterate_text")
+
+        for line in lines:
+            # The first field is the word
+            word, _, values = line.strip().partition(self.separator)
+
+            try:
+                word = word.decode(self.encoding)
+            except UnicodeDecodeError:
+                logger.warn("Word in embeddings file could not be decoded with %s: %r", self.encoding, word)
+                raise
+
+            # Apply lower case
+            if self.lower:
+                word = word.lower()
+
+            if words is not None and word not in words:
+                continue
+
+            # All fields but the first are values of the embedding vector. They are parsed at once by numpy without
+            # splitting them into strings first. Numpy stops at the first malformed value, i.e. a corrupt line
+            # results in a short vector.
+            vec = np.fromstring(values, dtype=np.float32, sep=self.separator)
+            if len(vec) != self.size:
+                logger.warn(
+                    "Vector of '%s' in embeddings file %s has %d instead of %d dimensions or a malformed value",
+                    word,
+                    self.path,
+                    len(vec),
+                    self.size
+                )
+                raise ValueError("Unexpected dimensionality of a vector")
+
+            yield word, vec
+
+    def _iterate_word2vec_binary(self, f, words, chunk_size=1 << 16):
+        """
+        Parse a file in the binary word2vec format. The file starts with a header line consisting of the number of
+        words and the dimensionality. Each entry consists of a word terminated by a space and the vector as
+        little-endian float32 values. The file is read in chunks and the values are decoded at once with
+        `np.frombuffer`.
+
+        Args:
+            f (file): The file opened in binary mode
+            words (set of str or None): If specified, only the vectors of these words are returned
+            chunk_size (int, optional): Number of bytes that are read from the file at once
+
+        Returns:
+            generator: A generator of tuples consisting of a word and its vector (np.ndarray).
+        """
+        logger = logging.getLogger("shared.embeddings_config._iterate_word2vec_binary")
+
+        try:
+            num_words, size = [int(value) for value in f.readline().split()]
+        except ValueError:
+            logger.warn("Header of the word2vec file could not be read")
+            raise
+
+        if size != self.size:
+            logger.warn("Vectors in word2vec file %s have %d instead of %d dimensions", self.path, size, self.size)
+            raise ValueError("Unexpected dimensionality of the vectors")
+
+        num_bytes = size * np.dtype(np.float32).itemsize
+        buf = b""
+        pos = 0
+
+        for _ in xrange(num_words):
+            end = buf.find(b" ", pos)
+            while end < 0:
+                chunk = f.read(chunk_size)
+                if chunk == b"":
+                    logger.warn("Unexpected end of the word2vec file after %d words", num_words)
+                    raise ValueError("Unexpected end of file")
+                # Only keep the unread part of the buffer
+                searched = len(buf) - pos
+                buf = buf[pos:] + chunk
+                pos = 0
+                end = buf.find(b" ", searched)
+
+            # Some files terminate the vectors with a newline
+            word = buf[pos:end].replace(b"\n", b"").decode(self.encoding, "replace")
+            pos = end + 1
+
+            while len(buf) - pos < num_bytes:
+                chunk = f.read(max(chunk_size, num_bytes))
+                if chunk == b"":
+                    logger.warn("Vector of '%s' in the word2vec file is truncated", word)
+                    raise ValueError("Unexpected end of file")
+                buf = buf[pos:] + chunk
+                pos = 0
+
+            data = buf[pos:pos + num_bytes]
+            pos += num_bytes
+
+            # Apply lower case
+            if self.lower:
+                word = word.lower()
+
+            if words is not None and word not in words:
+                continue
+
+            yield word, np.frombuffer(data, dtype="<f4").astype(np.float32)
+
+    def _get_cache_path(self):
+        """
+        Determine the path (without file extension) of the binary cache for the embeddings file.
+        The name depends on the file (path, size, and modification time) and the options that change the vectors.
+
+        Returns:
+            str: Path to the cache
+        """
+        key = hashlib.md5("|".join([
+            path.abspath(self.path),
+            str(path.getsize(self.path)),
+            str(int(path.getmtime(self.path))),
+            str(self.lower),
+            self.separator,
+            self.encoding,
+            self.file_format,
+        ])).hexdigest()
+
+        return path.join(self._paths["embeddings_cache"], "%s_%s" % (path.basename(self.path), key))
+
+    def _write_cache(self, cache_path):
+        """
+        Convert the embeddings file into the binary cache, i.e. a float32 matrix (`.npy`) and a vocabulary (`.pkl`)
+        that maps the rows of the matrix to words.
+        The vectors are streamed to disk so that the whole file never has to be held in memory.
+
+        Args:
+            cache_path (str): Path of the cache (without file extension)
+
+        Returns:
+            None
+        """
+        logger = logging.getLogger("shared.embeddings_config._write_cache")
+        logger.info("Converting embeddings file %s into binary cache %s", self.path, cache_path)
+
+        tmp_path = cache_path + ".npy.tmp"
+        words = []
+
+        # The number of vectors is only known at the end. The `.npy` header is written with room for the largest
+        # possible number of rows and filled in afterwards, i.e. the vectors are written to disk only once.
+        header_length = len(_get_npy_header(sys.maxsize, self.size))
+
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(" " * header_length)
+                for word, vec in self.iterate_vectors():
+                    words.append(word)
+                    f.write(np.asarray(vec, dtype=np.float32).tostring())
+
+                f.seek(0)
+                f.write(_get_npy_header(len(words), self.size, header_length))
+        except ValueError:
+            # Do not leave an incomplete matrix behind
+            os.remove(tmp_path)
+            raise
+
+        os.rename(tmp_path, cache_path + ".npy")
+
+        # The vocabulary is written last because its existence marks a complete cache
+        with open(cache_path + ".vocab.pkl", "wb") as f:
+            pkl.dump(words, f, -1)
+
+        logger.info("Wrote %d vectors to the binary cache", len(words))
+
+    def prepare(self, needed_vocab=None):
         """
         Fill all properties not already populated at initialization with values.
+
+        Args:
+            needed_vocab (set of str, optional): If specified, only the vectors of these words are kept. They are
+                written into a float32 matrix while streaming through the embeddings file. The matrix grows with the
+                needed words that are found, i.e. the memory usage is proportional to the number of matches and not to
+                the size of the embeddings file. If the binary cache is used, only the rows of the needed words are
+                copied out of the memory-mapped matrix.
+
         Returns:
-            True in case of success, False otherwise.
+            True in case of success, False otherwise, e.g. if a line cannot be read or a vector does not have the
+                configured dimensionality.
         """
         logger = logging.getLogger("shared.embeddings_config.prepare")
 
@@ -97,42 +346,78 @@ class EmbeddingsConfig(BaseConfig):
         if self.lower:
             logger.debug("All words will be converted to lowercase")
 
-        if self.gzip:
-            f = gzopen(self.path, mode="r")
-            lines = codecs.getreader("utf-8")(f).readlines()
-        else:
-            f = codecs.open(self.path, mode="r", encoding="utf-8")
-            lines = f
+        if self.cache:
+            cache_path = self._get_cache_path()
+
+            if not path.isfile(cache_path + ".vocab.pkl"):
+                try:
+                    self._write_cache(cache_path)
+                except ValueError:
+                    logger.warn("Failed to prepare embeddings because the embeddings file could not be read")
+                    return False
+
+            logger.debug("Loading embeddings from binary cache %s", cache_path)
+            with open(cache_path + ".vocab.pkl", "rb") as f:
+                words = pkl.load(f)
+
+            matrix = np.load(cache_path + ".npy", mmap_mode="r")
+
+            if needed_vocab is not None:
+                # Only copy the rows of the needed words out of the memory-mapped matrix. Later occurrences of a word
+                # replace earlier ones.
+                word2row = {}
+                for row, word in enumerate(words):
+                    if word in needed_vocab:
+                        word2row[word] = row
+                logger.debug("Only keeping the vectors of %d of %d needed words", len(word2row), len(needed_vocab))
+
+                words = sorted(word2row.keys(), key=lambda word: word2row[word])
+                matrix = np.asarray(matrix[[word2row[word] for word in words]], dtype=np.float32)
+
+            self._vectors = EmbeddingVectors(words, matrix)
+            vec_size = self._vectors.size
+        elif needed_vocab is not None:
+            logger.debug("Only keeping the vectors of %d needed words", len(needed_vocab))
+            words = []
+            word2row = {}
+            # Usually only a fraction of the needed words has a vector, i.e. the matrix grows with the matches
+            matrix = np.empty((min(len(needed_vocab), 1024), self.size), dtype=np.float32)
+            vec_size = self.size
 
-        for line in lines:
             try:
-                fields = line.strip().split(self.separator)
-                # All fields but the first are values of the embedding vector
-                vec = [float(value) for value in fields[1:]]
-                # The first field is the word
-                word = fields[0]
-
-                # Apply lower case
-                if self.lower:
-                    word = word.lower()
+                for word, vec in self.iterate_vectors(needed_vocab):
+                    # Later occurrences of a word replace earlier ones
+                    if word not in word2row:
+                        if len(words) == len(matrix):
+                            matrix = _grow_rows(matrix, min(2 * len(matrix), len(needed_vocab)))
+                        word2row[word] = len(words)
+                        words.append(word)
+                    matrix[word2row[word]] = vec
+            except ValueError:
+                logger.warn("Failed to prepare embeddings because a line in the embeddings file could not be read")
+                return False
 
-                self._vectors[word] = vec
+            # Trim the unused rows (copy) so that they do not stay allocated
+            if len(words) < len(matrix):
+                matrix = matrix[:len(words)].copy()
 
+            self._vectors = EmbeddingVectors(words, matrix)
+        else:
+            vec = None
+            try:
+                for word, vec in self.iterate_vectors():
+                    self._vectors[word] = vec
             except ValueError:
-                logger.warn(
-                    "Failed to prepare embeddings because line in embeddings file could not be read: %s",
-                    line
-                )
+                logger.warn("Failed to prepare embeddings because a line in the embeddings file could not be read")
                 return False
 
-        # Close file
-        f.close()
+            vec_size = len(vec) if vec is not None else 0
 
         # Check if the length of the vectors is actually the specified embeddings size
         logger.debug("Vectors should have dimensionality of %d", self.size)
-        logger.debug("Vectors from embedding file have dimensionality of %d", len(vec) if vec else 0)
+        logger.debug("Vectors from embedding file have dimensionality of %d", vec_size)
 
-        assert len(vec) == self.size
+        assert vec_size == self.size
 
         logger.info("Finished reading the embeddings file. Loaded vectors for %d distinct words.", len(self.vectors))
 
@@ -155,6 +440,8 @@ class EmbeddingsConfig(BaseConfig):
             "encoding": self.encoding,
             "size": self.size,
             "gzip": self.gzip,
+            "cache": self.cache,
+            "format": self.file_format,
         }
 
     def sanity_check(self):
@@ -169,7 +456,11 @@ class EmbeddingsConfig(BaseConfig):
         if not path_valid:
             logger.warn("Invalid path %s in embeddings configuration", self.path)
 
-        return path_valid
+        format_valid = self.file_format in VALID_EMBEDDINGS_FORMATS
+        if not format_valid:
+            logger.warn("Invalid format %s in embeddings configuration", self.file_format)
+
+        return path_valid and format_valid
 
     def set_paths(self, paths):
         """
@@ -197,3 +488,108 @@ class EmbeddingsConfig(BaseConfig):
             bool: True if the paths have been set, False otherwise.
         """
         return self._paths_set
+
+
+class EmbeddingVectors(object):
+    """
+    Read-only mapping from words to the rows of a (memory-mapped) embedding matrix.
+    Rows are only read from the matrix when they are accessed.
+    """
+
+    def __init__(self, words, matrix):
+        """
+        Initialize the mapping.
+
+        Args:
+            words (`list` of str): The word of each row of the matrix
+            matrix (np.ndarray): Embedding matrix with shape (number of words, dimensionality)
+        """
+        assert len(words) == matrix.shape[0]
+
+        # Later occurrences of a word replace earlier ones (as for a dictionary that is filled line by line)
+        self._word2row = {}
+        for row, word in enumerate(words):
+            self._word2row[word] = row
+
+        self._matrix = matrix
+
+    @property
+    def size(self):
+        """int: Dimensionality of the vectors"""
+        return self._matrix.shape[1]
+
+    @property
+    def matrix(self):
+        """np.ndarray: The (memory-mapped) embedding matrix"""
+        return self._matrix
+
+    @property
+    def word2row(self):
+        """`dict` of int: Mapping from words to rows of the matrix"""
+        return self._word2row
+
+    def keys(self):
+        return self._word2row.keys()
+
+    def items(self):
+        return [(word, self[word]) for word in self._word2row]
+
+    def __contains__(self, word):
+        return word in self._word2row
+
+    def __getitem__(self, word):
+        return np.asarray(self._matrix[self._word2row[word]])
+
+    def __iter__(self):
+        return iter(self._word2row)
+
+    def __len__(self):
+        return len(self._word2row)
+
+
+def _grow_rows(matrix, num_rows):
+    """
+    Copy a matrix into a larger matrix with uninitialized additional rows.
+
+    Args:
+        matrix (np.ndarray): The matrix
+        num_rows (int): Number of rows of the new matrix. Has to be at least the number of rows of the matrix.
+
+    Returns:
+        np.ndarray: The new matrix
+    """
+    grown = np.empty((num_rows,) + matrix.shape[1:], dtype=matrix.dtype)
+    grown[:len(matrix)] = matrix
+    return grown
+
+
+def _get_npy_header(num_rows, size, length=None):
+    """
+    Build the header of a `.npy` file (format version 1.0) for a float32 matrix in C order.
+
+    Args:
+        num_rows (int): Number of rows of the matrix
+        size (int): Number of columns of the matrix
+        length (int, optional): Length of the header in bytes. The header is padded with spaces to this length. By
+            default, it is padded to the next multiple of 16 bytes (like `np.save` does).
+
+    Returns:
+        str: The header
+    """
+    magic = np.lib.format.magic(1, 0)
+    header = "{'descr': '%s', 'fortran_order': False, 'shape': (%d, %d), }" % (
+        np.dtype(np.float32).str,
+        num_rows,
+        size
+    )
+
+    # Magic string, two bytes for the length of the header, and the header terminated by a newline
+    if length is None:
+        length = len(magic) + 2 + len(header) + 1
+        length += -length % 16
+
+    padding = length - len(magic) - 2 - len(header) - 1
+    assert padding >= 0, "The header does not fit into %d bytes" % length
+
+    header += " " * padding + "\n"
+    return magic + struct.pack("<H", len(header)) + header
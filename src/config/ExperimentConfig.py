@@ -2,6 +2,7 @@
 
 import cPickle as pkl
 import logging
+from collections import Counter
 import numpy as np
 from os import path
 
@@ -15,12 +16,16 @@ from FileConfig import FileConfig
 from HiddenLayerConfig import HiddenLayerConfig
 from TaskConfig import TaskConfig
 from TrainingConfig import TrainingConfig
-from constants import CONLL, CLASSIFIER_SOFTMAX, RNN_UNIT_TYPE_LSTM, \
+from constants import CONLL, EMBEDDINGS_FORMAT_TEXT, CLASSIFIER_SOFTMAX, RNN_UNIT_TYPE_LSTM, \
     RNN_UNIT_TYPE_GRU, RNN_UNIT_TYPE_SIMPLE, OPTIMIZER_ADAM, TOKEN_PADDING, TOKEN_UNKNOWN, TOKEN_DATE, \
     TOKEN_TIME, TOKEN_NUMBER, ENCODING_NONE, METRIC_F1, CHAR_LSTM, ACTIVATION_RELU, METRIC_ACCURACY, METRIC_RECALL, \
     METRIC_PRECISION, TASK_TYPE_GENERIC, VALID_METRICS, \
-    ITERATION_RANDOM_FAIR
-from data.preprocess import merge_embeddings, word_normalize
+    ITERATION_RANDOM_FAIR, VALID_ITERATIONS, TOKEN_LOOKUP_SUFFIXES, DATA_TYPE_TRAIN, DATA_TYPE_DEV, DATA_TYPE_TEST
+from data.ConllDataReader import get_mapping_key
+from data.ConllFileRegistry import ConllFileRegistry
+from data.StringTable import load_string_table
+from data.preprocess import merge_embeddings, lookup_candidates, build_token_resolution_table, \
+    build_character_matrix, oov_bucket_tokens, select_vocabulary
 
 
 class ExperimentConfig(BaseConfig):
@@ -52,8 +57,23 @@ class ExperimentConfig(BaseConfig):
         self._num_runs = 10
         self._epochs = 1
         self._batch_size = 32
+        self._batch_buckets = None
+        self._max_tokens_per_batch = None
+        self._max_characters_per_batch = None
+        self._prefetch_batches = 0
+        self._use_input_queue = False
+        self._joint_training = False
+        self._mixed_batches = False
         self._training = None
         self._curriculum = ITERATION_RANDOM_FAIR
+        self._curriculum_temperature = 2.0
+
+        # Data-related
+        self._stream_data = False
+        self._compiled_data = False
+        self._num_parse_processes = 1
+        self._share_parsed_files = False
+        self._use_string_table = False
 
         # RNN related
         self._rnn_unit = RNN_UNIT_TYPE_LSTM
@@ -71,10 +91,20 @@ class ExperimentConfig(BaseConfig):
 
         # Vocabulary-related
         self._word_dropout_keep_probability = 1.0
+        self._max_vocab_size = None
+        self._num_oov_buckets = 0
         self._embedding_size = 100
         self._vocab_size = 0
         self._word2idx = None
+        self._token2idx = None
+        self._token2idx_key = None
+        self._token_lookup_suffixes = TOKEN_LOOKUP_SUFFIXES
         self._char2idx = None
+        self._char2idx_key = None
+        self._string_table = None
+        self._form2idx = None
+        self._char_matrix = None
+        self._char_lengths = None
         self._embeddings = []
         self._embedding_weights = None
         self._early_stopping = None
@@ -98,7 +128,20 @@ class ExperimentConfig(BaseConfig):
         self._num_runs = config.get("num_runs", self._num_runs)
         self._epochs = config.get("epochs", self._epochs)
         self._batch_size = config.get("batch_size", self._batch_size)
+        self._batch_buckets = config.get("batch_buckets", self._batch_buckets)
+        self._max_tokens_per_batch = config.get("max_tokens_per_batch", self._max_tokens_per_batch)
+        self._max_characters_per_batch = config.get("max_characters_per_batch", self._max_characters_per_batch)
+        self._prefetch_batches = config.get("prefetch_batches", self._prefetch_batches)
+        self._use_input_queue = config.get("use_input_queue", self._use_input_queue)
+        self._joint_training = config.get("joint_training", self._joint_training)
+        self._mixed_batches = config.get("mixed_batches", self._mixed_batches)
         self._curriculum = config.get("curriculum", self._curriculum)
+        self._curriculum_temperature = config.get("curriculum_temperature", self._curriculum_temperature)
+        self._stream_data = config.get("stream_data", self._stream_data)
+        self._compiled_data = config.get("compiled_data", self._compiled_data)
+        self._num_parse_processes = config.get("num_parse_processes", self._num_parse_processes)
+        self._share_parsed_files = config.get("share_parsed_files", self._share_parsed_files)
+        self._use_string_table = config.get("use_string_table", self._use_string_table)
         self._rnn_unit = config.get("rnn_unit", self._rnn_unit)
         self._rnn_dropout_input_keep_probability = config.get(
             "rnn_dropout_input_keep_probability",
@@ -121,6 +164,9 @@ class ExperimentConfig(BaseConfig):
             "word_dropout_keep_probability", self._word_dropout_keep_probability
         )
         self._eval_metrics = config.get("eval_metrics", self._eval_metrics)
+        self._token_lookup_suffixes = config.get("token_lookup_suffixes", self._token_lookup_suffixes)
+        self._max_vocab_size = config.get("max_vocab_size", self._max_vocab_size)
+        self._num_oov_buckets = config.get("num_oov_buckets", self._num_oov_buckets)
 
         self._tasks = [
             self._read_task(task_config, index)
@@ -275,6 +321,8 @@ class ExperimentConfig(BaseConfig):
         encoding = embeddings_config.get("encoding", "utf8")
         size = embeddings_config.get("size")
         gzip = embeddings_config.get("gzip", True)
+        cache = embeddings_config.get("cache", False)
+        file_format = embeddings_config.get("format", EMBEDDINGS_FORMAT_TEXT)
 
         return EmbeddingsConfig(
             path=path,
@@ -282,7 +330,9 @@ class ExperimentConfig(BaseConfig):
             separator=separator,
             encoding=encoding,
             size=size,
-            gzip=gzip
+            gzip=gzip,
+            cache=cache,
+            file_format=file_format
         )
 
     @staticmethod
@@ -329,11 +379,15 @@ class ExperimentConfig(BaseConfig):
         network_type = character_level_information_config.get("network_type", CHAR_LSTM)
         dimensionality = character_level_information_config.get("dimensionality", 100)
         hidden_units = character_level_information_config.get("hidden_units", 100)
+        max_word_length = character_level_information_config.get("max_word_length", None)
+        group_by_word_length = character_level_information_config.get("group_by_word_length", False)
 
         return CharacterLevelInformationConfig(
             network_type,
             dimensionality,
-            hidden_units
+            hidden_units,
+            max_word_length,
+            group_by_word_length
         )
 
     @staticmethod
@@ -393,16 +447,52 @@ class ExperimentConfig(BaseConfig):
 
         result = True
         words = []
+        file_registry = ConllFileRegistry(self.num_parse_processes) if self.share_parsed_files else None
+        string_table_pkl = path.join(self._paths["pkl"], "string_table.pkl")
+
+        # The string table is persisted so that the indices of samples that are cached by the data readers stay valid
+        self._string_table = load_string_table(string_table_pkl) if self.use_string_table else None
+
         # First, prepare all tasks
         for i, task in enumerate(self.tasks):
             logger.debug("Preparing task %d...", (i + 1))
             result = result and task.prepare()
+            task.data_reader.add_num_processes(self.num_parse_processes)
+            task.data_reader.add_token_lookup_suffixes(list(self.token_lookup_suffixes))
+            if file_registry is not None:
+                task.data_reader.add_file_registry(file_registry)
+            if self._string_table is not None:
+                task.data_reader.add_string_table(self._string_table, string_table_pkl)
             words += task.data_reader.get_words()
 
         unique_words = set(words)
 
-        embeddings_pkl = path.join(self._paths["pkl"], "embeddings.pkl")
-        word2idx_pkl = path.join(self._paths["pkl"], "word2idx.pkl")
+        # Words that are not part of the vocabulary are mapped to the out-of-vocabulary buckets (or the unknown token)
+        if self.max_vocab_size is not None:
+            word_counts = Counter()
+            for task in self.tasks:
+                for data_type in [DATA_TYPE_TRAIN, DATA_TYPE_DEV, DATA_TYPE_TEST]:
+                    word_counts.update(task.data_reader.get_statistics(data_type).word_counts)
+
+            vocabulary = set(select_vocabulary(word_counts, self.max_vocab_size))
+            logger.debug(
+                "Capped the vocabulary at the %d most frequent of %d words",
+                len(vocabulary),
+                len(unique_words)
+            )
+        else:
+            vocabulary = unique_words
+
+        special_tokens = [TOKEN_PADDING, TOKEN_UNKNOWN, TOKEN_DATE, TOKEN_TIME, TOKEN_NUMBER] + \
+            oov_bucket_tokens(self.num_oov_buckets)
+
+        # The vocabulary depends on its size and the number of buckets, i.e. both are part of the file names
+        vocabulary_key = "vocab-%s_oov-%d" % (
+            "all" if self.max_vocab_size is None else self.max_vocab_size,
+            self.num_oov_buckets
+        )
+        embeddings_pkl = path.join(self._paths["pkl"], "embeddings_%s.pkl" % vocabulary_key)
+        word2idx_pkl = path.join(self._paths["pkl"], "word2idx_%s.pkl" % vocabulary_key)
         char2idx_pkl = path.join(self._paths["pkl"], "char2idx.pkl")
 
         if self.character_level_information:
@@ -414,10 +504,11 @@ class ExperimentConfig(BaseConfig):
                 logger.info("Creating char2idx")
                 assert self._char2idx is None
 
-                # Get all unique characters
+                # Get all unique characters from the statistics of all data files
                 unique_characters = set()
-                for word in unique_words:
-                    unique_characters.update(word)
+                for task in self.tasks:
+                    for data_type in [DATA_TYPE_TRAIN, DATA_TYPE_DEV, DATA_TYPE_TEST]:
+                        unique_characters.update(task.data_reader.get_statistics(data_type).characters)
 
                 # Add padding as 0
                 unique_characters = [TOKEN_PADDING] + list(unique_characters)
@@ -428,6 +519,21 @@ class ExperimentConfig(BaseConfig):
                 )
                 self._char2idx = {k: v for v, k in enumerate(unique_characters)}
 
+            # Build the character indices once per word type instead of once per token and batch. Words are cropped
+            # while the matrix is built, i.e. the matrix never has the width of the longest word.
+            max_word_length = self.character_level_information.max_word_length
+            self._form2idx, self._char_matrix, self._char_lengths = build_character_matrix(
+                unique_words,
+                self._char2idx,
+                max_word_length
+            )
+
+            logger.debug(
+                "Built character matrix with shape %s for %d word types",
+                self._char_matrix.shape,
+                len(self._form2idx)
+            )
+
         if len(self.embeddings) != 0:
             if path.isfile(embeddings_pkl) and path.isfile(word2idx_pkl):
                 logger.info("Loading embedding weights and word2idx from pickle files.")
@@ -443,54 +549,56 @@ class ExperimentConfig(BaseConfig):
                 assert self._word2idx is None
                 # embedding weights should not be modified yet
                 assert self._embedding_weights is None
-                self._embedding_weights = []
 
-                result = result and all([embeddings_config.prepare() for embeddings_config in self.embeddings])
+                # TODO: make configuarable
+                # Reduce size of pre-trained word embeddings based on the words that occur in the documents.
+                # Adapted from NR
+                # The needed vocabulary is built first so that only its vectors are read from the embeddings files.
+
+                needed_vocab_set = set()
+                for word in vocabulary:
+                    # Suffixes are a special case for bilingual embeddings
+                    needed_vocab_set.update(lookup_candidates(word, self.token_lookup_suffixes))
+
+                logger.debug("Needed vocab set contains %d words", len(needed_vocab_set))
+
+                result = result and all([
+                    embeddings_config.prepare(needed_vocab_set) for embeddings_config in self.embeddings
+                ])
                 vectors = merge_embeddings(self.embeddings)
 
                 logger.debug("Merged the embeddings from %d files", len(self.embeddings))
                 self._embedding_size = sum([embeddings_config.size for embeddings_config in self.embeddings])
-                assert len(vectors[vectors.keys()[0]]) == self._embedding_size
+                assert len(vectors) == 0 or len(vectors[vectors.keys()[0]]) == self._embedding_size
                 logger.debug("Final embeddings have size of %d", self._embedding_size)
-
-                # TODO: make configuarable
-                # Reduce size of pre-trained word embeddings based on the words that occur in the documents.
-                # Adapted from NR
-
-                needed_vocab = {}
-                for word in unique_words:
-                    needed_vocab[word] = True
-                    needed_vocab[word.lower()] = True
-                    needed_vocab[word_normalize(word)] = True
-                    # Special case for bilingual embeddings
-                    needed_vocab[word + "_de"] = True
-                    needed_vocab[word.lower() + "_de"] = True
-                    needed_vocab[word_normalize(word) + "_de"] = True
-                    needed_vocab[word + "_en"] = True
-                    needed_vocab[word.lower() + "_en"] = True
-                    needed_vocab[word_normalize(word) + "_en"] = True
-
-                logger.debug("Needed vocab dict contains %d words", len(needed_vocab))
                 logger.debug("There are %d word vectors in the merged embeddings", len(vectors))
 
+                self._embedding_weights = np.empty(
+                    (len(special_tokens) + len(vectors), self._embedding_size),
+                    dtype=np.float32
+                )
+
                 # Add special tokens
                 logger.debug("Adding special tokens")
                 self._word2idx = {TOKEN_PADDING: 0}
-                self._embedding_weights.append(np.zeros(self._embedding_size))
+                self._embedding_weights[0] = 0.0
 
-                for special_token in [TOKEN_UNKNOWN, TOKEN_DATE, TOKEN_TIME, TOKEN_NUMBER]:
+                for special_token in special_tokens[1:]:
                     self._word2idx[special_token] = len(self._word2idx)
                     # TODO: check out other initialization styles
-                    self._embedding_weights.append(np.random.uniform(-0.25, 0.25, self._embedding_size))
-
-                needed_vocab_set = set(needed_vocab.keys())
-
-                for word, vector in vectors.items():
+                    self._embedding_weights[self._word2idx[special_token]] = np.random.uniform(
+                        -0.25,
+                        0.25,
+                        self._embedding_size
+                    )
+
+                # Only the needed vectors are read (relevant for memory-mapped embeddings)
+                for word in vectors.keys():
                     if word not in self._word2idx and word in needed_vocab_set:
-                        self._embedding_weights.append(vector)
                         self._word2idx[word] = len(self._word2idx)
+                        self._embedding_weights[self._word2idx[word]] = vectors[word]
 
-                self._embedding_weights = np.asarray(self._embedding_weights)
+                self._embedding_weights = self._embedding_weights[:len(self._word2idx)]
                 self._vocab_size = self._embedding_weights.shape[0]
 
                 if np.isnan(self._embedding_weights).any():
@@ -511,16 +619,16 @@ class ExperimentConfig(BaseConfig):
                 with open(word2idx_pkl, 'rb') as f:
                     self._word2idx = pkl.load(f)
 
-            self._vocab_size = len(unique_words)
+            self._vocab_size = len(vocabulary)
             # Build "global" word2idx (and ensure that <MASK> is the first element)
-            unique_words = [TOKEN_PADDING, TOKEN_UNKNOWN, TOKEN_DATE, TOKEN_TIME, TOKEN_NUMBER] + \
-                           [
-                               word
-                               for word
-                               in unique_words
-                               if word not in [TOKEN_PADDING, TOKEN_UNKNOWN, TOKEN_DATE, TOKEN_TIME, TOKEN_NUMBER]
-                           ]
-            self._word2idx = {k: v for v, k in enumerate(unique_words)}
+            vocabulary = special_tokens + \
+                [
+                    word
+                    for word
+                    in vocabulary
+                    if word not in special_tokens
+                ]
+            self._word2idx = {k: v for v, k in enumerate(vocabulary)}
 
             with open(word2idx_pkl, 'wb') as f:
                 pkl.dump(self._word2idx, f, -1)
@@ -528,6 +636,22 @@ class ExperimentConfig(BaseConfig):
 
         logger.debug("Word2idx contains %d entries.", len(self._word2idx))
 
+        # Resolve every surface form once so that the data readers only need a single lookup per token
+        self._token2idx = build_token_resolution_table(
+            unique_words,
+            self._word2idx,
+            self.token_lookup_suffixes,
+            self.num_oov_buckets
+        )
+        logger.debug("Token resolution table contains %d entries.", len(self._token2idx))
+
+        # The mappings are part of the cache keys of the data readers and the batches. Hashing them is expensive, i.e.
+        # it is only done once.
+        self._token2idx_key = get_mapping_key(self._token2idx)
+        self._char2idx_key = get_mapping_key(self._char2idx) if self._char2idx is not None else None
+        for task in self.tasks:
+            task.data_reader.add_mapping_key(self._token2idx, self._token2idx_key)
+
         self._prepared = result
         return result
 
@@ -546,6 +670,51 @@ class ExperimentConfig(BaseConfig):
         if not word_dropout_valid:
             logger.warn("Word rnn_dropout_output_keep_probability of %f is not valid. Must be in interval [0.0, 1.0]", self.word_dropout_keep_probability)
 
+        vocabulary_valid = (self.max_vocab_size is None or self.max_vocab_size > 0) and self.num_oov_buckets >= 0
+
+        if not vocabulary_valid:
+            logger.warn(
+                "Vocabulary settings are invalid. Settings: max_vocab_size=%s, num_oov_buckets=%s",
+                self.max_vocab_size,
+                self.num_oov_buckets
+            )
+
+        batch_buckets_valid = self.batch_buckets is None or (
+            len(self.batch_buckets) > 0 and
+            all([boundary > 0 for boundary in self.batch_buckets]) and
+            list(self.batch_buckets) == sorted(set(self.batch_buckets))
+        )
+
+        if not batch_buckets_valid:
+            logger.warn(
+                "Batch buckets %s are invalid. Must be strictly increasing positive sentence lengths.",
+                self.batch_buckets
+            )
+
+        batch_budgets_valid = (self.max_tokens_per_batch is None or self.max_tokens_per_batch > 0) and \
+            (self.max_characters_per_batch is None or self.max_characters_per_batch > 0) and \
+            self.prefetch_batches >= 0
+
+        if not batch_budgets_valid:
+            logger.warn(
+                "Batch settings are invalid. Settings: max_tokens_per_batch=%s, max_characters_per_batch=%s, "
+                "prefetch_batches=%s",
+                self.max_tokens_per_batch,
+                self.max_characters_per_batch,
+                self.prefetch_batches
+            )
+
+        curriculum_valid = self.curriculum in VALID_ITERATIONS and self.curriculum_temperature > 0
+
+        if not curriculum_valid:
+            logger.warn(
+                "Curriculum settings are invalid. Valid curricula are %s. Settings: curriculum=%s, "
+                "curriculum_temperature=%s",
+                VALID_ITERATIONS,
+                self.curriculum,
+                self.curriculum_temperature
+            )
+
         eval_metrics_valid = all([metric in VALID_METRICS for metric in self.eval_metrics])
 
         if not eval_metrics_valid:
@@ -585,6 +754,10 @@ class ExperimentConfig(BaseConfig):
 
         return all([
             word_dropout_valid,
+            vocabulary_valid,
+            batch_buckets_valid,
+            batch_budgets_valid,
+            curriculum_valid,
             eval_metrics_valid,
             rnn_settings_valid,
             tasks_valid,
@@ -598,7 +771,20 @@ class ExperimentConfig(BaseConfig):
             "num_runs": self.num_runs,
             "epochs": self.epochs,
             "batch_size": self.batch_size,
+            "batch_buckets": self.batch_buckets,
+            "max_tokens_per_batch": self.max_tokens_per_batch,
+            "max_characters_per_batch": self.max_characters_per_batch,
+            "prefetch_batches": self.prefetch_batches,
+            "use_input_queue": self.use_input_queue,
+            "joint_training": self.joint_training,
+            "mixed_batches": self.mixed_batches,
             "curriculum": self.curriculum,
+            "curriculum_temperature": self.curriculum_temperature,
+            "stream_data": self.stream_data,
+            "compiled_data": self.compiled_data,
+            "num_parse_processes": self.num_parse_processes,
+            "share_parsed_files": self.share_parsed_files,
+            "use_string_table": self.use_string_table,
             "units": self.units,
             "short_cut_connections": self.short_cut_connections,
             "label_connections": self.label_connections,
@@ -614,6 +800,9 @@ class ExperimentConfig(BaseConfig):
             "vocab_size": self.vocab_size,
             "word_dropout_keep_probability": self.word_dropout_keep_probability,
             "eval_metrics": self.eval_metrics,
+            "token_lookup_suffixes": self.token_lookup_suffixes,
+            "max_vocab_size": self.max_vocab_size,
+            "num_oov_buckets": self.num_oov_buckets,
             "early_stopping": self.early_stopping.to_dict() if self.early_stopping is not None else None,
             "character_level_information":
                 self.character_level_information.to_dict()
@@ -678,6 +867,74 @@ class ExperimentConfig(BaseConfig):
         """
         return self._batch_size
 
+    @property
+    def batch_buckets(self):
+        """
+
+        Returns:
+            `list` of int or None: upper bounds of the sentence length buckets that are used to group sentences into
+                batches. None means that only sentences of the same length are grouped together.
+        """
+        return self._batch_buckets
+
+    @property
+    def max_tokens_per_batch(self):
+        """
+
+        Returns:
+            int or None: maximum number of (padded) tokens per batch. None means that the batch size is used.
+        """
+        return self._max_tokens_per_batch
+
+    @property
+    def max_characters_per_batch(self):
+        """
+
+        Returns:
+            int or None: maximum number of (padded) characters per batch if character-level information is used.
+                None means no limit.
+        """
+        return self._max_characters_per_batch
+
+    @property
+    def prefetch_batches(self):
+        """
+
+        Returns:
+            int: number of batches whose input is prepared in the background during training. 0 disables prefetching.
+        """
+        return self._prefetch_batches
+
+    @property
+    def use_input_queue(self):
+        """
+
+        Returns:
+            bool: whether or not the network inputs are enqueued into a TensorFlow queue by a background thread instead
+                of being fed with each step
+        """
+        return self._use_input_queue
+
+    @property
+    def joint_training(self):
+        """
+
+        Returns:
+            bool: whether or not tasks that are trained on the same sentences are trained jointly, i.e. with one update
+                for the sum of their losses per batch
+        """
+        return self._joint_training
+
+    @property
+    def mixed_batches(self):
+        """
+
+        Returns:
+            bool: whether or not batches of different tasks are combined into one training step that optimizes the sum
+                of the task losses weighted by `loss_weight`
+        """
+        return self._mixed_batches
+
     @property
     def curriculum(self):
         """
@@ -687,6 +944,61 @@ class ExperimentConfig(BaseConfig):
         """
         return self._curriculum
 
+    @property
+    def curriculum_temperature(self):
+        """
+
+        Returns:
+            float: temperature of the `random-temperature` curriculum. Tasks are chosen with a probability proportional
+                to `num_batches ** (1 / curriculum_temperature)`.
+        """
+        return self._curriculum_temperature
+
+    @property
+    def stream_data(self):
+        """
+
+        Returns:
+            bool: whether or not the data readers stream the samples from the data files instead of caching them
+        """
+        return self._stream_data
+
+    @property
+    def compiled_data(self):
+        """
+
+        Returns:
+            bool: whether or not batches are sliced out of compiled, memory-mapped corpora instead of sample lists
+        """
+        return self._compiled_data
+
+    @property
+    def num_parse_processes(self):
+        """
+
+        Returns:
+            int: number of processes that the data readers use to parse a data file
+        """
+        return self._num_parse_processes
+
+    @property
+    def share_parsed_files(self):
+        """
+
+        Returns:
+            bool: whether or not each data file is parsed only once and shared by the data readers of all tasks
+        """
+        return self._share_parsed_files
+
+    @property
+    def use_string_table(self):
+        """
+
+        Returns:
+            bool: whether or not samples store their raw tokens and labels as indices into a shared string table
+        """
+        return self._use_string_table
+
     @property
     def units(self):
         """
@@ -873,6 +1185,51 @@ class ExperimentConfig(BaseConfig):
         """
         return self._word2idx
 
+    @property
+    def token2idx(self):
+        """
+
+        Returns:
+             `dict` of int: a mapping from all surface forms in the data to their indices in `word2idx`
+        """
+        return self._token2idx
+
+    @property
+    def token2idx_key(self):
+        """
+
+        Returns:
+            str: key that identifies the content of `token2idx` (see `get_mapping_key`)
+        """
+        return self._token2idx_key
+
+    @property
+    def token_lookup_suffixes(self):
+        """
+
+        Returns:
+            `list` of str: suffixes that are tried (in this order) when looking up a token in the vocabulary
+        """
+        return self._token_lookup_suffixes
+
+    @property
+    def max_vocab_size(self):
+        """
+
+        Returns:
+            int or None: maximum number of (most frequent) words in the vocabulary. None means no limit.
+        """
+        return self._max_vocab_size
+
+    @property
+    def num_oov_buckets(self):
+        """
+
+        Returns:
+            int: number of buckets with their own embeddings that out-of-vocabulary words are hashed into
+        """
+        return self._num_oov_buckets
+
     @property
     def char2idx(self):
         """
@@ -882,6 +1239,55 @@ class ExperimentConfig(BaseConfig):
         """
         return self._char2idx
 
+    @property
+    def char2idx_key(self):
+        """
+
+        Returns:
+            str or None: key that identifies the content of `char2idx` (see `get_mapping_key`), None if no characters
+                are used
+        """
+        return self._char2idx_key
+
+    @property
+    def string_table(self):
+        """
+
+        Returns:
+            StringTable or None: the string table that stores the raw tokens and labels of the samples of all tasks
+                (see `use_string_table`). It is not pickled with the samples and has to be attached to loaded samples.
+        """
+        return self._string_table
+
+    @property
+    def form2idx(self):
+        """
+
+        Returns:
+             `dict` of int: a mapping from all surface forms in the data to rows of `char_matrix`. Only available if
+                character level information is used.
+        """
+        return self._form2idx
+
+    @property
+    def char_matrix(self):
+        """
+
+        Returns:
+             np.ndarray: character indices of all surface forms with shape (number of forms + 1, maximum word length).
+                Row 0 is reserved for padding. Only available if character level information is used.
+        """
+        return self._char_matrix
+
+    @property
+    def char_lengths(self):
+        """
+
+        Returns:
+             np.ndarray: number of characters of all surface forms (rows of `char_matrix`)
+        """
+        return self._char_lengths
+
     @property
     def prepared(self):
         """
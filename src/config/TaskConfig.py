@@ -59,7 +59,7 @@ class TaskConfig(BaseConfig):
         assert test_file is None or isinstance(test_file, FileConfig)
         assert isinstance(hidden_layers, HiddenLayerConfig) or isinstance(hidden_layers, list)
         assert isinstance(loss, str) or callable(loss)
-        assert isinstance(loss_weight, float)
+        assert isinstance(loss_weight, float) and loss_weight >= 0.0
         assert isinstance(eval_metrics, list)
         assert isinstance(classifier, str) and (classifier == CLASSIFIER_CRF or classifier == CLASSIFIER_SOFTMAX)
         assert isinstance(data_format, str)
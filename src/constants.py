@@ -8,6 +8,16 @@ ITERATION_RANDOM_FAIR = "random-fair"
 ITERATION_RANDOM_ALL = "random-all"
 ITERATION_SEQUENTIAL_FAIR = "sequential-fair"
 ITERATION_SEQUENTIAL_ALL = "sequential-all"
+ITERATION_RANDOM_PROPORTIONAL = "random-proportional"
+ITERATION_RANDOM_TEMPERATURE = "random-temperature"
+VALID_ITERATIONS = [
+    ITERATION_RANDOM_FAIR,
+    ITERATION_RANDOM_ALL,
+    ITERATION_SEQUENTIAL_FAIR,
+    ITERATION_SEQUENTIAL_ALL,
+    ITERATION_RANDOM_PROPORTIONAL,
+    ITERATION_RANDOM_TEMPERATURE,
+]
 
 # Token types
 TOKEN_PADDING = "<__PADDING__>"
@@ -15,17 +25,34 @@ TOKEN_UNKNOWN = "<__UNKNOWN__>"
 TOKEN_DATE = "<__DATE__>"
 TOKEN_TIME = "<__TIME__>"
 TOKEN_NUMBER = "<__NUMBER__>"
+# Template for the tokens of the buckets that out-of-vocabulary words are hashed into
+TOKEN_OOV_BUCKET = "<__OOV_BUCKET_%d__>"
 
 DOCSTART = "DOCSTART"
 
+# Suffixes that are tried (in this order) when looking up a token in the vocabulary.
+# The suffixes are used for bilingual embeddings.
+TOKEN_LOOKUP_SUFFIXES = ["", "_de", "_en"]
+
 # Data formats
 CONLL = "CONLL"
 
+# Embeddings file formats
+EMBEDDINGS_FORMAT_TEXT = "text"
+EMBEDDINGS_FORMAT_FASTTEXT = "fasttext"
+EMBEDDINGS_FORMAT_WORD2VEC = "word2vec"
+VALID_EMBEDDINGS_FORMATS = [
+    EMBEDDINGS_FORMAT_TEXT,
+    EMBEDDINGS_FORMAT_FASTTEXT,
+    EMBEDDINGS_FORMAT_WORD2VEC,
+]
+
 # Data output formats
 DATA_OUT_RAW = "raw"
 DATA_OUT_INDEX = "index"
 DATA_OUT_PADDED = "padded"
 DATA_OUT_PADDED_RIGHT = "padded-right"
+DATA_OUT_COMPILED = "compiled"
 
 # Data types
 DATA_TYPE_TRAIN = "train"
@@ -39,6 +66,8 @@ CLASSIFIER_CRF = "CRF"
 # Directories
 DIR_OUT = "out"
 DIR_PKL = "pkl"
+DIR_EMBEDDINGS_CACHE = "embeddings_cache"
+DIR_BATCHES_CACHE = "batches_cache"
 DIR_SRC = "src"
 DIR_DATA = "data"
 DIR_RUN = "run-%03d"
@@ -45,6 +45,53 @@ class BaseDataReader(object):
         """
         raise NotImplementedError("Must define `add_name` to use this base class")
 
+    @abstractmethod
+    def add_num_processes(self, num_processes):
+        """
+        Set the number of processes that are used to parse a data file.
+        Args:
+            num_processes (int): Number of processes. 1 parses the files in the current process.
+        """
+        raise NotImplementedError("Must define `add_num_processes` to use this base class")
+
+    @abstractmethod
+    def add_file_registry(self, file_registry):
+        """
+        Set a registry that parses each file only once and shares the parsed files with other data readers.
+        Args:
+            file_registry (object): The registry. The supported type depends on the data reader.
+        """
+        raise NotImplementedError("Must define `add_file_registry` to use this base class")
+
+    @abstractmethod
+    def add_string_table(self, string_table, file_path=None):
+        """
+        Set a string table that stores the raw tokens and labels of the samples.
+        Args:
+            string_table (StringTable): The string table
+            file_path (str, optional): Path of the file that persists the string table next to cached samples
+        """
+        raise NotImplementedError("Must define `add_string_table` to use this base class")
+
+    @abstractmethod
+    def add_token_lookup_suffixes(self, suffixes):
+        """
+        Set the suffixes that are tried when a token is looked up in a word-to-index mapping.
+        Args:
+            suffixes (`list` of str): Suffixes in the order in which they are tried
+        """
+        raise NotImplementedError("Must define `add_token_lookup_suffixes` to use this base class")
+
+    @abstractmethod
+    def add_mapping_key(self, mapping, key):
+        """
+        Set the precomputed key of a word-to-index mapping that is part of the cache paths of indexed data.
+        Args:
+            mapping (`dict` of int): The mapping
+            key (str): Key of the mapping
+        """
+        raise NotImplementedError("Must define `add_mapping_key` to use this base class")
+
     @property
     @abstractproperty
     def files(self):
@@ -55,7 +102,7 @@ class BaseDataReader(object):
         pass
 
     @abstractmethod
-    def get_data(self, data_type="train", out_format="padded", word2idx=None):
+    def get_data(self, data_type="train", out_format="padded", word2idx=None, stream=False):
         """Get the data from the corpus.
 
         Get the data from the corpus. The user can choose the type and format of the data.
@@ -67,12 +114,16 @@ class BaseDataReader(object):
             out_format (str): The format of the data. One of "padded" (words represented by
                 their indices and padded by the index for <MASK>), "padded-right" (as "padded",
                 but padding is applied from the right and not from the left) "index" (words represented
-                by their indices) or "raw" (words in their original form).
-            word2idx (`dict` of int): Mapping from words to indices. Only used for "padded"
-                and "index". If not supplied, using `self.get_words(out_format="word2idx")`.
+                by their indices), "raw" (words in their original form) or "compiled" (words represented by their
+                indices in memory-mapped arrays).
+            word2idx (`dict` of int): Mapping from words to indices. Only used for "padded", "index",
+                and "compiled". If not supplied, using `self.get_words(out_format="word2idx")`.
+            stream (bool, optional): Whether to return a lazy iterator over the samples instead of a list. A streaming
+                data reader reads the samples directly from the file and does not cache them, i.e. it uses constant
+                memory regardless of the size of the corpus.
 
         Returns:
-            `tuple` of ndarray or `tuple` of `list` of int or `tuple` of `list` of str: The data.
+            `tuple` of ndarray or `tuple` of `list` of int or `tuple` of `list` of str or iterator: The data.
         """
         raise NotImplementedError("Must define `get_data` to use this base class.")
 
@@ -108,6 +159,20 @@ class BaseDataReader(object):
         """
         raise NotImplementedError("Must define `get_labels` to use this base class.")
 
+    @abstractmethod
+    def get_statistics(self, data_type="train"):
+        """Get the statistics of the data.
+
+        The statistics contain the vocabulary, the labels, the characters, and histograms of sentence and token lengths.
+
+        Args:
+            data_type (str): The type of data. One of "train", "dev" or "test".
+
+        Returns:
+            CorpusStatistics: The statistics
+        """
+        raise NotImplementedError("Must define `get_statistics` to use this base class.")
+
     @abstractmethod
     def get_max_sequence_length(self):
         """Determine the maximum sequence length.
@@ -3,7 +3,8 @@ import numpy as np
 
 
 class Batch(object):
-    def __init__(self, labels, tokens, samples, characters=None):
+    def __init__(self, labels, tokens, samples, characters=None, sequence_lengths=None, word_lengths=None,
+                 task_labels=None):
         """
         Initialize the batch object.
 
@@ -13,20 +14,33 @@ class Batch(object):
             samples (`list` of Sample): A list of samples that serve as a source for the label and token matrices.
             characters (np.ndarray, optional): A matrix of characters with shape
                 (batch size, sequence length, word length)
+            sequence_lengths (np.ndarray, optional): True length of each sentence with shape (batch size). Only required
+                if the sentences are padded, defaults to the sequence length of the matrices otherwise.
+            word_lengths (np.ndarray, optional): True length of each token with shape (batch size, sequence length).
+                Padding tokens have length 0. Defaults to the word length of the character tensor.
+            task_labels (`dict` of np.ndarray, optional): Label matrices of further tasks that share the sentences of
+                this batch (see `joint_training`), each with shape (batch size, sequence length)
         """
         self._characters = characters
         self._samples = samples
         self._tokens = tokens
         self._labels = labels
+        self._task_labels = task_labels
 
         # Calculated values
         # shape = (batch size)
-        self._sequence_lengths = np.ones(labels.shape[0]) * labels.shape[1]
-        if characters is not None:
-            # shape = (batch size, sequence length)
-            self._word_lengths = np.ones((characters.shape[0], characters.shape[1])) * characters.shape[2]
+        if sequence_lengths is not None:
+            self._sequence_lengths = np.asarray(sequence_lengths, dtype=np.int32)
         else:
+            self._sequence_lengths = np.full(labels.shape[0], labels.shape[1], dtype=np.int32)
+        if characters is None:
             self._word_lengths = None
+        elif word_lengths is not None:
+            # shape = (batch size, sequence length)
+            self._word_lengths = np.asarray(word_lengths, dtype=np.int32)
+        else:
+            # shape = (batch size, sequence length)
+            self._word_lengths = np.full((characters.shape[0], characters.shape[1]), characters.shape[2], dtype=np.int32)
 
     @property
     def characters(self):
@@ -51,3 +65,7 @@ class Batch(object):
     @property
     def word_lengths(self):
         return self._word_lengths
+
+    @property
+    def task_labels(self):
+        return self._task_labels
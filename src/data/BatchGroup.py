@@ -0,0 +1,139 @@
+"""Class to store the sentences of several batches in contiguous matrices"""
+import numpy as np
+
+from Batch import Batch
+from LazySamples import LazySamples
+
+
+class BatchGroup(object):
+    def __init__(self, labels, tokens, sample_ids, sequence_lengths, characters=None, word_lengths=None):
+        """
+        Initialize the group. All sentences of a group have the same length (or fall into the same length bucket) and
+        are stored in one contiguous matrix per input. The batches of the group are views on consecutive rows of these
+        matrices, i.e. building a batch does not copy any data. Once the order of the sentences is changed (see
+        `set_order`), a batch gathers its rows from the matrices instead.
+
+        Args:
+            labels (np.ndarray): A matrix of labels with shape (number of sentences, sequence length)
+            tokens (np.ndarray): A matrix of tokens with shape (number of sentences, sequence length)
+            sample_ids (np.ndarray or `list` of int): Indices of the sentences in the data of the task. The samples
+                themselves are not stored (and not pickled), they are resolved when a batch needs them.
+            sequence_lengths (np.ndarray): True length of each sentence with shape (number of sentences)
+            characters (np.ndarray, optional): A matrix of characters with shape
+                (number of sentences, sequence length, word length)
+            word_lengths (np.ndarray, optional): True length of each token with shape
+                (number of sentences, sequence length). Padding tokens have length 0.
+        """
+        self._labels = np.ascontiguousarray(labels, dtype=np.int32)
+        self._tokens = np.ascontiguousarray(tokens, dtype=np.int32)
+        self._sample_ids = np.asarray(sample_ids, dtype=np.int64)
+        self._sequence_lengths = np.ascontiguousarray(sequence_lengths, dtype=np.int32)
+        self._characters = None if characters is None else np.ascontiguousarray(characters, dtype=np.int32)
+        self._word_lengths = None if word_lengths is None else np.ascontiguousarray(word_lengths, dtype=np.int32)
+        # Label matrices of further tasks that share the sentences of the group
+        self._task_labels = {}
+        # Rows of the matrices in the order in which the sentences are used, None for the stored order
+        self._order = None
+
+    def __len__(self):
+        return len(self._sequence_lengths)
+
+    def add_task_labels(self, task_name, labels):
+        """
+        Add the labels of a further task for the sentences of the group (in the same order).
+
+        Args:
+            task_name (str): Name of the task
+            labels (np.ndarray): A matrix of labels with the same shape as the labels of the group
+
+        Returns:
+            None
+        """
+        assert labels.shape == self._labels.shape
+        self._task_labels[task_name] = np.ascontiguousarray(labels, dtype=np.int32)
+
+    def get_batch(self, start, end, get_samples):
+        """
+        Build a batch from the sentences `start` to `end` (exclusive) of the group (in the order of `set_order`). The
+        matrices of the batch are cropped to the longest sentence (and the longest token) of the batch. They are views
+        unless the order of the sentences was changed. Then only the rows of the batch are copied.
+
+        Args:
+            start (int): Index of the first sentence
+            end (int): Index after the last sentence
+            get_samples (function): Resolves sentence indices to samples. It is only called when the samples of the
+                batch are accessed (see `LazySamples`).
+
+        Returns:
+            Batch: The batch
+        """
+        rows = slice(start, end) if self._order is None else self._order[start:end]
+
+        sequence_lengths = self._sequence_lengths[rows]
+        width = int(sequence_lengths.max()) if end > start else 0
+
+        characters = None
+        word_lengths = None
+        if self._characters is not None:
+            word_lengths = self._word_lengths[rows, :width]
+            max_token_length = int(word_lengths.max()) if word_lengths.size > 0 else 0
+            characters = self._characters[rows, :width, :max_token_length]
+
+        task_labels = None
+        if self._task_labels:
+            task_labels = {
+                task_name: labels[rows, :width]
+                for task_name, labels in self._task_labels.items()
+            }
+
+        return Batch(
+            self._labels[rows, :width],
+            self._tokens[rows, :width],
+            LazySamples(get_samples, self._sample_ids[rows]),
+            characters,
+            sequence_lengths,
+            word_lengths,
+            task_labels
+        )
+
+    def set_order(self, order):
+        """
+        Set the order in which the sentences of the group are used for batches. The matrices are not reordered, the
+        batches gather their rows instead (see `get_batch`).
+
+        Args:
+            order (np.ndarray): Permutation of the rows of the matrices of the group
+
+        Returns:
+            None
+        """
+        assert len(order) == len(self)
+        self._order = np.asarray(order, dtype=np.int64)
+
+    @property
+    def sample_ids(self):
+        return self._sample_ids
+
+    @property
+    def labels(self):
+        return self._labels
+
+    @property
+    def tokens(self):
+        return self._tokens
+
+    @property
+    def characters(self):
+        return self._characters
+
+    @property
+    def sequence_lengths(self):
+        return self._sequence_lengths
+
+    @property
+    def word_lengths(self):
+        return self._word_lengths
+
+    @property
+    def task_labels(self):
+        return self._task_labels
@@ -1,50 +1,139 @@
 """Class to create batches from a configuration"""
+import cPickle as pkl
+import hashlib
 import logging
 import math
+import os
 import random
+from bisect import bisect_left
 
 import numpy as np
 
-from Batch import Batch
+from BatchGroup import BatchGroup
+from TaskSampler import TaskSampler
 from config.ExperimentConfig import ExperimentConfig
-from constants import DATA_OUT_INDEX, DATA_TYPE_TEST, DATA_TYPE_DEV
+from constants import DATA_OUT_INDEX, DATA_OUT_COMPILED, DATA_TYPE_TEST, DATA_TYPE_DEV
 from constants import DATA_TYPE_TRAIN
 
+# Changes whenever the pickled layout of `Batches` changes, so that old cache files are not loaded
+BATCHES_CACHE_VERSION = 4
+
 
 class Batches(object):
     def __init__(self, config, data_type=DATA_TYPE_TRAIN, no_mini_batches=False):
         """
         Initialize the batches by loading the training data from the configuration file.
 
-        Populates the `_batches` property with a dict that matches each task to batches.
-        Each item in a batch is a tuple of list of labels, list of tokens, and list of sample objects.
+        Populates the `_groups` and `_batch_ranges` properties. The batches of each task are built from them when they
+        are iterated (see `_get_batch`).
 
         Args:
             config (ExperimentConfig): Configuration object
             data_type (str): type of data (train, dev or test)
             no_mini_batches (bool): whether to use mini batches or not, i.e. whether to use the batch_size specified
-                in the configuration file or just build one batch for each sequence length
+                in the configuration file or just build one batch for each sequence length (or length bucket)
+
+        If the configuration specifies `batch_buckets`, sentences are not grouped by their exact length but by the
+        length bucket they fall into. Sentences within a batch are then padded from the right to the longest sentence of
+        the batch and the batch holds their true lengths.
+
+        The sentences of each length (or length bucket) are stored in contiguous matrices (see `BatchGroup`) and the
+        batches are views on consecutive rows of these matrices. Unless the data is compiled, the samples are read
+        twice: first only the sentence lengths are kept to form the groups, then the samples are written into the
+        matrices of their groups. The memory consumption is therefore bounded by the matrices and (if the configuration
+        specifies `stream_data`) does not include the samples themselves.
+
+        If the configuration specifies `max_tokens_per_batch` (and/or `max_characters_per_batch`), the number of
+        sentences per batch is chosen so that the padded batches do not exceed that number of tokens (characters)
+        instead of using a fixed batch size.
+
+        If the configuration specifies `joint_training`, tasks that share their training sentences with a previous task
+        (see `find_joint_task_groups`) do not get batches of their own. Their labels are added to the batches of the
+        first task of the group instead (see `Batch.task_labels`).
         """
         assert isinstance(config, ExperimentConfig)
         assert data_type in [DATA_TYPE_TRAIN, DATA_TYPE_DEV, DATA_TYPE_TEST]
         logger = logging.getLogger("shared.Batches.__init__")
 
-        self._batches = {}
+        self._groups = {}
+        self._batch_ranges = {}
+        # Tasks whose labels are part of the batches of another task (see `joint_training`)
+        self._joint_tasks = {}
+        self._joint_leaders = {}
         self._config = config
+        self._data_type = data_type
+
+        joint_leaders = {}
+        if config.joint_training and data_type == DATA_TYPE_TRAIN:
+            for task_names in find_joint_task_groups(config):
+                for task_name in task_names[1:]:
+                    joint_leaders[task_name] = task_names[0]
+        # Sentences of the first task of each joint group in their batch order
+        joint_sources = {}
 
         logger.debug("Building batches for %d tasks", len(config.tasks))
         for task in config.tasks:
             logger.debug("Task: %s", task.name)
-            data = task.data_reader.get_data(data_type, DATA_OUT_INDEX, word2idx=config.word2idx)
-            # Sort by sentence length
-            data.sort(key=lambda sample: sample.len)
+            if task.name in joint_leaders:
+                logger.debug(
+                    "Adding the labels of task %s to the batches of task %s",
+                    task.name,
+                    joint_leaders[task.name]
+                )
+                self._join_task(task, data_type, joint_leaders[task.name], joint_sources[joint_leaders[task.name]])
+                continue
+
+            corpus = None
+            corpus_form2idx = None
+            if config.compiled_data:
+                corpus = task.data_reader.get_data(data_type, DATA_OUT_COMPILED, word2idx=config.token2idx)
+                if config.character_level_information:
+                    # Map the surface forms of the corpus to rows of the character matrix.
+                    # The last entry maps the padding index -1 to row 0 (padding).
+                    corpus_form2idx = np.asarray(
+                        [config.form2idx[form] for form in corpus.form_strings] + [0],
+                        dtype=np.int32
+                    )
+                sentence_lengths = np.asarray(corpus.lengths)
+            else:
+                # First pass over the samples: only the length (and the length of the longest token) of each sentence
+                # is kept. The matrices are filled in a second pass (see `_read_group_matrices`), i.e. the samples are
+                # never held in memory at once.
+                sentence_lengths = []
+                sentence_word_lengths = []
+                for sample in task.data_reader.get_data(
+                    data_type,
+                    DATA_OUT_INDEX,
+                    word2idx=config.token2idx,
+                    stream=config.stream_data
+                ):
+                    sentence_lengths.append(sample.len)
+                    if config.character_level_information:
+                        sentence_word_lengths.append(
+                            config.char_lengths[[config.form2idx[token] for token in sample.raw_tokens]].max()
+                        )
+                sentence_lengths = np.asarray(sentence_lengths, dtype=np.int64)
+                sentence_word_lengths = np.asarray(sentence_word_lengths, dtype=np.int64)
+
+            # Work on sentence indices that are sorted by sentence length. The groups only keep these indices, the
+            # samples are resolved when a batch needs them (see `_get_samples_resolver`).
+            # The sort is stable so that the order is the same as for sorting the samples themselves.
+            data = np.argsort(sentence_lengths, kind="mergesort").tolist()
+            data_lengths = sentence_lengths[data].tolist()
+
+            if config.batch_buckets is not None:
+                # The data is sorted by length, i.e. the bucket indices are sorted as well
+                data_groups = [bisect_left(config.batch_buckets, length) for length in data_lengths]
+            else:
+                data_groups = data_lengths
+
             train_ranges = []
-            old_sent_length = data[0].len
+            old_sent_length = data_groups[0]
             idx_start = 0
 
-            # Find start and end of ranges with sentences with same length
+            # Find start and end of ranges with sentences with same length (or in the same length bucket)
             for idx in xrange(len(data)):
-                sent_length = data[idx].len
+                sent_length = data_groups[idx]
 
                 if sent_length != old_sent_length:
                     train_ranges.append((idx_start, idx))
@@ -54,31 +143,44 @@ class Batches(object):
 
             # Add last sentence
             train_ranges.append((idx_start, len(data)))
-            logger.debug("%d different sentence lengths", len(train_ranges))
+            logger.debug("%d different sentence lengths or length buckets", len(train_ranges))
 
             # Break up ranges into smaller mini batch sizes
             mini_batch_ranges = []
             if no_mini_batches:
                 logger.debug("`no_mini_batches == True` --> not building any mini batches")
-            for batch_range in train_ranges:
+            for group_idx, batch_range in enumerate(train_ranges):
                 range_len = batch_range[1] - batch_range[0]
 
                 if no_mini_batches:
                     bins = 1
                 else:
-                    bins = int(math.ceil(range_len / float(config.batch_size)))
+                    # The data is sorted by length, i.e. the last sentence of the range is the longest one
+                    max_word_length = None
+                    if config.max_characters_per_batch is not None and config.character_level_information:
+                        if corpus is not None:
+                            form_ids = corpus_form2idx[corpus.gather_forms(data[batch_range[0]:batch_range[1]])]
+                            max_word_length = config.char_lengths[form_ids].max()
+                        else:
+                            max_word_length = sentence_word_lengths[data[batch_range[0]:batch_range[1]]].max()
+
+                    max_sentences = find_max_sentences_per_batch(
+                        config,
+                        data_lengths[batch_range[1] - 1],
+                        max_word_length
+                    )
+                    bins = int(math.ceil(range_len / float(max_sentences)))
 
                 bin_size = int(math.ceil(range_len / float(bins)))
 
                 for binNr in range(bins):
-                    start_idx = binNr * bin_size + batch_range[0]
-                    end_idx = min(batch_range[1], (binNr + 1) * bin_size + batch_range[0])
-                    mini_batch_ranges.append((start_idx, end_idx))
+                    # Mini batch ranges are relative to the start of their range (see `BatchGroup`)
+                    start_idx = binNr * bin_size
+                    end_idx = min(range_len, (binNr + 1) * bin_size)
+                    mini_batch_ranges.append((group_idx, start_idx, end_idx))
 
             logger.debug("%d batches", len(mini_batch_ranges))
 
-            self._batches[task.name] = []
-
             # Shuffle training data
             # 1. Shuffle sentences that have the same length
             for data_range in train_ranges:
@@ -87,24 +189,300 @@ class Batches(object):
                     j = random.randint(data_range[0], i)
                     data[i], data[j] = data[j], data[i]
 
+            # Sort the (shuffled) sentences by their longest token so that the character tensors of the batches contain
+            # little padding
+            if config.character_level_information and config.character_level_information.group_by_word_length:
+                for data_range in train_ranges:
+                    range_data = data[data_range[0]:data_range[1]]
+                    if corpus is not None:
+                        range_word_lengths = config.char_lengths[
+                            corpus_form2idx[corpus.gather_forms(range_data)]
+                        ].max(axis=1)
+                    else:
+                        range_word_lengths = sentence_word_lengths[range_data]
+                    # The sort is stable, i.e. sentences with the same longest token stay shuffled
+                    order = np.argsort(range_word_lengths, kind="mergesort")
+                    data[data_range[0]:data_range[1]] = [range_data[idx] for idx in order]
+
             # 2. Shuffle the order of the mini batch ranges
             random.shuffle(mini_batch_ranges)
 
-            for rng in mini_batch_ranges:
-                start, end = rng
-                rng_samples = data[start:end]
-                labels = np.asarray([sample.labels_as_array for sample in rng_samples])
-                tokens = np.asarray([sample.tokens_as_array for sample in rng_samples])
+            positions = None
+            if corpus is None:
+                # Second pass over the samples
+                positions = get_group_positions(data, train_ranges)
+                group_tokens, group_labels, group_form_ids = self._read_group_matrices(
+                    task,
+                    data_type,
+                    positions,
+                    [(end - start, data_lengths[end - 1]) for start, end in train_ranges],
+                    sentence_lengths
+                )
+
+            # Store the sentences of each range in contiguous matrices. The batches are views on these matrices.
+            groups = []
+            for group_idx, data_range in enumerate(train_ranges):
+                range_data = data[data_range[0]:data_range[1]]
+                if corpus is not None:
+                    # Slice the matrices directly out of the compiled corpus
+                    tokens, labels = corpus.gather(range_data)
+                else:
+                    tokens, labels = group_tokens[group_idx], group_labels[group_idx]
 
                 characters = None
+                word_lengths = None
                 if config.character_level_information:
-                    max_token_length = max([sample.get_max_token_length() for sample in rng_samples])
-                    characters = np.asarray([
-                        sample.get_tokens_as_char_ids(config.char2idx, max_token_length)
-                        for sample in rng_samples
-                    ])
+                    if corpus is not None:
+                        form_ids = corpus_form2idx[corpus.gather_forms(range_data)]
+                    else:
+                        form_ids = group_form_ids[group_idx]
+
+                    # Look up the characters of all tokens at once and crop them to the longest token in the range
+                    word_lengths = config.char_lengths[form_ids]
+                    max_token_length = word_lengths.max()
+                    characters = config.char_matrix[:, :max_token_length][form_ids]
+
+                groups.append(BatchGroup(
+                    labels,
+                    tokens,
+                    range_data,
+                    sentence_lengths[range_data],
+                    characters,
+                    word_lengths
+                ))
+
+            self._groups[task.name] = groups
+            self._batch_ranges[task.name] = mini_batch_ranges
+
+            if task.name in joint_leaders.values():
+                joint_sources[task.name] = (corpus, sentence_lengths, data, train_ranges, positions)
+
+    def _join_task(self, task, data_type, leader_name, leader_source):
+        """
+        Add the labels of a task to the groups of another task that is trained on the same sentences.
+
+        Args:
+            task (TaskConfig): The task whose labels are added
+            data_type (str): type of data (train, dev or test)
+            leader_name (str): Name of the task whose groups receive the labels
+            leader_source (tuple): Compiled corpus (or None), sentence lengths in their original order, sentence
+                indices in batch order, ranges of the groups, and the position of each sentence in the groups (or None)
+                of the leading task
+
+        Returns:
+            None
+        """
+        corpus, leader_lengths, data, train_ranges, positions = leader_source
+        groups = self._groups[leader_name]
+
+        if corpus is not None:
+            task_corpus = task.data_reader.get_data(data_type, DATA_OUT_COMPILED, word2idx=self._config.token2idx)
+            aligned = np.array_equal(np.asarray(task_corpus.lengths), leader_lengths)
+        else:
+            try:
+                _, group_labels, _ = self._read_group_matrices(
+                    task,
+                    data_type,
+                    positions,
+                    [group.labels.shape for group in groups],
+                    leader_lengths,
+                    labels_only=True
+                )
+                aligned = True
+            except ValueError:
+                aligned = False
+
+        if not aligned:
+            raise Exception(
+                "`joint_training` requires the same sentences for tasks %s and %s, but they differ." %
+                (leader_name, task.name)
+            )
+
+        for group_idx, (group, data_range) in enumerate(zip(groups, train_ranges)):
+            if corpus is not None:
+                _, labels = task_corpus.gather(data[data_range[0]:data_range[1]])
+            else:
+                labels = group_labels[group_idx]
 
-                self._batches[task.name].append(Batch(labels, tokens, rng_samples, characters))
+            group.add_task_labels(task.name, labels)
+
+        self._joint_tasks.setdefault(leader_name, []).append(task.name)
+        self._joint_leaders[task.name] = leader_name
+
+    def _read_group_matrices(self, task, data_type, positions, group_shapes, sentence_lengths, labels_only=False):
+        """
+        Stream the samples of a task and write their token indices, label indices, and (if character-level information
+        is used) surface form indices into the rows of zero-padded group matrices. Only one sample is held in memory at
+        any time (if the configuration specifies `stream_data`).
+
+        Args:
+            task (TaskConfig): The task
+            data_type (str): type of data (train, dev or test)
+            positions (np.ndarray): Group index and row of each sentence with shape (number of sentences, 2), see
+                `get_group_positions`
+            group_shapes (`list` of `tuple` of int): Number of rows and width of the matrices of each group
+            sentence_lengths (np.ndarray): Expected length of each sentence
+            labels_only (bool, optional): Whether to only read the labels
+
+        Returns:
+            `tuple` of `list` of np.ndarray: The token, label, and surface form matrices of each group. The token and
+                surface form matrices are None if they are not read.
+        """
+        config = self._config
+        read_forms = config.character_level_information and not labels_only
+
+        group_labels = [np.zeros(shape, dtype=np.int32) for shape in group_shapes]
+        group_tokens = None if labels_only else [np.zeros(shape, dtype=np.int32) for shape in group_shapes]
+        # Row 0 of the character matrix is padding
+        group_form_ids = [np.zeros(shape, dtype=np.int32) for shape in group_shapes] if read_forms else None
+
+        num_samples = 0
+        for idx, sample in enumerate(task.data_reader.get_data(
+            data_type,
+            DATA_OUT_INDEX,
+            word2idx=config.token2idx,
+            stream=config.stream_data
+        )):
+            if idx >= len(sentence_lengths) or sample.len != sentence_lengths[idx]:
+                raise ValueError("The samples of task %s changed while the batches were built" % task.name)
+
+            group_idx, row = positions[idx]
+            group_labels[group_idx][row, :sample.len] = sample.labels_as_array
+            if not labels_only:
+                group_tokens[group_idx][row, :sample.len] = sample.tokens_as_array
+            if read_forms:
+                group_form_ids[group_idx][row, :sample.len] = [config.form2idx[token] for token in sample.raw_tokens]
+            num_samples += 1
+
+        if num_samples != len(sentence_lengths):
+            raise ValueError("The samples of task %s changed while the batches were built" % task.name)
+
+        return group_tokens, group_labels, group_form_ids
+
+    def get_joint_tasks(self, task_name):
+        """
+        Get the tasks whose labels are part of the batches of a task (see `joint_training`).
+
+        Args:
+            task_name (str): Name of the task
+
+        Returns:
+            `list` of str: Names of the tasks, empty if the task is trained on its own
+        """
+        return self._joint_tasks.get(task_name, [])
+
+    def __getstate__(self):
+        # The configuration is not pickled, it is attached again when the batches are loaded (see `load_batches`).
+        # The groups only hold sentence indices, i.e. no samples are pickled.
+        state = dict(self.__dict__)
+        state["_config"] = None
+        return state
+
+    def _get_batch(self, task_name, idx):
+        """
+        Build a batch of a task from its group (see `BatchGroup.get_batch`). Batches are only built when they are
+        used, i.e. reshuffling never copies the data of all batches at once.
+
+        Args:
+            task_name (str): Name of the task
+            idx (int): Index of the batch (in the order of `_batch_ranges`)
+
+        Returns:
+            Batch: The batch
+        """
+        group_idx, start, end = self._batch_ranges[task_name][idx]
+        return self._groups[task_name][group_idx].get_batch(start, end, self._get_samples_resolver(task_name))
+
+    def _get_samples_resolver(self, task_name):
+        """
+        Get a function that resolves sentence indices of a task to its samples. The samples are taken from the data
+        reader of the task when they are accessed, i.e. after the configuration is attached again to loaded batches.
+        If the configuration specifies `stream_data`, the samples are streamed from the file and only the requested
+        ones are kept, i.e. the data of the task is never held in memory (or pickled) as a whole.
+
+        Args:
+            task_name (str): Name of the task
+
+        Returns:
+            function: Resolves an array of sentence indices to a sequence of samples
+        """
+        def get_samples(ids):
+            task = [task for task in self._config.tasks if task.name == task_name][0]
+
+            if self._config.compiled_data:
+                corpus = task.data_reader.get_data(
+                    self._data_type,
+                    DATA_OUT_COMPILED,
+                    word2idx=self._config.token2idx
+                )
+                return corpus.get_samples(ids)
+
+            if not self._config.stream_data:
+                samples = task.data_reader.get_data(self._data_type, DATA_OUT_INDEX, word2idx=self._config.token2idx)
+                return [samples[idx] for idx in ids.tolist()]
+
+            # Stream the samples and only keep the requested ones. The file is read up to the last requested sentence.
+            positions = {}
+            for position, idx in enumerate(ids.tolist()):
+                positions.setdefault(idx, []).append(position)
+
+            samples = [None] * len(ids)
+            num_missing = len(positions)
+            for idx, sample in enumerate(task.data_reader.get_data(
+                self._data_type,
+                DATA_OUT_INDEX,
+                word2idx=self._config.token2idx,
+                stream=True
+            )):
+                if num_missing == 0:
+                    break
+
+                if idx in positions:
+                    for position in positions[idx]:
+                        samples[position] = sample
+                    num_missing -= 1
+
+            if num_missing > 0:
+                raise ValueError("The samples of task %s changed after the batches were built" % task_name)
+
+            return samples
+
+        return get_samples
+
+    def reshuffle(self, epoch_seed):
+        """
+        Compose new batches without building the batches again: the sentences of each length (or length bucket) are
+        permuted and then split into the same mini batch ranges as before. The order of the batches is shuffled as
+        well. Only the order of the sentences of each group changes (see `BatchGroup.set_order`), the matrices of the
+        groups are not copied.
+
+        If the configuration specifies `group_by_word_length`, the permuted sentences are sorted by their longest
+        token again.
+
+        Args:
+            epoch_seed (int): Seed for the random permutations, e.g. derived from the epoch number
+
+        Returns:
+            None
+        """
+        rng = np.random.RandomState(epoch_seed)
+        group_by_word_length = (
+            self._config is not None and
+            self._config.character_level_information and
+            self._config.character_level_information.group_by_word_length
+        )
+
+        for task_name in sorted(self._groups.keys()):
+            for group in self._groups[task_name]:
+                order = rng.permutation(len(group))
+                if group_by_word_length:
+                    # The sort is stable, i.e. sentences with the same longest token stay shuffled
+                    max_word_lengths = group.word_lengths.max(axis=1)[order]
+                    order = order[np.argsort(max_word_lengths, kind="mergesort")]
+                group.set_order(order)
+
+            batch_ranges = self._batch_ranges[task_name]
+            self._batch_ranges[task_name] = [batch_ranges[idx] for idx in rng.permutation(len(batch_ranges))]
 
     def iterate_tasks(self):
         """
@@ -113,7 +491,11 @@ class Batches(object):
             generator: A generator for batches. The generator always returns a tuple consisting of the task name and
                 the batch.
         """
-        return ((task, batch) for task, batches in self._batches.items() for batch in batches)
+        return (
+            (task, self._get_batch(task, idx))
+            for task, batch_ranges in self._batch_ranges.items()
+            for idx in xrange(len(batch_ranges))
+        )
 
     def find_min_num_batches(self):
         """
@@ -125,11 +507,11 @@ class Batches(object):
         """
         logger = logging.getLogger("shared.Batches.find_min_num_batches")
 
-        # min([len(batches) for batches in self._batches.values()])
+        # min([len(batch_ranges) for batch_ranges in self._batch_ranges.values()])
         min_num_batches = float("inf")
 
-        for task_name, batches in self._batches.items():
-            num_batches = len(batches)
+        for task_name, batch_ranges in self._batch_ranges.items():
+            num_batches = len(batch_ranges)
             if num_batches < min_num_batches:
                 min_num_batches = num_batches
 
@@ -150,8 +532,8 @@ class Batches(object):
         min_num_batches = self.find_min_num_batches()
 
         for idx in xrange(min_num_batches):
-            for task in self._batches.keys():
-                yield task, self._batches[task][idx]
+            for task in self._batch_ranges.keys():
+                yield task, self._get_batch(task, idx)
 
     def find_total_num_batches(self):
         """
@@ -160,51 +542,77 @@ class Batches(object):
         Returns:
             int: total number of batches
         """
-        return sum([len(batches) for batches in self._batches.values()])
+        return sum([len(batch_ranges) for batch_ranges in self._batch_ranges.values()])
 
     def iterate_batches_randomly(self):
         """
-        Iterate over all batches and choose a batch from a task at random each time.
+        Iterate over all batches and choose a batch from a task at random each time. Each task that has batches left
+        is chosen with the same probability.
 
         Returns:
             generator: A generator for batches. The generator always returns a tuple consisting of the task name and
                 the batch.
         """
         logger = logging.getLogger("shared.Batches.iterate_batches_randomly")
+        logger.debug("Iterating randomly over batches for %d tasks.", len(self._batch_ranges))
 
-        tasks = self._batches.keys()
-        num_tasks = len(tasks)
+        task_batch_indices = {task: range(len(batch_ranges)) for task, batch_ranges in self._batch_ranges.items()}
 
-        task_indices = {task: 0 for task in tasks}
-        task_num_batches = {task: len(self._batches[task]) for task in tasks}
+        return self._iterate_sampled_batches(task_batch_indices, lambda task, num_remaining: 1.0, logger)
 
-        num_batches_total = self.find_total_num_batches()
+    def iterate_batches_proportionally(self):
+        """
+        Iterate over all batches and choose a batch from a task at random each time. Each task is chosen with a
+        probability proportional to its number of remaining batches, i.e. the batches of all tasks are visited in a
+        uniformly random order.
 
-        logger.debug("Iterating randomly over batches for %d tasks.", num_tasks)
-        logger.debug("There are %d batches in total.", num_batches_total)
-        for task, num_batches in task_num_batches.items():
-            logger.debug("Task %s has %d batches.", task, num_batches)
+        Returns:
+            generator: A generator for batches. The generator always returns a tuple consisting of the task name and
+                the batch.
+        """
+        logger = logging.getLogger("shared.Batches.iterate_batches_proportionally")
+        logger.debug("Iterating proportionally over batches for %d tasks.", len(self._batch_ranges))
 
-        def find_task_with_remaining_batches():
-            task = tasks[np.random.randint(0, num_tasks)]
-            t_idx = task_indices[task]
-            t_num_batches = task_num_batches[task]
+        task_batch_indices = {task: range(len(batch_ranges)) for task, batch_ranges in self._batch_ranges.items()}
 
-            if t_idx < t_num_batches:
-                return task
-            else:
-                return find_task_with_remaining_batches()
+        return self._iterate_sampled_batches(
+            task_batch_indices,
+            lambda task, num_remaining: float(num_remaining),
+            logger
+        )
 
-        for idx in xrange(num_batches_total):
-            current_task = find_task_with_remaining_batches()
-            logger.debug(
-                "Current task %s; task index: %d; task batches: %d",
-                current_task,
-                task_indices[current_task],
-                task_num_batches[current_task],
-            )
-            yield current_task, self._batches[current_task][task_indices[current_task]]
-            task_indices[current_task] += 1
+    def iterate_batches_with_temperature(self, temperature):
+        """
+        Iterate over all batches and choose a batch from a task at random each time. Each task that has batches left
+        is chosen with a probability proportional to `num_batches ** (1 / temperature)`, i.e. a temperature of 1
+        prefers tasks with more batches and higher temperatures approach choosing each task with the same probability.
+
+        Args:
+            temperature (float): Sampling temperature (larger than 0)
+
+        Returns:
+            generator: A generator for batches. The generator always returns a tuple consisting of the task name and
+                the batch.
+        """
+        assert temperature > 0
+
+        logger = logging.getLogger("shared.Batches.iterate_batches_with_temperature")
+        logger.debug(
+            "Iterating over batches for %d tasks with temperature %f.",
+            len(self._batch_ranges),
+            temperature
+        )
+
+        task_batch_indices = {task: range(len(batch_ranges)) for task, batch_ranges in self._batch_ranges.items()}
+        task_weights = {
+            task: float(len(batch_ranges)) ** (1.0 / temperature) for task, batch_ranges in self._batch_ranges.items()
+        }
+
+        return self._iterate_sampled_batches(
+            task_batch_indices,
+            lambda task, num_remaining: task_weights[task],
+            logger
+        )
 
     def iterate_batches_fair(self):
         """
@@ -226,45 +634,299 @@ class Batches(object):
             raise Exception("`iterate_batches_fair` is only possible if early stopping is configured. Otherwise the main task cannot be found.")
 
         main_task = self._config.early_stopping.task_name
+        # If the main task joined another task, its labels are part of the batches of that task
+        main_task = self._joint_leaders.get(main_task, main_task)
         logger.debug("Fair iteration over batches for main task %s" % main_task)
 
-        tasks = self._batches.keys()
+        tasks = self._batch_ranges.keys()
         num_tasks = len(tasks)
-        num_batches_main_task = len(self._batches[main_task])
+        num_batches_main_task = len(self._batch_ranges[main_task])
 
         logger.debug("There are %d tasks. The main task has %d batches" % (num_tasks, num_batches_main_task))
 
-        random_batch_indices = { task: random.sample(xrange(len(self._batches[task])), min(num_batches_main_task, len(self._batches[task]))) for task in tasks}
-        # Task indices are used to keep track how many indices from wich task have already been used
-        task_indices = {task: 0 for task in tasks}
-        task_num_batches = {task: len(random_batch_indices[task]) for task in tasks}
+        random_batch_indices = { task: random.sample(xrange(len(self._batch_ranges[task])), min(num_batches_main_task, len(self._batch_ranges[task]))) for task in tasks}
 
         logger.debug("Sampled indices for each task.")
         logger.debug(random_batch_indices)
 
-        num_batches_total = sum(num_batches for num_batches in task_num_batches.values())
-        logger.debug("In total, we have %d batches." % num_batches_total)
+        return self._iterate_sampled_batches(random_batch_indices, lambda task, num_remaining: 1.0, logger)
 
-        def find_task_with_remaining_batches():
-            # Find task which has not been finished yet
-            remaining_tasks_with_batches = [t for t in tasks if task_indices[t] < len(random_batch_indices[t])]
-            task = remaining_tasks_with_batches[np.random.randint(0, len(remaining_tasks_with_batches))]
+    def _iterate_sampled_batches(self, task_batch_indices, get_weight, logger):
+        """
+        Iterate over the specified batches and choose the task of each batch at random (see `TaskSampler`). Drawing a
+        task takes O(log T) steps for T tasks, regardless of how many tasks have no batches left.
 
-            t_idx = task_indices[task]
-            t_num_batches = len(random_batch_indices[task])
+        Args:
+            task_batch_indices (`dict` of `list` of int): Indices of the batches (in order) to use for each task
+            get_weight (function): Computes the (unnormalized) weight of a task from the task name and its number of
+                remaining batches. Only called for tasks that have batches left.
+            logger (logging.Logger): Logger for debug messages
 
-            if t_idx < t_num_batches:
-                return task
-            else:
-                return find_task_with_remaining_batches()
+        Returns:
+            generator: A generator for batches. The generator always returns a tuple consisting of the task name and
+                the batch.
+        """
+        tasks = task_batch_indices.keys()
+        task_indices = [0] * len(tasks)
+        task_num_batches = [len(task_batch_indices[task]) for task in tasks]
+
+        num_batches_total = sum(task_num_batches)
+        logger.debug("There are %d batches in total.", num_batches_total)
+        for task, num_batches in zip(tasks, task_num_batches):
+            logger.debug("Task %s has %d batches.", task, num_batches)
 
-        for idx in xrange(num_batches_total):
-            current_task = find_task_with_remaining_batches()
+        if num_batches_total == 0:
+            return
+
+        sampler = TaskSampler([
+            get_weight(task, num_batches) if num_batches > 0 else 0.0
+            for task, num_batches in zip(tasks, task_num_batches)
+        ])
+
+        for _ in xrange(num_batches_total):
+            task_idx = sampler.sample()
+            current_task = tasks[task_idx]
             logger.debug(
                 "Current task %s; task index: %d; task batches: %d",
                 current_task,
-                task_indices[current_task],
-                task_num_batches[current_task],
+                task_indices[task_idx],
+                task_num_batches[task_idx],
             )
-            yield current_task, self._batches[current_task][random_batch_indices[current_task][task_indices[current_task]]]
-            task_indices[current_task] += 1
+            yield current_task, self._get_batch(current_task, task_batch_indices[current_task][task_indices[task_idx]])
+            task_indices[task_idx] += 1
+
+            num_remaining = task_num_batches[task_idx] - task_indices[task_idx]
+            sampler.set_weight(task_idx, get_weight(current_task, num_remaining) if num_remaining > 0 else 0.0)
+
+
+def get_batches_cache_key(config, data_type=DATA_TYPE_TRAIN, no_mini_batches=False):
+    """
+    Compute a key that identifies the content of batches: the data files, the mappings from words, labels, and
+    characters to indices, and all parameters that affect the batching.
+
+    Args:
+        config (ExperimentConfig): Prepared configuration object
+        data_type (str): type of data (train, dev or test)
+        no_mini_batches (bool): whether to use mini batches or not
+
+    Returns:
+        str: Hexadecimal MD5 hash
+    """
+    data_files = []
+    for task in config.tasks:
+        file_config = {
+            DATA_TYPE_TRAIN: task.train_file,
+            DATA_TYPE_DEV: task.dev_file,
+            DATA_TYPE_TEST: task.test_file,
+        }[data_type]
+
+        if file_config is None:
+            data_files.append((task.name, None))
+            continue
+
+        file_path = os.path.abspath(file_config.path)
+        data_files.append((
+            task.name,
+            file_path,
+            os.path.getsize(file_path),
+            int(os.path.getmtime(file_path)),
+            file_config.word_column,
+            file_config.label_column,
+            file_config.column_separator,
+            file_config.encoding,
+            sorted(task.data_reader.get_labels(out_format="label2idx").items()),
+        ))
+
+    content = [
+        BATCHES_CACHE_VERSION,
+        data_type,
+        no_mini_batches,
+        data_files,
+        config.token2idx_key,
+        config.char2idx_key if config.character_level_information else None,
+        config.character_level_information.to_dict() if config.character_level_information else None,
+        config.batch_size,
+        config.batch_buckets,
+        config.max_tokens_per_batch,
+        config.max_characters_per_batch,
+        config.compiled_data,
+        config.joint_training and data_type == DATA_TYPE_TRAIN,
+    ]
+
+    return hashlib.md5(pkl.dumps(content, -1)).hexdigest()
+
+
+def load_batches(config, cache_path, data_type=DATA_TYPE_TRAIN, no_mini_batches=False):
+    """
+    Load batches from the batch cache or build (and cache) them if they are not cached yet.
+    The cache is keyed by the content of the batches (see `get_batches_cache_key`), i.e. batches are reused by all
+    runs, sessions, and experiments that would build the same batches.
+
+    Args:
+        config (ExperimentConfig): Prepared configuration object
+        cache_path (str): Directory of the batch cache
+        data_type (str): type of data (train, dev or test)
+        no_mini_batches (bool): whether to use mini batches or not
+
+    Returns:
+        Batches: The batches
+    """
+    logger = logging.getLogger("shared.Batches.load_batches")
+
+    batches_pkl = os.path.join(
+        cache_path,
+        "%s_%s.pkl" % (data_type, get_batches_cache_key(config, data_type, no_mini_batches))
+    )
+
+    if os.path.isfile(batches_pkl):
+        logger.debug("Loading %s batches from cache file %s.", data_type, batches_pkl)
+        with open(batches_pkl, "rb") as f:
+            batches = pkl.load(f)
+        batches._config = config
+        return batches
+
+    logger.debug("No cache file for %s batches. Creating them from scratch.", data_type)
+    batches = Batches(config, data_type=data_type, no_mini_batches=no_mini_batches)
+
+    logger.debug("Storing %s batches in cache file %s.", data_type, batches_pkl)
+    # Write to a temporary file first so that concurrent sessions never read an incomplete file
+    tmp_pkl = "%s.%d.tmp" % (batches_pkl, os.getpid())
+    with open(tmp_pkl, "wb") as f:
+        pkl.dump(batches, f, -1)
+    os.rename(tmp_pkl, batches_pkl)
+
+    return batches
+
+
+def find_max_sentences_per_batch(config, max_sentence_length, max_word_length=None):
+    """
+    Determine how many sentences fit into a batch. This is the batch size of the configuration unless a token or
+    character budget is configured. Then, the number of sentences is chosen so that the padded batch stays within the
+    budget. A batch always contains at least one sentence.
+
+    Args:
+        config (ExperimentConfig): Configuration object
+        max_sentence_length (int): Length of the longest sentence, i.e. the width of the padded batch
+        max_word_length (int, optional): Length of the longest token. Only used for the character budget.
+
+    Returns:
+        int: Maximum number of sentences per batch
+    """
+    if config.max_tokens_per_batch is None and config.max_characters_per_batch is None:
+        return config.batch_size
+
+    max_sentences = float("inf")
+
+    if config.max_tokens_per_batch is not None:
+        max_sentences = config.max_tokens_per_batch // max(max_sentence_length, 1)
+
+    if config.max_characters_per_batch is not None and max_word_length is not None:
+        max_sentences = min(
+            max_sentences,
+            config.max_characters_per_batch // max(max_sentence_length * max_word_length, 1)
+        )
+
+    if max_sentences == float("inf"):
+        return config.batch_size
+
+    return max(int(max_sentences), 1)
+
+
+def get_group_positions(data, ranges):
+    """
+    Determine the group and the row within the group of each sentence.
+
+    Args:
+        data (`list` of int): Sentence indices in the order of the groups
+        ranges (`list` of `tuple` of int): Start and end (exclusive) of the sentences of each group in `data`
+
+    Returns:
+        np.ndarray: Group index and row of each sentence (by sentence index) with shape (number of sentences, 2)
+    """
+    positions = np.zeros((len(data), 2), dtype=np.int64)
+
+    for group_idx, (start, end) in enumerate(ranges):
+        range_data = data[start:end]
+        positions[range_data, 0] = group_idx
+        positions[range_data, 1] = np.arange(end - start)
+
+    return positions
+
+
+def pad_rows(rows, padding=0):
+    """
+    Stack rows of (possibly) different lengths into a matrix. Shorter rows are padded from the right.
+
+    Args:
+        rows (`list` of np.ndarray or `list` of `list` of int): Rows of indices
+        padding (int, optional): Index used for padding
+
+    Returns:
+        np.ndarray: Matrix with shape (number of rows, length of the longest row)
+    """
+    width = max([len(row) for row in rows]) if len(rows) > 0 else 0
+    matrix = np.full((len(rows), width), padding, dtype=np.int32)
+
+    for idx, row in enumerate(rows):
+        matrix[idx, :len(row)] = row
+
+    return matrix
+
+
+def find_joint_task_groups(config):
+    """
+    Find groups of tasks that are trained on the same sentences, i.e. that read the words from the same column of the
+    same training file. Only the labels of the tasks differ.
+
+    Args:
+        config (ExperimentConfig): Configuration object
+
+    Returns:
+        `list` of `list` of str: Names of the tasks of each group with more than one task (in the order of the tasks in
+            the configuration)
+    """
+    groups = []
+    group_by_file = {}
+
+    for task in config.tasks:
+        file_config = task.train_file
+        key = (
+            os.path.abspath(file_config.path),
+            file_config.word_column,
+            file_config.column_separator,
+            file_config.encoding,
+        )
+
+        if key not in group_by_file:
+            group_by_file[key] = []
+            groups.append(group_by_file[key])
+
+        group_by_file[key].append(task.name)
+
+    return [task_names for task_names in groups if len(task_names) > 1]
+
+
+def iterate_mixed_batches(iteration_generator):
+    """
+    Combine consecutive batches of different tasks into mixed batches. A mixed batch ends before the next batch of a
+    task that is already part of it, i.e. it holds at most one batch per task and the order of the batches is kept.
+
+    Args:
+        iteration_generator (generator): A generator of tuples consisting of the task name and the batch, e.g.
+            `Batches.iterate_batches_randomly()`
+
+    Returns:
+        generator: A generator of mixed batches. Each mixed batch is a list of tuples consisting of the task name and
+            the batch.
+    """
+    mixed_batch = []
+
+    for task_name, batch in iteration_generator:
+        if task_name in [mixed_task_name for mixed_task_name, _ in mixed_batch]:
+            yield mixed_batch
+            mixed_batch = []
+
+        mixed_batch.append((task_name, batch))
+
+    if len(mixed_batch) > 0:
+        yield mixed_batch
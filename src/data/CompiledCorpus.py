@@ -0,0 +1,347 @@
+"""Memory-mapped columnar representation of a data split"""
+import array
+import cPickle as pkl
+import logging
+import os
+from distutils.dir_util import mkpath
+
+import numpy as np
+
+from Sample import Sample
+
+
+class CompiledCorpus(object):
+    """
+    A data split that is stored as flat int32 arrays on disk and loaded with `np.load(mmap_mode="r")`.
+
+    The directory of a compiled corpus contains the following files:
+        * `tokens.npy`: token (word) indices of all sentences concatenated into a single array
+        * `labels.npy`: label indices of all sentences concatenated into a single array
+        * `forms.npy`: indices of the surface forms (raw tokens) in the string table
+        * `offsets.npy`: start of each sentence in the flat arrays (the last entry is the total number of tokens)
+        * `lengths.npy`: length of each sentence
+        * `strings.pkl`: string table for the surface forms and the label names
+    """
+
+    FILE_TOKENS = "tokens.npy"
+    FILE_LABELS = "labels.npy"
+    FILE_FORMS = "forms.npy"
+    FILE_OFFSETS = "offsets.npy"
+    FILE_LENGTHS = "lengths.npy"
+    FILE_STRINGS = "strings.pkl"
+
+    def __init__(self, directory):
+        """
+        Load a compiled corpus from disk. The arrays are memory-mapped, i.e. loading is (almost) instant and the pages
+        are shared between processes.
+
+        Args:
+            directory (str): Directory of the compiled corpus (see `CompiledCorpus.compile`)
+        """
+        assert CompiledCorpus.exists(directory)
+
+        self._directory = directory
+        self._tokens = _load_array(os.path.join(directory, self.FILE_TOKENS))
+        self._labels = _load_array(os.path.join(directory, self.FILE_LABELS))
+        self._forms = _load_array(os.path.join(directory, self.FILE_FORMS))
+        self._offsets = _load_array(os.path.join(directory, self.FILE_OFFSETS))
+        self._lengths = _load_array(os.path.join(directory, self.FILE_LENGTHS))
+
+        with open(os.path.join(directory, self.FILE_STRINGS), "rb") as f:
+            strings = pkl.load(f)
+
+        self._form_strings = strings["forms"]
+        self._label_strings = strings["labels"]
+
+    @staticmethod
+    def exists(directory):
+        """
+        Check whether a compiled corpus exists in the directory.
+
+        Args:
+            directory (str): Directory of the compiled corpus
+
+        Returns:
+            bool: True if all files of a compiled corpus exist, False otherwise.
+        """
+        return all([
+            os.path.isfile(os.path.join(directory, file_name))
+            for file_name in [
+                CompiledCorpus.FILE_TOKENS,
+                CompiledCorpus.FILE_LABELS,
+                CompiledCorpus.FILE_FORMS,
+                CompiledCorpus.FILE_OFFSETS,
+                CompiledCorpus.FILE_LENGTHS,
+                CompiledCorpus.FILE_STRINGS,
+            ]
+        ])
+
+    @staticmethod
+    def compile(samples, directory, label2idx):
+        """
+        Compile samples into the on-disk format and load the result.
+        The samples are consumed one by one, i.e. they can be streamed from a data reader.
+
+        Args:
+            samples (iterable of Sample): Samples that hold raw data and indices.
+            directory (str): Output directory
+            label2idx (`dict` of int): Mapping from labels to indices. Used to restore the raw labels.
+
+        Returns:
+            CompiledCorpus: The compiled corpus
+        """
+        logger = logging.getLogger("shared.compiled_corpus.compile")
+        logger.debug("Compiling corpus into %s", directory)
+
+        tokens = array.array("i")
+        labels = array.array("i")
+        forms = array.array("i")
+        lengths = array.array("i")
+        form2idx = {}
+
+        for sample in samples:
+            assert isinstance(sample, Sample) and not sample.raw
+            tokens.extend(sample.tokens)
+            labels.extend(sample.labels)
+            forms.extend([form2idx.setdefault(form, len(form2idx)) for form in sample.raw_tokens])
+            lengths.append(sample.len)
+
+        lengths = _to_int32_array(lengths)
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+
+        form_strings = [None] * len(form2idx)
+        for form, idx in form2idx.items():
+            form_strings[idx] = form
+
+        label_strings = [None] * len(label2idx)
+        for label, idx in label2idx.items():
+            label_strings[idx] = label
+
+        mkpath(directory)
+        for file_name, values in [
+            (CompiledCorpus.FILE_TOKENS, tokens),
+            (CompiledCorpus.FILE_LABELS, labels),
+            (CompiledCorpus.FILE_FORMS, forms),
+        ]:
+            np.save(os.path.join(directory, file_name), _to_int32_array(values))
+
+        np.save(os.path.join(directory, CompiledCorpus.FILE_OFFSETS), offsets)
+        np.save(os.path.join(directory, CompiledCorpus.FILE_LENGTHS), lengths)
+
+        # The string table is written last because its existence marks a complete compiled corpus
+        with open(os.path.join(directory, CompiledCorpus.FILE_STRINGS), "wb") as f:
+            pkl.dump({"forms": form_strings, "labels": label_strings}, f, -1)
+
+        logger.debug(
+            "Compiled %d sentences with %d tokens and %d distinct surface forms",
+            len(lengths),
+            offsets[-1],
+            len(form_strings)
+        )
+
+        return CompiledCorpus(directory)
+
+    def gather(self, ids, width=None):
+        """
+        Slice the token and label matrices for the specified sentences directly out of the flat arrays.
+        Sentences that are shorter than `width` are padded with index 0 from the right.
+
+        Args:
+            ids (np.ndarray or `list` of int): Sentence indices
+            width (int, optional): Number of columns of the matrices. Defaults to the length of the longest sentence.
+
+        Returns:
+            `tuple` of np.ndarray: Token and label matrices (in this order) with shape (number of sentences, width)
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+
+        if len(ids) == 0:
+            # Nothing to gather (e.g. an empty corpus)
+            empty = np.zeros((0, width or 0), dtype=np.int32)
+            return empty, empty.copy()
+
+        lengths = self._lengths[ids]
+
+        if width is None:
+            width = int(lengths.max())
+
+        positions = np.arange(width, dtype=np.int64)
+        indices = self._offsets[ids][:, np.newaxis] + positions
+        mask = positions < lengths[:, np.newaxis]
+
+        if mask.all():
+            return np.asarray(self._tokens[indices]), np.asarray(self._labels[indices])
+
+        # Never index out of the flat arrays for padding positions
+        indices = np.where(mask, indices, 0)
+        tokens = np.where(mask, self._tokens[indices], 0).astype(np.int32)
+        labels = np.where(mask, self._labels[indices], 0).astype(np.int32)
+
+        return tokens, labels
+
+    def gather_forms(self, ids, width=None):
+        """
+        Slice the matrix of surface form indices (see `form_strings`) for the specified sentences out of the flat
+        arrays. Sentences that are shorter than `width` are padded with -1 from the right.
+
+        Args:
+            ids (np.ndarray or `list` of int): Sentence indices
+            width (int, optional): Number of columns of the matrix. Defaults to the length of the longest sentence.
+
+        Returns:
+            np.ndarray: Surface form matrix with shape (number of sentences, width)
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+
+        if len(ids) == 0:
+            # Nothing to gather (e.g. an empty corpus)
+            return np.zeros((0, width or 0), dtype=np.int32)
+
+        lengths = self._lengths[ids]
+
+        if width is None:
+            width = int(lengths.max())
+
+        positions = np.arange(width, dtype=np.int64)
+        indices = self._offsets[ids][:, np.newaxis] + positions
+        mask = positions < lengths[:, np.newaxis]
+
+        return np.where(mask, self._forms[np.where(mask, indices, 0)], -1).astype(np.int32)
+
+    def get_sample(self, idx):
+        """
+        Restore a single sample (raw data and indices).
+
+        Args:
+            idx (int): Sentence index
+
+        Returns:
+            Sample: The sample
+        """
+        start, end = self._offsets[idx], self._offsets[idx + 1]
+        labels = self._labels[start:end].tolist()
+
+        return Sample(
+            [self._form_strings[form] for form in self._forms[start:end].tolist()],
+            [self._label_strings[label] for label in labels],
+            self._tokens[start:end].tolist(),
+            labels
+        )
+
+    def get_samples(self, ids):
+        """
+        Get a lazy sequence of samples. Samples are only restored when they are accessed.
+
+        Args:
+            ids (np.ndarray or `list` of int): Sentence indices
+
+        Returns:
+            CompiledSamples: A sequence of samples
+        """
+        return CompiledSamples(self, ids)
+
+    @property
+    def directory(self):
+        """str: Directory of the compiled corpus"""
+        return self._directory
+
+    @property
+    def form_strings(self):
+        """`list` of str: Surface forms that are referenced by the indices of `gather_forms`"""
+        return self._form_strings
+
+    @property
+    def lengths(self):
+        """np.ndarray: Length of each sentence"""
+        return self._lengths
+
+    def __len__(self):
+        return len(self._lengths)
+
+    def __getitem__(self, idx):
+        return self.get_sample(idx)
+
+    def __iter__(self):
+        return (self.get_sample(idx) for idx in xrange(len(self)))
+
+    def __getstate__(self):
+        # Only store the location on disk. Pickling the memory-mapped arrays would copy the whole corpus.
+        return {"directory": self._directory}
+
+    def __setstate__(self, state):
+        self.__init__(state["directory"])
+
+
+class CompiledSamples(object):
+    """
+    Lazy sequence of samples from a compiled corpus.
+    """
+
+    def __init__(self, corpus, ids):
+        """
+        Initialize the sequence.
+
+        Args:
+            corpus (CompiledCorpus): The compiled corpus
+            ids (np.ndarray or `list` of int): Sentence indices
+        """
+        self._corpus = corpus
+        self._ids = np.asarray(ids, dtype=np.int64)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return CompiledSamples(self._corpus, self._ids[idx])
+
+        return self._corpus.get_sample(self._ids[idx])
+
+    def __iter__(self):
+        return (self._corpus.get_sample(idx) for idx in self._ids.tolist())
+
+    def take(self, indices):
+        """
+        Select samples by their position in this sequence.
+
+        Args:
+            indices (np.ndarray or `list` of int): Positions of the samples
+
+        Returns:
+            CompiledSamples: Lazy sequence of the selected samples
+        """
+        return CompiledSamples(self._corpus, self._ids[indices])
+
+
+def _load_array(file_path):
+    """
+    Load an array that was stored with `np.save` as a read-only memory map. Empty arrays cannot be memory-mapped and
+    are loaded into memory instead.
+
+    Args:
+        file_path (str): Path to the .npy file
+
+    Returns:
+        np.ndarray: The array
+    """
+    try:
+        return np.load(file_path, mmap_mode="r")
+    except ValueError:
+        return np.load(file_path)
+
+
+def _to_int32_array(values):
+    """
+    Convert an `array.array` of C integers into an int32 numpy array without copying element by element.
+
+    Args:
+        values (array.array): Integer array
+
+    Returns:
+        np.ndarray: int32 array
+    """
+    if len(values) == 0:
+        return np.zeros(0, dtype=np.int32)
+
+    return np.frombuffer(values, dtype=np.int32)
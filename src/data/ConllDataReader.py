@@ -1,19 +1,27 @@
 """Data reader for files in the CONLL format"""
 
 import codecs
+import hashlib
 import logging
+import os
+from multiprocessing import Pool
 from os import path
 import cPickle as pkl
 import numpy as np
 
 from BaseDataReader import BaseDataReader
+from CompiledCorpus import CompiledCorpus
+from ConllFileRegistry import ConllFileRegistry, find_sentence_boundaries, iterate_conll_sentences, \
+    project_sentence, SHARDS_PER_PROCESS
+from CorpusStatistics import CorpusStatistics
 from Sample import Sample
-from data.preprocess import word_normalize
+from StringTable import StringTable
+from data.preprocess import resolve_token, count_oov_buckets
 from config.FileConfig import FileConfig
 from constants import \
-    DATA_OUT_RAW, DATA_OUT_INDEX, DATA_OUT_PADDED, DATA_OUT_PADDED_RIGHT,\
+    DATA_OUT_RAW, DATA_OUT_INDEX, DATA_OUT_PADDED, DATA_OUT_PADDED_RIGHT, DATA_OUT_COMPILED,\
     DATA_TYPE_TRAIN, DATA_TYPE_DEV, DATA_TYPE_TEST,\
-    DOCSTART, TOKEN_UNKNOWN
+    TOKEN_UNKNOWN, TOKEN_LOOKUP_SUFFIXES
 
 
 class ConllDataReader(BaseDataReader):
@@ -23,14 +31,27 @@ class ConllDataReader(BaseDataReader):
 
     def __init__(self):
         self._files = None
-        self._data = {DATA_OUT_PADDED_RIGHT: {}, DATA_OUT_PADDED: {}, DATA_OUT_INDEX: {}, DATA_OUT_RAW: {}}
+        self._data = {
+            DATA_OUT_PADDED_RIGHT: {},
+            DATA_OUT_PADDED: {},
+            DATA_OUT_INDEX: {},
+            DATA_OUT_RAW: {},
+            DATA_OUT_COMPILED: {},
+        }
         self._words = None
         self._labels = None
         self._word2idx = None
         self._label2idx = None
         self._max_sequence_length = None
+        self._statistics = {}
         self._paths = {}
         self._name = ""
+        self._num_processes = 1
+        self._file_registry = None
+        self._string_table = None
+        self._string_table_path = None
+        self._token_lookup_suffixes = TOKEN_LOOKUP_SUFFIXES
+        self._mapping_key = None
 
     def add_name(self, name):
         """
@@ -68,7 +89,312 @@ class ConllDataReader(BaseDataReader):
         """
         self._paths = paths
 
-    def get_data(self, data_type="train", out_format="padded", word2idx=None):
+    def add_num_processes(self, num_processes):
+        """
+        Set the number of processes that are used to parse a data file.
+        Args:
+            num_processes (int): Number of processes. 1 parses the files in the current process.
+        """
+        assert isinstance(num_processes, int) and num_processes >= 1
+        self._num_processes = num_processes
+
+    def add_file_registry(self, file_registry):
+        """
+        Set a registry that parses each file only once and shares the parsed files with other data readers.
+        Raw data is then taken from the registry instead of being parsed and pickled by this data reader.
+        Args:
+            file_registry (ConllFileRegistry): The registry
+        """
+        assert isinstance(file_registry, ConllFileRegistry)
+        self._file_registry = file_registry
+
+        # The registry keeps each file until all of its readers have read it
+        for file_config in self.files.values():
+            if file_config is not None:
+                file_registry.register(file_config)
+
+    def add_string_table(self, string_table, file_path=None):
+        """
+        Set a string table that stores the raw tokens and labels of the samples read from the files.
+        Samples that come from a file registry (see `add_file_registry`) already share their tokens and do not use
+        the string table.
+        The string table is not pickled with the samples. It is attached again to samples that are loaded from a
+        pickle file, and written to `file_path` whenever samples are pickled so that their indices stay valid in later
+        runs.
+        Args:
+            string_table (StringTable): The string table
+            file_path (str, optional): Path of the file that persists the string table
+        """
+        assert isinstance(string_table, StringTable)
+        self._string_table = string_table
+        self._string_table_path = file_path
+
+    def add_token_lookup_suffixes(self, suffixes):
+        """
+        Set the suffixes that are tried when a token that is not contained in the word-to-index mapping is resolved
+        (see `resolve_token`). They have to be the same as for building the mapping.
+        Args:
+            suffixes (`list` of str): Suffixes in the order in which they are tried
+        """
+        assert isinstance(suffixes, list)
+        self._token_lookup_suffixes = suffixes
+
+    def add_mapping_key(self, mapping, key):
+        """
+        Set the precomputed key of a word-to-index mapping (see `get_mapping_key`) so that it is not computed again
+        whenever the cache path of data indexed with this mapping is determined.
+        Args:
+            mapping (`dict` of int): The mapping
+            key (str): Key of the mapping
+        """
+        assert isinstance(mapping, dict)
+        self._mapping_key = (mapping, key)
+
+    def _get_cache_path(self, data_type, out_format, word2idx=None):
+        """
+        Determine the path (without file extension) under which the data of the specified type and format is cached.
+
+        Args:
+            data_type (str): The type of data. One of "train", "dev" or "test".
+            out_format (str): The format of the data. One of "raw", "index" or "compiled".
+            word2idx (`dict` of int, optional): Mapping from words to indices that the cached data was indexed with.
+                A key of the mapping is part of the path, i.e. data indexed with another mapping (e.g. after changing
+                the embeddings or the vocabulary settings) is not reused.
+
+        Samples that store their raw tokens and labels in a string table (see `add_string_table`) are cached under a
+        different path than samples that store lists of strings.
+
+        Returns:
+            str: Path to the cache
+        """
+        file_config = self.files[data_type]
+        assert isinstance(file_config, FileConfig)
+
+        cache_path = path.join(self._paths["pkl"], "%s_%s_word-col-%d_label-col-%d_%s_%s" % (
+            self._name,
+            file_config.filename,
+            file_config.word_column,
+            file_config.label_column,
+            data_type,
+            out_format
+        ))
+
+        if word2idx is not None:
+            if self._mapping_key is not None and self._mapping_key[0] is word2idx:
+                mapping_key = self._mapping_key[1]
+            else:
+                mapping_key = get_mapping_key(word2idx)
+            cache_path += "_%s" % mapping_key
+
+        if self._string_table is not None and out_format != DATA_OUT_COMPILED:
+            cache_path += "_string-table"
+
+        return cache_path
+
+    def _get_pkl_path(self, data_type, out_format, word2idx=None):
+        """
+        Determine the path of the pickle file that caches the data of the specified type and format.
+
+        Args:
+            data_type (str): The type of data. One of "train", "dev" or "test".
+            out_format (str): The format of the data. One of "raw" or "index".
+            word2idx (`dict` of int, optional): Mapping from words to indices that the cached data was indexed with
+                (see `_get_cache_path`)
+
+        Returns:
+            str: Path to the pickle file
+        """
+        return self._get_cache_path(data_type, out_format, word2idx) + ".pkl"
+
+    def _get_compiled_corpus(self, data_type, word2idx):
+        """
+        Get the data in the compiled, memory-mapped format. If the compiled corpus does not exist on disk yet, it is
+        compiled from samples that are streamed from the file.
+
+        Args:
+            data_type (str): The type of data. One of "train", "dev" or "test".
+            word2idx (`dict` of int): Mapping from words to indices.
+
+        Returns:
+            CompiledCorpus: The compiled corpus
+        """
+        logger = logging.getLogger("shared.conll_data_reader._get_compiled_corpus")
+
+        if data_type not in self._data[DATA_OUT_COMPILED]:
+            if not word2idx:
+                logger.warn("No word-to-index mapping provided for `get_data`."
+                            " Using word-to-index mapping for this task only.")
+                word2idx = self.get_words(out_format="word2idx")
+
+            # The token indices depend on the mapping, i.e. the mapping is part of the cache key
+            directory = self._get_cache_path(data_type, DATA_OUT_COMPILED, word2idx)
+
+            if CompiledCorpus.exists(directory):
+                logger.debug("Loading compiled %s data from %s.", data_type, directory)
+                corpus = CompiledCorpus(directory)
+            else:
+                logger.debug("There is no compiled %s data. Compiling it into %s.", data_type, directory)
+                corpus = CompiledCorpus.compile(
+                    self.get_data(data_type=data_type, out_format=DATA_OUT_INDEX, word2idx=word2idx, stream=True),
+                    directory,
+                    self.get_labels(out_format="label2idx")
+                )
+
+            self._data[DATA_OUT_COMPILED][data_type] = corpus
+
+        return self._data[DATA_OUT_COMPILED][data_type]
+
+    def _read_samples(self, file_config):
+        """
+        Lazily read raw samples from the file described by the file configuration.
+        Only a single sentence is held in memory at any time.
+
+        Args:
+            file_config (FileConfig): The file to read
+
+        Returns:
+            generator: A generator of Sample objects that only hold raw data.
+        """
+        logger = logging.getLogger("shared.conll_data_reader._read_samples")
+        logger.debug("Loading data from file.")
+        logger.debug("Filename: %s", file_config.filename)
+        logger.debug("Word column: %d", file_config.word_column)
+        logger.debug("Label column: %d", file_config.label_column)
+        logger.debug("Column separator: %s" % "space" if file_config.column_separator == " " else "tab")
+
+        if self._file_registry is not None:
+            for sample in self._file_registry.get_samples(file_config):
+                yield sample
+            return
+
+        if self._num_processes > 1:
+            for sample in self._read_samples_parallel(file_config):
+                yield sample
+            return
+
+        # Based on https://github.com/glample/tagger/blob/master/loader.py#L8-L29
+        lines = codecs.open(file_config.path, 'r', 'utf8')
+        for columns in iterate_conll_sentences(lines, file_config.column_separator):
+            sentence = project_sentence(columns, file_config.word_column, file_config.label_column)
+            if sentence is not None:
+                yield Sample(sentence[0], sentence[1], string_table=self._string_table)
+
+    def _read_samples_parallel(self, file_config):
+        """
+        Lazily read raw samples from the file described by the file configuration using a pool of processes.
+        The file is split into byte ranges at empty lines, i.e. at sentence boundaries. The ranges are parsed in
+        parallel and the samples are returned in the same order as by the serial parser.
+
+        Args:
+            file_config (FileConfig): The file to read
+
+        Returns:
+            generator: A generator of Sample objects that only hold raw data.
+        """
+        logger = logging.getLogger("shared.conll_data_reader._read_samples_parallel")
+
+        boundaries = find_sentence_boundaries(file_config.path, self._num_processes * SHARDS_PER_PROCESS)
+        ranges = [
+            (file_config.path, start, end, file_config.word_column, file_config.label_column,
+             file_config.column_separator)
+            for start, end in zip(boundaries[:-1], boundaries[1:])
+        ]
+
+        logger.debug("Parsing %d byte ranges with %d processes.", len(ranges), self._num_processes)
+
+        pool = Pool(processes=min(self._num_processes, len(ranges)))
+        try:
+            # `imap` returns the results in the order of the ranges
+            for sentences in pool.imap(_parse_conll_range, ranges):
+                for sentence, label_sequence in sentences:
+                    yield Sample(sentence, label_sequence, string_table=self._string_table)
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def _index_samples(self, raw_samples, word2idx):
+        """
+        Lazily convert raw samples into samples that also hold word and label indices.
+
+        Args:
+            raw_samples (iterable of Sample): Samples that hold raw data.
+            word2idx (`dict` of int): Mapping from words to indices.
+
+        Returns:
+            generator: A generator of Sample objects that hold raw data and indices.
+        """
+        logger = logging.getLogger("shared.conll_data_reader._index_samples")
+
+        label2idx = self.get_labels(out_format="label2idx")
+        unknown_idx = word2idx[TOKEN_UNKNOWN]
+        # Words that are not contained in the vocabulary are hashed into the same buckets as during preparation
+        num_oov_buckets = count_oov_buckets(word2idx)
+        # Tokens that are not contained in `word2idx` are resolved by trying all lookup candidates.
+        # The result is memoized so that the candidates are tried only once per surface form.
+        # NOTE: passing a precompiled token resolution table (see `build_token_resolution_table`) as `word2idx` makes
+        #       this a single dictionary lookup for every token.
+        resolved = {}
+
+        num_samples = 0
+        num_unknown_tokens = 0
+        num_tokens = 0
+
+        for sample in raw_samples:
+            token_indices = []
+            for token in sample.raw_tokens:
+                num_tokens += 1
+
+                token_idx = word2idx.get(token)
+                if token_idx is None:
+                    token_idx = resolved.get(token)
+                    if token_idx is None:
+                        token_idx = resolve_token(
+                            token,
+                            word2idx,
+                            self._token_lookup_suffixes,
+                            num_oov_buckets=num_oov_buckets
+                        )
+                        resolved[token] = token_idx
+
+                if token_idx == unknown_idx:
+                    num_unknown_tokens += 1
+
+                token_indices.append(token_idx)
+
+            label_indices = [label2idx[label] for label in sample.raw_labels]
+
+            if np.isnan(token_indices).any():
+                logger.warn("The sample %s... contains NaN indices.", " ".join(sample.raw_tokens[:5]))
+
+            num_samples += 1
+            yield sample.with_indices(token_indices, label_indices)
+
+        logger.debug(
+            "Loaded indices for %d sentences with %d tokens. %d tokens (%.2f%%) were unknown.",
+            num_samples,
+            num_tokens,
+            num_unknown_tokens,
+            (num_unknown_tokens / float(max(num_tokens, 1))) * 100
+        )
+
+    def _iterate_raw_samples(self, data_type):
+        """
+        Iterate over the raw samples of the specified type without forcing the whole file into memory.
+        Samples that are already cached (in memory or as a pickle file) are reused, all other samples are streamed
+        from the file.
+
+        Args:
+            data_type (str): The type of data. One of "train", "dev" or "test".
+
+        Returns:
+            iterable of Sample: Raw samples
+        """
+        if data_type in self._data[DATA_OUT_RAW] or path.isfile(self._get_pkl_path(data_type, DATA_OUT_RAW)):
+            return self.get_data(data_type=data_type, out_format=DATA_OUT_RAW)
+
+        return self.get_data(data_type=data_type, out_format=DATA_OUT_RAW, stream=True)
+
+    def get_data(self, data_type="train", out_format="padded", word2idx=None, stream=False):
         """Get the data from the corpus.
 
         Get the data from the corpus. The user can choose the type and format of the data.
@@ -80,85 +406,80 @@ class ConllDataReader(BaseDataReader):
             out_format (str): The format of the data. One of "padded" (words represented by
                 their indices and padded by the index for <MASK>), "padded-right" (as "padded",
                 but padding is applied from the right and not from the left) "index" (words represented
-                by their indices) or "raw" (words in their original form).
-            word2idx (`dict` of int): Mapping from words to indices. Only used for "padded"
-                and "index". If not supplied, using `self.get_words(out_format="word2idx")`.
+                by their indices), "raw" (words in their original form) or "compiled" (indices stored in
+                memory-mapped arrays, see CompiledCorpus).
+            word2idx (`dict` of int): Mapping from words to indices. Only used for "padded", "index",
+                and "compiled". If not supplied, using `self.get_words(out_format="word2idx")`.
+            stream (bool, optional): Whether to return a generator that reads the samples lazily from the file instead
+                of a list. Streamed samples are neither cached in memory nor written to a pickle file so that the
+                memory consumption does not depend on the size of the file. Ignored for "compiled".
 
         Returns:
-            `list` of Sample: The data.
+            `list` of Sample or generator or CompiledCorpus: The data.
         """
         logger = logging.getLogger("shared.conll_data_reader.get_data")
 
         assert data_type in [DATA_TYPE_TRAIN, DATA_TYPE_DEV, DATA_TYPE_TEST]
-        assert out_format in [DATA_OUT_RAW, DATA_OUT_INDEX]
+        assert out_format in [DATA_OUT_RAW, DATA_OUT_INDEX, DATA_OUT_COMPILED]
         assert self._name != ""
 
         logger.debug("Get data for %s in format %s", data_type, out_format)
+
+        if out_format == DATA_OUT_COMPILED:
+            return self._get_compiled_corpus(data_type, word2idx)
         # print "Cached data:"
         # print "\n  - ".join(["%s -> %s" % (f, t) for f in self._data.keys() for t in self._data[f].keys()])
 
+        if stream:
+            if data_type in self._data[out_format]:
+                logger.debug("Data is in cache. Streaming it from memory.")
+                return iter(self._data[out_format][data_type])
+
+            logger.debug("Streaming %s data in format %s from file.", data_type, out_format)
+            raw_samples = self._read_samples(self.files[data_type])
+
+            if out_format == DATA_OUT_RAW:
+                return raw_samples
+
+            if not word2idx:
+                logger.warn("No word-to-index mapping provided for `get_data`."
+                            " Using word-to-index mapping for this task only.")
+                word2idx = self.get_words(out_format="word2idx")
+
+            return self._index_samples(raw_samples, word2idx)
+
         if data_type not in self._data[out_format]:
             # print "Data is not in cache. Have to read it from disk."
 
-            file_config = self.files[data_type]
-            assert isinstance(file_config, FileConfig)
+            if out_format == DATA_OUT_INDEX and not word2idx:
+                logger.warn("No word-to-index mapping provided for `get_data`."
+                            " Using word-to-index mapping for this task only.")
+                word2idx = self.get_words(out_format="word2idx")
 
-            pkl_path = path.join(self._paths["pkl"], "%s_%s_word-col-%d_label-col-%d_%s_%s.pkl" % (
-                self._name,
-                file_config.filename,
-                file_config.word_column,
-                file_config.label_column,
-                data_type,
-                out_format
-            ))
+            # Indexed data depends on the mapping, i.e. the mapping is part of the cache key
+            pkl_path = self._get_pkl_path(data_type, out_format, word2idx if out_format == DATA_OUT_INDEX else None)
 
             logger.debug("Pickle path is: %s", pkl_path)
 
-            if path.isfile(pkl_path):
+            # The raw data of shared files is held by the file registry. Pickling it would duplicate the tokens.
+            use_pickle = out_format != DATA_OUT_RAW or self._file_registry is None
+
+            if use_pickle and path.isfile(pkl_path):
                 logger.debug("There is a .pkl file. Load %s data in format %s from this file.", data_type, out_format)
                 with open(pkl_path, 'rb') as f:
                     self._data[out_format][data_type] = pkl.load(f)
 
+                if self._string_table is not None:
+                    for sample in self._data[out_format][data_type]:
+                        sample.attach_string_table(self._string_table)
+
                 logger.debug("Finished loading from pickle file.")
                 return self._data[out_format][data_type]
 
             logger.debug("Pickle file cannot be located. Loading from scratch.")
 
             if out_format == DATA_OUT_RAW:
-                logger.debug("Loading data from file.")
-                logger.debug("Filename: %s", file_config.filename)
-                logger.debug("Word column: %d", file_config.word_column)
-                logger.debug("Label column: %d", file_config.label_column)
-                logger.debug("Column separator: %s" % "space" if file_config.column_separator == " " else "tab")
-                logger.debug("Output format: %s", out_format)
-
-                # Based on https://github.com/glample/tagger/blob/master/loader.py#L8-L29
-                samples = []
-                sentence = []
-                label_sequence = []
-                for line in codecs.open(file_config.path, 'r', 'utf8'):
-                    line = line.rstrip()
-                    if not line:
-                        # Empty line
-                        if len(sentence) > 0:
-                            if DOCSTART not in sentence[0]:
-                                # Only add sentences that do not contain "DOCSTART"
-                                samples.append(Sample(sentence, label_sequence))
-                            sentence = []
-                            label_sequence = []
-                    else:
-                        # Non-empty line
-                        token = line.split(file_config.column_separator)
-                        assert len(token) > file_config.word_column, "Invalid: %s | %d" % (token, file_config.word_column)
-                        assert len(token) > file_config.label_column, "Invalid: %s | %d" % (token, file_config.label_column)
-                        sentence.append(token[file_config.word_column])
-                        label_sequence.append(token[file_config.label_column])
-
-                if len(sentence) > 0:
-                    if DOCSTART not in sentence[0]:
-                        # Only add sentences that do not contain "DOCSTART"
-                        samples.append(Sample(sentence, label_sequence))
-
+                samples = list(self._read_samples(self.files[data_type]))
                 logger.debug("Finished loading %s raw sentences", len(samples))
 
                 self._data[out_format][data_type] = samples
@@ -168,70 +489,25 @@ class ConllDataReader(BaseDataReader):
                     out_format=DATA_OUT_RAW,
                     word2idx=word2idx
                 )
-                if not word2idx:
-                    logger.warn("No word-to-index mapping provided for `get_data`."
-                                " Using word-to-index mapping for this task only.")
-                    word2idx = self.get_words(out_format="word2idx")
-
-                label2idx = self.get_labels(out_format="label2idx")
-                word2idx_set = set(word2idx.keys())
-
-                samples = []
-
-                num_unknown_tokens = 0
-                num_tokens = 0
-
-                for sample in raw_samples:
-                    token_indices = []
-                    for token in sample.raw_tokens:
-                        num_tokens += 1
-
-                        if token in word2idx_set:
-                            token_indices.append(word2idx[token])
-                        elif token.lower() in word2idx_set:
-                            token_indices.append(word2idx[token.lower()])
-                        elif word_normalize(token) in word2idx_set:
-                            token_indices.append(word2idx[word_normalize(token)])
-                        # Special cases for bilingual embeddings
-                        elif token + "_de" in word2idx_set:
-                            token_indices.append(word2idx[token + "_de"])
-                        elif token.lower() + "_de" in word2idx_set:
-                            token_indices.append(word2idx[token.lower() + "_de"])
-                        elif word_normalize(token) + "_de" in word2idx_set:
-                            token_indices.append(word2idx[word_normalize(token) + "_de"])
-                        elif token + "_en" in word2idx_set:
-                            token_indices.append(word2idx[token + "_en"])
-                        elif token.lower() + "_en" in word2idx_set:
-                            token_indices.append(word2idx[token.lower() + "_en"])
-                        elif word_normalize(token) + "_en" in word2idx_set:
-                            token_indices.append(word2idx[word_normalize(token) + "_en"])
-                        else:
-                            num_unknown_tokens += 1
-                            token_indices.append(word2idx[TOKEN_UNKNOWN])
-
-                    label_indices = [label2idx[label] for label in sample.raw_labels]
-
-                    if np.isnan(token_indices).any():
-                        logger.warn("The sample %s... contains NaN indices.", " ".join(sample.raw_tokens[:5]))
-
-                    samples.append(Sample(sample.raw_tokens, sample.raw_labels, token_indices, label_indices))
-
-                logger.debug(
-                    "Loaded indices for %d sentences with %d tokens. %d tokens (%.2f%%) were unknown.",
-                    len(samples),
-                    num_tokens,
-                    num_unknown_tokens,
-                    (num_unknown_tokens / float(num_tokens)) * 100
-                )
 
-                self._data[out_format][data_type] = samples
+                self._data[out_format][data_type] = list(self._index_samples(raw_samples, word2idx))
             else:
                 raise ValueError("Unknown data format")
 
             # print "Data written to `self._data[%s][%s]`" % (out_format, data_type)
-            logger.debug("Finished loading from scratch. Writing results to .pkl file")
-            with open(pkl_path, mode="wb") as f:
-                pkl.dump(self._data[out_format][data_type], f, -1)
+            if use_pickle:
+                logger.debug("Finished loading from scratch. Writing results to .pkl file")
+
+                # The string table is written first. Strings are only appended to it, i.e. it always covers the
+                # indices of the samples in all pickle files that exist, even if a run is interrupted.
+                if self._string_table is not None and self._string_table_path is not None:
+                    self._string_table.save(self._string_table_path)
+
+                # Write to a temporary file first so that an interrupted run never leaves an incomplete file
+                tmp_path = "%s.%d.tmp" % (pkl_path, os.getpid())
+                with open(tmp_path, mode="wb") as f:
+                    pkl.dump(self._data[out_format][data_type], f, -1)
+                os.rename(tmp_path, pkl_path)
 
         else:
             pass
@@ -252,16 +528,12 @@ class ConllDataReader(BaseDataReader):
             `list` of str: `dict` of int: A word list or dictionary.
         """
         if not self._words:
-            raw_data = [
-                self.get_data(data_type=data_type, out_format=DATA_OUT_RAW)
-                for data_type
-                in [DATA_TYPE_TRAIN, DATA_TYPE_DEV, DATA_TYPE_TEST]
-            ]
-
-            raw_sentences = [sample.raw_tokens for samples in raw_data for sample in samples]
-            words = [word for sentence in raw_sentences for word in sentence]
+            words = set()
+            for data_type in [DATA_TYPE_TRAIN, DATA_TYPE_DEV, DATA_TYPE_TEST]:
+                words.update(self.get_statistics(data_type).words)
+
             # Find all unique words and add the mask as the first word, i.e. index 0
-            self._words = list(set(words))
+            self._words = list(words)
 
         if out_format == "list":
             return self._words
@@ -287,22 +559,12 @@ class ConllDataReader(BaseDataReader):
             `list` of str: `dict` of int: A label list or dictionary.
         """
         if not self._labels:
-            raw_data = [
-                self.get_data(data_type=data_type, out_format=DATA_OUT_RAW)
-                for data_type
-                in [DATA_TYPE_TRAIN, DATA_TYPE_DEV, DATA_TYPE_TEST]
-            ]
-
-            raw_label_sequences = [
-                sample.raw_labels
-                for samples
-                in raw_data
-                for sample
-                in samples
-            ]
-            labels = [label for label_sequence in raw_label_sequences for label in label_sequence]
+            labels = set()
+            for data_type in [DATA_TYPE_TRAIN, DATA_TYPE_DEV, DATA_TYPE_TEST]:
+                labels.update(self.get_statistics(data_type).labels)
+
             # Find all unique labels and add the mask as the first word, i.e. index 0
-            self._labels = list(set(labels))
+            self._labels = list(labels)
 
         if out_format == "list":
             return self._labels
@@ -315,6 +577,39 @@ class ConllDataReader(BaseDataReader):
 
         raise Exception("Unknown `get_labels` format: %s" % out_format)
 
+    def get_statistics(self, data_type="train"):
+        """Get the statistics of the data.
+
+        The statistics (vocabulary, labels, characters, and length histograms) are collected in a single pass over
+        the data and written to a pickle file next to the cached data. Later runs load them from this file instead of
+        scanning the data again.
+
+        Args:
+            data_type (str): The type of data. One of "train", "dev" or "test".
+
+        Returns:
+            CorpusStatistics: The statistics
+        """
+        logger = logging.getLogger("shared.conll_data_reader.get_statistics")
+
+        assert data_type in [DATA_TYPE_TRAIN, DATA_TYPE_DEV, DATA_TYPE_TEST]
+
+        if data_type not in self._statistics:
+            pkl_path = self._get_cache_path(data_type, "statistics") + ".pkl"
+
+            if path.isfile(pkl_path):
+                logger.debug("Loading %s statistics from %s.", data_type, pkl_path)
+                with open(pkl_path, "rb") as f:
+                    self._statistics[data_type] = pkl.load(f)
+            else:
+                logger.debug("Collecting %s statistics. Writing results to %s.", data_type, pkl_path)
+                self._statistics[data_type] = CorpusStatistics.from_samples(self._iterate_raw_samples(data_type))
+
+                with open(pkl_path, mode="wb") as f:
+                    pkl.dump(self._statistics[data_type], f, -1)
+
+        return self._statistics[data_type]
+
     def get_max_sequence_length(self):
         """Determine the maximum sequence length.
 
@@ -325,16 +620,10 @@ class ConllDataReader(BaseDataReader):
             int: Maximum sequence length.
         """
         if not self._max_sequence_length:
-            raw_data = [
-                self.get_data(data_type=data_type, out_format=DATA_OUT_RAW)
-                for data_type
-                in [DATA_TYPE_TRAIN, DATA_TYPE_DEV, DATA_TYPE_TEST]
-                ]
-
-            raw_sentences = [sample.raw_tokens for samples in raw_data for sample in samples]
-            sentence_lengths = [len(sentence) for sentence in raw_sentences]
-
-            self._max_sequence_length = max(sentence_lengths)
+            self._max_sequence_length = max(
+                self.get_statistics(data_type).max_sentence_length
+                for data_type in [DATA_TYPE_TRAIN, DATA_TYPE_DEV, DATA_TYPE_TEST]
+            )
 
         return self._max_sequence_length
 
@@ -345,3 +634,42 @@ class ConllDataReader(BaseDataReader):
             This is a list even if only one file name was supplied in `add_files`.
         """
         return self._files
+
+
+def get_mapping_key(mapping):
+    """
+    Compute a key that identifies the content of a mapping, e.g. of a word-to-index mapping.
+
+    Args:
+        mapping (`dict` of int): The mapping
+
+    Returns:
+        str: Hexadecimal MD5 hash
+    """
+    return hashlib.md5(pkl.dumps(sorted(mapping.items()), -1)).hexdigest()
+
+
+def _parse_conll_range(args):
+    """
+    Parse a byte range of a CONLL file. Used by the processes of `ConllDataReader._read_samples_parallel`.
+    The parsing is identical to `ConllDataReader._read_samples` (see `iterate_conll_sentences`).
+
+    Args:
+        args (tuple): Path to the file, start and end byte offsets, word column, label column, and column separator
+
+    Returns:
+        `list` of `tuple` of `list` of str: Sentences (tokens and labels) in the byte range
+    """
+    file_path, start, end, word_column, label_column, column_separator = args
+
+    with open(file_path, "rb") as f:
+        f.seek(start)
+        content = f.read(end - start).decode("utf8")
+
+    sentences = []
+    for columns in iterate_conll_sentences(content.splitlines(), column_separator):
+        sentence = project_sentence(columns, word_column, label_column)
+        if sentence is not None:
+            sentences.append(sentence)
+
+    return sentences
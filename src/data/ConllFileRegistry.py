@@ -0,0 +1,282 @@
+"""Registry that parses each CONLL file only once for all data readers"""
+import codecs
+import logging
+from multiprocessing import Pool
+from os import path
+
+from Sample import Sample
+from config.FileConfig import FileConfig
+from constants import DOCSTART
+
+# Number of byte ranges per process. More ranges than processes balance the load if sentence lengths vary.
+SHARDS_PER_PROCESS = 4
+
+
+class ConllFileRegistry(object):
+    """
+    Registry of parsed CONLL files that is shared by the data readers of all tasks.
+
+    Tasks often read the same file with a different label column (e.g. POS tags and chunks in CoNLL-2000).
+    The registry parses each physical file once, keeps all of its columns, and projects the requested word and label
+    columns for each task. The lists of tokens and labels are shared between the samples of all tasks, i.e. the
+    memory consumption depends on the number of unique files and not on the number of tasks.
+
+    Data readers register the files they read (see `register`). A parsed file is released as soon as it has been read
+    as often as it is registered, i.e. once all tasks have read it. Reading it again parses it again.
+    """
+
+    def __init__(self, num_processes=1):
+        """
+        Initialize an empty registry.
+
+        Args:
+            num_processes (int): Number of processes that are used to parse a file.
+        """
+        assert isinstance(num_processes, int) and num_processes >= 1
+
+        self._num_processes = num_processes
+        self._files = {}
+        # Number of registered readers and number of completed reads since the file was parsed
+        self._num_readers = {}
+        self._num_reads = {}
+
+    def register(self, file_config):
+        """
+        Register a reader of a file. The parsed file is kept until all registered readers have read it.
+
+        Args:
+            file_config (FileConfig): The file that will be read
+
+        Returns:
+            None
+        """
+        assert isinstance(file_config, FileConfig)
+
+        key = _get_file_key(file_config)
+        self._num_readers[key] = self._num_readers.get(key, 0) + 1
+
+    def get_sentences(self, file_config):
+        """
+        Get all sentences of a file. The file is parsed when it is requested for the first time.
+
+        Args:
+            file_config (FileConfig): The file to read
+
+        Returns:
+            `list` of `list` of `list` of str: Sentences, each represented by its columns (a list of values per column)
+        """
+        logger = logging.getLogger("shared.conll_file_registry.get_sentences")
+
+        assert isinstance(file_config, FileConfig)
+
+        key = _get_file_key(file_config)
+
+        if key not in self._files:
+            logger.debug("Parsing %s with %d process(es).", file_config.path, self._num_processes)
+
+            if self._num_processes > 1:
+                self._files[key] = self._parse_parallel(file_config)
+            else:
+                self._files[key] = list(iterate_conll_sentences(
+                    codecs.open(file_config.path, "r", "utf8"),
+                    file_config.column_separator
+                ))
+            self._num_reads[key] = 0
+
+            logger.debug("Parsed %d sentences.", len(self._files[key]))
+        else:
+            logger.debug("%s has already been parsed.", file_config.path)
+
+        return self._files[key]
+
+    def get_samples(self, file_config):
+        """
+        Lazily project the word and label columns of the file configuration onto raw samples.
+        The samples are identical to the ones of `ConllDataReader._read_samples`, including the "DOCSTART" filtering.
+
+        Args:
+            file_config (FileConfig): The file to read
+
+        Returns:
+            generator: A generator of Sample objects that only hold raw data.
+        """
+        logger = logging.getLogger("shared.conll_file_registry.get_samples")
+
+        key = _get_file_key(file_config)
+
+        for columns in self.get_sentences(file_config):
+            sentence = project_sentence(columns, file_config.word_column, file_config.label_column)
+            if sentence is not None:
+                yield Sample(*sentence)
+
+        self._num_reads[key] = self._num_reads.get(key, 0) + 1
+        if key in self._files and self._num_reads[key] >= self._num_readers.get(key, 0):
+            logger.debug("All readers have read %s. Releasing it.", file_config.path)
+            del self._files[key]
+
+    def _parse_parallel(self, file_config):
+        """
+        Parse a file with a pool of processes. The file is split into byte ranges at empty lines.
+
+        Args:
+            file_config (FileConfig): The file to read
+
+        Returns:
+            `list` of `list` of `list` of str: Sentences, each represented by its columns
+        """
+        boundaries = find_sentence_boundaries(file_config.path, self._num_processes * SHARDS_PER_PROCESS)
+        ranges = [
+            (file_config.path, start, end, file_config.column_separator)
+            for start, end in zip(boundaries[:-1], boundaries[1:])
+        ]
+
+        pool = Pool(processes=min(self._num_processes, len(ranges)))
+        try:
+            sentences = []
+            # `imap` returns the results in the order of the ranges
+            for range_sentences in pool.imap(_parse_conll_columns_range, ranges):
+                sentences.extend(range_sentences)
+        finally:
+            pool.terminate()
+            pool.join()
+
+        return sentences
+
+
+def is_blank_line(line):
+    """
+    Check whether a line of a CONLL file is empty, i.e. ends a sentence. All parsers (serial, parallel, and shared) use
+    this test so that they split a file into the same sentences.
+
+    Args:
+        line (unicode): A decoded line
+
+    Returns:
+        bool: True if the line only consists of whitespace, False otherwise
+    """
+    return not line.rstrip()
+
+
+def find_sentence_boundaries(file_path, num_ranges):
+    """
+    Split a CONLL file into (at most) `num_ranges` byte ranges of similar size. Each range ends after an empty line,
+    so that no sentence is split across ranges.
+
+    The file is read in binary mode, i.e. lines end at "\n" only. A line is empty if its decoded content is empty
+    according to `is_blank_line`. Every unicode line that a decoded empty line consists of (e.g. when splitting at
+    "\u2028") is then empty as well, i.e. the parsers end a sentence at each boundary.
+
+    Args:
+        file_path (str): Path to the CONLL file
+        num_ranges (int): Number of ranges to aim for
+
+    Returns:
+        `list` of int: Sorted byte offsets that start with 0 and end with the file size
+    """
+    file_size = path.getsize(file_path)
+    boundaries = [0]
+
+    with open(file_path, "rb") as f:
+        for i in xrange(1, num_ranges):
+            position = max(boundaries[-1], file_size * i // num_ranges)
+            f.seek(position)
+
+            if position > 0:
+                # Skip the rest of the current line
+                f.readline()
+
+            # Advance to the end of the next empty line
+            line = f.readline()
+            while line and not is_blank_line(line.decode("utf8", "replace")):
+                line = f.readline()
+
+            position = f.tell()
+            if position >= file_size:
+                break
+
+            if position > boundaries[-1]:
+                boundaries.append(position)
+
+    boundaries.append(file_size)
+    return boundaries
+
+
+def iterate_conll_sentences(lines, column_separator):
+    """
+    Parse lines in CONLL format into sentences that keep all columns. This is the only CONLL parsing loop, it is used
+    by the serial, the parallel, and the shared parsers.
+    Sentences are not filtered because "DOCSTART" depends on the word column (see `project_sentence`).
+
+    Args:
+        lines (iterable of unicode): Lines of a CONLL file
+        column_separator (str): Column separator
+
+    Returns:
+        generator: A generator of sentences, each represented by its columns (a list of values per column).
+            A sentence has as many columns as its shortest line.
+    """
+    rows = []
+    for line in lines:
+        if is_blank_line(line):
+            # Empty line
+            if len(rows) > 0:
+                yield [list(column) for column in zip(*rows)]
+                rows = []
+        else:
+            # Non-empty line
+            rows.append(line.rstrip().split(column_separator))
+
+    if len(rows) > 0:
+        yield [list(column) for column in zip(*rows)]
+
+
+def project_sentence(columns, word_column, label_column):
+    """
+    Select the word and label columns of a sentence.
+
+    Args:
+        columns (`list` of `list` of str): The columns of the sentence (see `iterate_conll_sentences`)
+        word_column (int): In which column the word can be found
+        label_column (int): In which column the label can be found
+
+    Returns:
+        `tuple` of `list` of str: Tokens and labels, or None if the sentence contains "DOCSTART"
+    """
+    assert len(columns) > word_column, "Invalid: %s | %d" % (zip(*columns), word_column)
+    assert len(columns) > label_column, "Invalid: %s | %d" % (zip(*columns), label_column)
+
+    if DOCSTART in columns[word_column][0]:
+        # Only add sentences that do not contain "DOCSTART"
+        return None
+
+    return columns[word_column], columns[label_column]
+
+
+def _parse_conll_columns_range(args):
+    """
+    Parse a byte range of a CONLL file. Used by the processes of `ConllFileRegistry._parse_parallel`.
+
+    Args:
+        args (tuple): Path to the file, start and end byte offsets, and column separator
+
+    Returns:
+        `list` of `list` of `list` of str: Sentences in the byte range, each represented by its columns
+    """
+    file_path, start, end, column_separator = args
+
+    with open(file_path, "rb") as f:
+        f.seek(start)
+        content = f.read(end - start).decode("utf8")
+
+    return list(iterate_conll_sentences(content.splitlines(), column_separator))
+
+
+def _get_file_key(file_config):
+    """
+    Args:
+        file_config (FileConfig): A file configuration
+
+    Returns:
+        tuple: Key of the physical file (path and column separator)
+    """
+    return path.abspath(file_config.path), file_config.column_separator
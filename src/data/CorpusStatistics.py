@@ -0,0 +1,125 @@
+"""Statistics of a data split that are collected in a single pass"""
+from collections import Counter
+
+from Sample import Sample
+
+
+class CorpusStatistics(object):
+    """
+    Vocabulary, label inventory, character inventory, and length histograms of a data split.
+    All statistics are collected in a single pass over the samples. The object is small enough to be pickled next to
+    the cached data so that the corpus does not have to be scanned again.
+    """
+
+    def __init__(self):
+        """
+        Initialize empty statistics. Use `add_sample` or `from_samples` to fill them.
+        """
+        # Words and labels are also kept in the order of their first occurrence.
+        # This allows to build sets in exactly the same way as from the samples themselves.
+        self._words = []
+        self._word_counts = Counter()
+        self._labels = []
+        self._label_counts = Counter()
+        self._characters = set()
+        self._sentence_lengths = Counter()
+        self._token_lengths = Counter()
+
+    @staticmethod
+    def from_samples(samples):
+        """
+        Collect the statistics of samples.
+
+        Args:
+            samples (iterable of Sample): Samples (only the raw data is used)
+
+        Returns:
+            CorpusStatistics: The statistics
+        """
+        statistics = CorpusStatistics()
+
+        for sample in samples:
+            statistics.add_sample(sample)
+
+        return statistics
+
+    def add_sample(self, sample):
+        """
+        Update the statistics with a single sample.
+
+        Args:
+            sample (Sample): A sample (only the raw data is used)
+
+        Returns:
+            None
+        """
+        assert isinstance(sample, Sample)
+
+        for token in sample.raw_tokens:
+            if token not in self._word_counts:
+                self._words.append(token)
+                self._characters.update(token)
+            self._word_counts[token] += 1
+            self._token_lengths[len(token)] += 1
+
+        for label in sample.raw_labels:
+            if label not in self._label_counts:
+                self._labels.append(label)
+            self._label_counts[label] += 1
+
+        self._sentence_lengths[sample.len] += 1
+
+    @property
+    def words(self):
+        """`list` of str: Unique words in the order of their first occurrence"""
+        return self._words
+
+    @property
+    def word_counts(self):
+        """Counter: Frequency of each word"""
+        return self._word_counts
+
+    @property
+    def labels(self):
+        """`list` of str: Unique labels in the order of their first occurrence"""
+        return self._labels
+
+    @property
+    def label_counts(self):
+        """Counter: Frequency of each label"""
+        return self._label_counts
+
+    @property
+    def characters(self):
+        """`set` of str: All characters that occur in the words"""
+        return self._characters
+
+    @property
+    def sentence_lengths(self):
+        """Counter: Histogram of the sentence lengths (number of sentences for each length)"""
+        return self._sentence_lengths
+
+    @property
+    def token_lengths(self):
+        """Counter: Histogram of the token lengths (number of tokens for each length)"""
+        return self._token_lengths
+
+    @property
+    def num_sentences(self):
+        """int: Number of sentences"""
+        return sum(self._sentence_lengths.values())
+
+    @property
+    def num_tokens(self):
+        """int: Number of tokens"""
+        return sum(self._token_lengths.values())
+
+    @property
+    def max_sentence_length(self):
+        """int: Length of the longest sentence (0 if there are no sentences)"""
+        return max(self._sentence_lengths.keys()) if self._sentence_lengths else 0
+
+    @property
+    def max_token_length(self):
+        """int: Length of the longest token (0 if there are no tokens)"""
+        return max(self._token_lengths.keys()) if self._token_lengths else 0
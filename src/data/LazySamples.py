@@ -0,0 +1,49 @@
+"""Class for a sequence of samples that are only resolved when they are accessed"""
+import numpy as np
+
+
+class LazySamples(object):
+    """
+    Lazy sequence of samples that are identified by their sentence indices. The samples are resolved (at once) on the
+    first access, i.e. batches only need to hold the sentence indices until the samples are actually used (e.g. for
+    predictions).
+    """
+
+    def __init__(self, get_samples, ids):
+        """
+        Initialize the sequence.
+
+        Args:
+            get_samples (function): Resolves an array of sentence indices to a sequence of samples (in the same order)
+            ids (np.ndarray or `list` of int): Sentence indices
+        """
+        self._get_samples = get_samples
+        self._ids = np.asarray(ids, dtype=np.int64)
+        self._samples = None
+
+    def _resolve(self):
+        """
+        Returns:
+            sequence of Sample: The samples
+        """
+        if self._samples is None:
+            self._samples = self._get_samples(self._ids)
+
+        return self._samples
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return LazySamples(self._get_samples, self._ids[idx])
+
+        return self._resolve()[idx]
+
+    def __iter__(self):
+        return iter(self._resolve())
+
+    @property
+    def ids(self):
+        """np.ndarray: Sentence indices of the samples"""
+        return self._ids
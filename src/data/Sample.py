@@ -7,8 +7,17 @@ from constants import TOKEN_PADDING
 
 
 class Sample(object):
+    """
+    A single sample (usually a sentence).
 
-    def __init__(self, raw_tokens, raw_labels, tokens=None, labels=None):
+    The representation is compact: the class uses `__slots__`, word and label indices are stored as int32 arrays
+    that are created once, and the raw tokens and labels can optionally be stored as indices into a shared
+    `StringTable`.
+    """
+
+    __slots__ = ("_raw_tokens", "_raw_labels", "_tokens", "_labels", "_string_table")
+
+    def __init__(self, raw_tokens, raw_labels, tokens=None, labels=None, string_table=None):
         """
         Initialize the sample object.
         A sample can hold only raw data or raw data and indexes. The `raw` property is an indicator.
@@ -17,6 +26,8 @@ class Sample(object):
             raw_labels (`list` of str): A list of labels for the tokens
             tokens (`list` of int): A list of word indices
             labels (`list` of int): A list of label indices
+            string_table (StringTable, optional): A string table that stores the raw tokens and labels. If not
+                supplied, the sample keeps the lists of raw tokens and labels.
         """
         assert isinstance(raw_tokens, list)
         assert isinstance(raw_labels, list)
@@ -24,12 +35,39 @@ class Sample(object):
         assert tokens is None or isinstance(tokens, list)
         assert labels is None or isinstance(labels, list)
 
-        self._raw_tokens = raw_tokens
-        self._raw_labels = raw_labels
-        self._tokens = tokens
-        self._labels = labels
-        self._len = len(self._raw_tokens)
-        self._raw = tokens is None and labels is None
+        self._string_table = string_table
+
+        if string_table is None:
+            self._raw_tokens = raw_tokens
+            self._raw_labels = raw_labels
+        else:
+            self._raw_tokens = string_table.add(raw_tokens)
+            self._raw_labels = string_table.add(raw_labels)
+
+        self._tokens = _to_index_array(tokens)
+        self._labels = _to_index_array(labels)
+
+    def with_indices(self, tokens, labels):
+        """
+        Create a sample that holds the same raw data (without copying it) and the provided indices.
+
+        Args:
+            tokens (`list` of int): A list of word indices
+            labels (`list` of int): A list of label indices
+
+        Returns:
+            Sample: The new sample
+        """
+        assert len(tokens) == self.len and len(labels) == self.len
+
+        sample = Sample.__new__(Sample)
+        sample._string_table = self._string_table
+        sample._raw_tokens = self._raw_tokens
+        sample._raw_labels = self._raw_labels
+        sample._tokens = _to_index_array(tokens)
+        sample._labels = _to_index_array(labels)
+
+        return sample
 
     def get_max_token_length(self):
         """
@@ -76,6 +114,10 @@ class Sample(object):
         Returns:
             `list` of str: A list raw tokens (usually a sentence)
         """
+        if self._string_table is not None:
+            return self._string_table.get(self._raw_tokens)
+
+        _check_raw_strings(self._raw_tokens)
         return self._raw_tokens
 
     @property
@@ -85,6 +127,10 @@ class Sample(object):
         Returns:
             `list` of str: A list of labels for the tokens
         """
+        if self._string_table is not None:
+            return self._string_table.get(self._raw_labels)
+
+        _check_raw_strings(self._raw_labels)
         return self._raw_labels
 
     @property
@@ -94,16 +140,16 @@ class Sample(object):
         Returns:
             `list` of int: A list of word indices
         """
-        return self._tokens
+        return None if self._tokens is None else self._tokens.tolist()
 
     @property
     def tokens_as_array(self):
         """
-        Converts the list of integers to a numpy array.
+        The array is created once when the sample is created.
         Returns:
             np.ndarray: Token indices
         """
-        return np.asarray(self.tokens, dtype="int32")
+        return self._tokens
 
     @property
     def labels(self):
@@ -112,16 +158,16 @@ class Sample(object):
         Returns:
             `list` of int: A list of label indices
         """
-        return self._labels
+        return None if self._labels is None else self._labels.tolist()
 
     @property
     def labels_as_array(self):
         """
-        Converts the list of integers to a numpy array.
+        The array is created once when the sample is created.
         Returns:
             np.ndarray: Label indices
         """
-        return np.asarray(self.labels, dtype="int32")
+        return self._labels
 
     @property
     def len(self):
@@ -130,7 +176,7 @@ class Sample(object):
         Returns:
             int: length of the token list
         """
-        return self._len
+        return len(self._raw_tokens)
 
     @property
     def raw(self):
@@ -139,7 +185,7 @@ class Sample(object):
         Returns:
             bool: whether or not the sample only contains raw data.
         """
-        return self._raw
+        return self._tokens is None
 
     def __str__(self):
         """
@@ -148,3 +194,66 @@ class Sample(object):
             str: list of tokens and labels in CoNLL format
         """
         return os.linesep.join(["%s %s" % (token, label) for token, label in zip(self.raw_tokens, self.raw_labels)])
+
+    def __getstate__(self):
+        return {
+            "_raw_tokens": self._raw_tokens,
+            "_raw_labels": self._raw_labels,
+            "_tokens": self._tokens,
+            "_labels": self._labels,
+        }
+
+    def __setstate__(self, state):
+        # Also accepts the state of samples that were pickled before `__slots__` were introduced or together with
+        # their string table. Otherwise, the string table is attached again after loading (see `attach_string_table`).
+        self._raw_tokens = state["_raw_tokens"]
+        self._raw_labels = state["_raw_labels"]
+        self._tokens = _to_index_array(state["_tokens"])
+        self._labels = _to_index_array(state["_labels"])
+        self._string_table = state.get("_string_table")
+
+    def attach_string_table(self, string_table):
+        """
+        Attach the string table that stores the raw tokens and labels of the sample. The string table is not pickled
+        with the sample, i.e. it has to be attached again after a sample is loaded. Samples that hold their raw tokens
+        and labels as lists (or already have a string table) are not changed.
+
+        Args:
+            string_table (StringTable): The string table
+
+        Returns:
+            None
+        """
+        if self._string_table is None and isinstance(self._raw_tokens, np.ndarray):
+            self._string_table = string_table
+
+
+def _check_raw_strings(raw):
+    """
+    Ensure that raw tokens or labels are strings and not indices into a string table that is not attached (e.g. after
+    loading a sample that was pickled without its string table).
+
+    Args:
+        raw (`list` of str or np.ndarray): Raw tokens or labels of a sample
+
+    Returns:
+        None
+    """
+    if isinstance(raw, np.ndarray):
+        raise ValueError("The sample stores its raw data in a string table, but no string table is attached")
+
+
+def _to_index_array(indices):
+    """
+    Convert indices into an int32 array.
+
+    Args:
+        indices (`list` of int or np.ndarray or None): Indices
+
+    Returns:
+        np.ndarray or None: int32 array or None if no indices are provided
+    """
+    if indices is None:
+        return None
+
+    return np.asarray(indices, dtype=np.int32)
@@ -0,0 +1,100 @@
+"""Table of strings that can be shared by many samples"""
+import cPickle as pkl
+import os
+
+import numpy as np
+
+
+class StringTable(object):
+    """
+    Stores every distinct string only once. Samples that use a string table hold int32 indices into the table instead
+    of lists of strings, which saves the per-token pointer and list overhead for large corpora.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty string table.
+        """
+        self._strings = []
+        self._string2idx = {}
+
+    def add(self, strings):
+        """
+        Add strings to the table (if they are not already contained) and get their indices.
+
+        Args:
+            strings (`list` of str): Strings
+
+        Returns:
+            np.ndarray: int32 indices of the strings
+        """
+        string2idx = self._string2idx
+        indices = np.empty(len(strings), dtype=np.int32)
+
+        for i, string in enumerate(strings):
+            idx = string2idx.get(string)
+            if idx is None:
+                idx = len(self._strings)
+                string2idx[string] = idx
+                self._strings.append(string)
+            indices[i] = idx
+
+        return indices
+
+    def get(self, indices):
+        """
+        Look up the strings for indices.
+
+        Args:
+            indices (np.ndarray or `list` of int): Indices of strings in the table
+
+        Returns:
+            `list` of str: The strings
+        """
+        strings = self._strings
+        return [strings[idx] for idx in np.asarray(indices).tolist()]
+
+    def __len__(self):
+        return len(self._strings)
+
+    def save(self, file_path):
+        """
+        Write the table to a pickle file. Strings are only appended to the table, i.e. the indices of samples that
+        were cached before stay valid.
+
+        Args:
+            file_path (str): Path of the pickle file
+
+        Returns:
+            None
+        """
+        # Write to a temporary file first so that a table is never read while it is written
+        tmp_path = "%s.%d.tmp" % (file_path, os.getpid())
+        with open(tmp_path, "wb") as f:
+            pkl.dump(self, f, -1)
+        os.rename(tmp_path, file_path)
+
+    def __getstate__(self):
+        # The index of the strings is built again when the table is loaded
+        return {"_strings": self._strings}
+
+    def __setstate__(self, state):
+        self._strings = state["_strings"]
+        self._string2idx = {string: idx for idx, string in enumerate(self._strings)}
+
+
+def load_string_table(file_path):
+    """
+    Load a string table that was written with `StringTable.save` or create an empty table if the file does not exist.
+
+    Args:
+        file_path (str): Path of the pickle file
+
+    Returns:
+        StringTable: The string table
+    """
+    if not os.path.isfile(file_path):
+        return StringTable()
+
+    with open(file_path, "rb") as f:
+        return pkl.load(f)
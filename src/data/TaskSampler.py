@@ -0,0 +1,130 @@
+"""Class to sample tasks according to weights that change during an epoch"""
+import numpy as np
+
+
+class TaskSampler(object):
+    def __init__(self, weights):
+        """
+        Initialize the sampler. The weights are stored in a binary indexed (Fenwick) tree so that drawing a task and
+        changing the weight of a task both take O(log T) steps for T tasks.
+
+        Args:
+            weights (`list` of float): Non-negative (unnormalized) weight of each task. Tasks with weight 0 are never
+                drawn.
+        """
+        assert all([weight >= 0 for weight in weights])
+
+        self._weights = [float(weight) for weight in weights]
+        self._num_positive = len([weight for weight in self._weights if weight > 0])
+        self._tree = [0.0] * (len(weights) + 1)
+
+        # Build the tree in O(T)
+        for idx, weight in enumerate(self._weights):
+            node = idx + 1
+            self._tree[node] += weight
+            parent = node + (node & -node)
+            if parent <= len(self._weights):
+                self._tree[parent] += self._tree[node]
+
+        # Largest power of two that is not larger than the number of tasks
+        self._top = 1
+        while self._top * 2 <= len(self._weights):
+            self._top *= 2
+
+    def __len__(self):
+        return len(self._weights)
+
+    @property
+    def num_positive(self):
+        """
+        Returns:
+            int: Number of tasks with a weight larger than 0
+        """
+        return self._num_positive
+
+    @property
+    def total(self):
+        """
+        Returns:
+            float: Sum of all weights
+        """
+        return self._prefix_sum(len(self._weights))
+
+    def get_weight(self, idx):
+        """
+        Args:
+            idx (int): Index of the task
+
+        Returns:
+            float: Weight of the task
+        """
+        return self._weights[idx]
+
+    def set_weight(self, idx, weight):
+        """
+        Change the weight of a task.
+
+        Args:
+            idx (int): Index of the task
+            weight (float): New non-negative weight
+
+        Returns:
+            None
+        """
+        assert weight >= 0
+
+        delta = float(weight) - self._weights[idx]
+        self._num_positive += int(weight > 0) - int(self._weights[idx] > 0)
+        self._weights[idx] = float(weight)
+
+        node = idx + 1
+        while node <= len(self._weights):
+            self._tree[node] += delta
+            node += node & -node
+
+    def sample(self):
+        """
+        Draw a task with a probability proportional to its weight.
+
+        Returns:
+            int: Index of the task
+        """
+        if self._num_positive == 0:
+            raise ValueError("Cannot sample from tasks that all have weight 0")
+
+        value = np.random.random_sample() * self.total
+
+        # Descend the tree to the first task whose cumulative weight exceeds the value
+        node = 0
+        step = self._top
+        while step > 0:
+            child = node + step
+            if child <= len(self._weights) and self._tree[child] <= value:
+                node = child
+                value -= self._tree[child]
+            step //= 2
+
+        # Rounding errors might lead to a task with weight 0 (or past the last task), use the closest task instead
+        idx = min(node, len(self._weights) - 1)
+        while self._weights[idx] <= 0 and idx > 0:
+            idx -= 1
+        while self._weights[idx] <= 0:
+            idx += 1
+
+        return idx
+
+    def _prefix_sum(self, count):
+        """
+        Args:
+            count (int): Number of tasks
+
+        Returns:
+            float: Sum of the weights of the first `count` tasks
+        """
+        result = 0.0
+        node = count
+        while node > 0:
+            result += self._tree[node]
+            node -= node & -node
+
+        return result
@@ -0,0 +1,68 @@
+"""Background prefetching of items from an iterator"""
+import sys
+import threading
+from Queue import Queue, Full
+
+
+# Marks the end of the iterator in the queue
+_END = object()
+
+
+def prefetch(iterable, depth):
+    """
+    Consume an iterable in a background thread and keep up to `depth` of its items ready in a bounded queue.
+    This allows to prepare the next items (e.g. the `feed_dict` of the next batches) while the current item is
+    processed (e.g. by `sess.run`, which releases the GIL).
+
+    Exceptions raised by the iterable are re-raised in the consuming thread. If the consumer stops early, the
+    background thread stops as well.
+
+    Args:
+        iterable (iterable): Items to prefetch. The iterable is only consumed by the background thread.
+        depth (int): Maximum number of prefetched items
+
+    Returns:
+        generator: A generator of the items of `iterable` (in the same order)
+    """
+    assert depth > 0
+
+    queue = Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(item):
+        # Time out regularly so that the thread notices if the consumer stopped
+        while not stop.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                continue
+
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+            put((_END, None))
+        except Exception:
+            put((_END, sys.exc_info()))
+
+    thread = threading.Thread(target=produce, name="prefetch")
+    thread.daemon = True
+    thread.start()
+
+    try:
+        while True:
+            item, exc_info = queue.get()
+
+            if item is _END:
+                if exc_info is not None:
+                    raise exc_info[0], exc_info[1], exc_info[2]
+                return
+
+            yield item
+    finally:
+        stop.set()
+        thread.join(1.0)
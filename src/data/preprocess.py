@@ -1,10 +1,12 @@
 """Data preprocessing methods"""
 import re
+import zlib
 
 import numpy as np
 
 from config import EmbeddingsConfig
-from constants import TOKEN_DATE, TOKEN_NUMBER, TOKEN_TIME
+from constants import TOKEN_DATE, TOKEN_NUMBER, TOKEN_TIME, TOKEN_UNKNOWN, TOKEN_LOOKUP_SUFFIXES, TOKEN_PADDING, \
+    TOKEN_OOV_BUCKET
 
 
 def word_normalize(word):
@@ -27,6 +29,175 @@ def word_normalize(word):
     return word
 
 
+def lookup_candidates(word, suffixes=TOKEN_LOOKUP_SUFFIXES):
+    """
+    Get all forms of a word that are looked up in a word-to-index mapping, in the order in which they are tried:
+    the word itself, the lower-cased word, and the normalized word (see `word_normalize`), each with every suffix.
+    The suffixes allow to look up words in bilingual embeddings (e.g. "house_en").
+
+    Args:
+        word (str): Word (surface form)
+        suffixes (`list` of str): Suffixes in the order in which they are tried. The empty suffix "" stands for
+            the plain forms.
+
+    Returns:
+        `list` of str: Lookup candidates
+    """
+    # Normalize only once, `word_normalize` applies six regular expressions.
+    forms = [word, word.lower(), word_normalize(word)]
+    return [form + suffix for suffix in suffixes for form in forms]
+
+
+def oov_bucket_tokens(num_oov_buckets):
+    """
+    Get the tokens of the buckets that out-of-vocabulary words are hashed into.
+
+    Args:
+        num_oov_buckets (int): Number of buckets
+
+    Returns:
+        `list` of str: Bucket tokens
+    """
+    return [TOKEN_OOV_BUCKET % bucket for bucket in xrange(num_oov_buckets)]
+
+
+def count_oov_buckets(word2idx):
+    """
+    Determine the number of out-of-vocabulary buckets that are contained in a word-to-index mapping.
+
+    Args:
+        word2idx (`dict` of int): Mapping from words to indices
+
+    Returns:
+        int: Number of buckets
+    """
+    num_oov_buckets = 0
+    while TOKEN_OOV_BUCKET % num_oov_buckets in word2idx:
+        num_oov_buckets += 1
+
+    return num_oov_buckets
+
+
+def oov_bucket(word, num_oov_buckets):
+    """
+    Hash a word into one of the out-of-vocabulary buckets.
+    Uses CRC32 instead of `hash` so that the bucket of a word is the same on every platform and in every run.
+
+    Args:
+        word (str or unicode): Word (surface form)
+        num_oov_buckets (int): Number of buckets
+
+    Returns:
+        str: Token of the bucket
+    """
+    if isinstance(word, unicode):
+        word = word.encode("utf-8")
+
+    return TOKEN_OOV_BUCKET % ((zlib.crc32(word) & 0xffffffff) % num_oov_buckets)
+
+
+def select_vocabulary(word_counts, max_vocab_size):
+    """
+    Select the most frequent words. Ties are broken alphabetically so that the selection is deterministic.
+
+    Args:
+        word_counts (`dict` of int): Frequency of each word
+        max_vocab_size (int): Maximum number of words to select
+
+    Returns:
+        `list` of str: The most frequent words, most frequent first
+    """
+    ranked = sorted(word_counts.items(), key=lambda item: (-item[1], item[0]))
+    return [word for word, _ in ranked[:max_vocab_size]]
+
+
+def resolve_token(word, word2idx, suffixes=TOKEN_LOOKUP_SUFFIXES, num_oov_buckets=0):
+    """
+    Determine the index of a word by trying all lookup candidates (see `lookup_candidates`) in order.
+
+    Args:
+        word (str): Word (surface form)
+        word2idx (`dict` of int): Mapping from words to indices. Has to contain the unknown token and the
+            out-of-vocabulary buckets.
+        suffixes (`list` of str): Suffixes in the order in which they are tried.
+        num_oov_buckets (int, optional): Number of buckets that out-of-vocabulary words are hashed into. If 0, they are
+            mapped to the unknown token.
+
+    Returns:
+        int: Index of the first candidate that is contained in `word2idx`, otherwise the index of the word's bucket or
+            of the unknown token.
+    """
+    if word in word2idx:
+        return word2idx[word]
+
+    for candidate in lookup_candidates(word, suffixes):
+        if candidate in word2idx:
+            return word2idx[candidate]
+
+    if num_oov_buckets > 0:
+        return word2idx[oov_bucket(word, num_oov_buckets)]
+
+    return word2idx[TOKEN_UNKNOWN]
+
+
+def build_token_resolution_table(words, word2idx, suffixes=TOKEN_LOOKUP_SUFFIXES, num_oov_buckets=0):
+    """
+    Precompile a mapping from surface forms to their final indices so that indexing a corpus only needs a single
+    dictionary lookup per token instead of trying all lookup candidates for each token.
+
+    Args:
+        words (iterable of str): All unique surface forms of the corpus
+        word2idx (`dict` of int): Mapping from words to indices. Has to contain the unknown token and the
+            out-of-vocabulary buckets.
+        suffixes (`list` of str): Suffixes in the order in which they are tried.
+        num_oov_buckets (int, optional): Number of buckets that out-of-vocabulary words are hashed into.
+
+    Returns:
+        `dict` of int: Mapping from surface forms to indices. Also maps the entries of `word2idx` to themselves.
+    """
+    token2idx = dict(word2idx)
+
+    for word in words:
+        if word not in token2idx:
+            token2idx[word] = resolve_token(word, word2idx, suffixes, num_oov_buckets)
+
+    return token2idx
+
+
+def build_character_matrix(words, char2idx, max_word_length=None):
+    """
+    Represent every word (type) by its character indices.
+    Row 0 of the matrix is reserved for padding, i.e. it contains only padding characters and has length 0.
+
+    Args:
+        words (iterable of str): All unique surface forms
+        char2idx (`dict` of int): Mapping from characters to indices. Has to contain the padding token.
+        max_word_length (int, optional): Words are cropped to this number of characters. The matrix is only as wide
+            as the longest (cropped) word, i.e. a few very long words do not widen the rows of all other words.
+
+    Returns:
+        `tuple` of (`dict` of int, np.ndarray, np.ndarray): A mapping from surface forms to rows of the matrix, the
+            character matrix with shape (number of words + 1, length of the longest cropped word) which is padded from
+            the right, and the (cropped) length of each word.
+    """
+    words = list(words)
+    width = max([len(word) for word in words]) if len(words) > 0 else 0
+    if max_word_length is not None:
+        width = min(width, max_word_length)
+
+    form2idx = {}
+    char_matrix = np.full((len(words) + 1, width), char2idx[TOKEN_PADDING], dtype=np.int32)
+    char_lengths = np.zeros(len(words) + 1, dtype=np.int32)
+
+    for idx, word in enumerate(words, 1):
+        form2idx[word] = idx
+        chars = word[:width]
+        char_matrix[idx, :len(chars)] = [char2idx[char] for char in chars]
+        char_lengths[idx] = len(chars)
+
+    return form2idx, char_matrix, char_lengths
+
+
 def merge_embeddings(embedding_configurations):
     """
     Merge multiple embeddings with each other.
@@ -42,15 +213,13 @@ def merge_embeddings(embedding_configurations):
     if len(embedding_configurations) == 1:
         return embedding_configurations[0].vectors
 
-    all_words = set()
-
-    for config in embedding_configurations:
-        all_words.update(set(config.vectors.keys()))
+    # Only words that are contained in all embeddings are merged, so it suffices to check the words of the smallest one
+    smallest = min(embedding_configurations, key=lambda config: len(config.vectors))
 
     vectors = {}
 
     # Concatenate vectors for all words that are contained in all embeddings
-    for word in all_words:
+    for word in smallest.vectors.keys():
         if all([word in config.vectors for config in embedding_configurations]):
             vectors[word] = np.concatenate(tuple(config.vectors[word] for config in embedding_configurations))
 
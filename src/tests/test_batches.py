@@ -0,0 +1,182 @@
+"""Tests for the batching helpers and `Batches.reshuffle`"""
+import unittest
+
+import numpy as np
+
+from data.BatchGroup import BatchGroup
+from data.Batches import Batches, find_joint_task_groups, find_max_sentences_per_batch, get_group_positions, \
+    iterate_mixed_batches, pad_rows
+
+
+class Options(object):
+    """Plain object with the attributes that the tested functions read from a configuration"""
+
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+def create_task(name, path, word_column=0, column_separator=" ", encoding="utf8"):
+    train_file = Options(path=path, word_column=word_column, column_separator=column_separator, encoding=encoding)
+    return Options(name=name, train_file=train_file)
+
+
+def create_group(lengths, sample_ids, word_lengths=None):
+    width = max(lengths)
+    labels = np.zeros((len(lengths), width), dtype=np.int32)
+    tokens = np.zeros((len(lengths), width), dtype=np.int32)
+    for row, length in enumerate(lengths):
+        tokens[row, :length] = sample_ids[row]
+
+    characters = None
+    if word_lengths is not None:
+        characters = np.zeros(word_lengths.shape + (int(word_lengths.max()),), dtype=np.int32)
+
+    return BatchGroup(labels, tokens, sample_ids, lengths, characters, word_lengths)
+
+
+def create_batches(groups, batch_ranges, config=None):
+    batches = Batches.__new__(Batches)
+    batches._groups = groups
+    batches._batch_ranges = batch_ranges
+    batches._joint_tasks = {}
+    batches._joint_leaders = {}
+    batches._config = config
+    batches._data_type = "train"
+    return batches
+
+
+class PadRowsTest(unittest.TestCase):
+    def test_pad_rows(self):
+        matrix = pad_rows([[1, 2], [3], np.asarray([4, 5, 6])], padding=-1)
+
+        self.assertEqual(matrix.dtype, np.int32)
+        self.assertEqual(matrix.tolist(), [[1, 2, -1], [3, -1, -1], [4, 5, 6]])
+
+    def test_pad_no_rows(self):
+        self.assertEqual(pad_rows([]).shape, (0, 0))
+
+
+class GroupPositionsTest(unittest.TestCase):
+    def test_group_positions(self):
+        positions = get_group_positions([3, 0, 2, 1], [(0, 1), (1, 4)])
+
+        self.assertEqual(positions.tolist(), [[1, 0], [1, 2], [1, 1], [0, 0]])
+
+
+class MaxSentencesPerBatchTest(unittest.TestCase):
+    def test_without_budget(self):
+        config = Options(batch_size=32, max_tokens_per_batch=None, max_characters_per_batch=None)
+
+        self.assertEqual(find_max_sentences_per_batch(config, 50), 32)
+
+    def test_token_budget(self):
+        config = Options(batch_size=32, max_tokens_per_batch=100, max_characters_per_batch=None)
+
+        self.assertEqual(find_max_sentences_per_batch(config, 30), 3)
+        # A batch always contains at least one sentence
+        self.assertEqual(find_max_sentences_per_batch(config, 300), 1)
+
+    def test_character_budget(self):
+        config = Options(batch_size=32, max_tokens_per_batch=100, max_characters_per_batch=200)
+
+        self.assertEqual(find_max_sentences_per_batch(config, 10, 5), 4)
+        # Without a word length, only the token budget applies
+        self.assertEqual(find_max_sentences_per_batch(config, 10), 10)
+
+    def test_character_budget_without_word_length(self):
+        config = Options(batch_size=32, max_tokens_per_batch=None, max_characters_per_batch=200)
+
+        self.assertEqual(find_max_sentences_per_batch(config, 10), 32)
+
+
+class JointTaskGroupsTest(unittest.TestCase):
+    def test_groups_tasks_with_the_same_sentences(self):
+        config = Options(tasks=[
+            create_task("pos", "train.conll"),
+            create_task("ner", "other.conll"),
+            create_task("chunk", "train.conll"),
+            create_task("lemma", "train.conll", word_column=1),
+            create_task("morph", "./train.conll"),
+        ])
+
+        self.assertEqual(find_joint_task_groups(config), [["pos", "chunk", "morph"]])
+
+    def test_no_groups(self):
+        config = Options(tasks=[create_task("pos", "train.conll"), create_task("ner", "train.conll", encoding="latin1")])
+
+        self.assertEqual(find_joint_task_groups(config), [])
+
+
+class MixedBatchesTest(unittest.TestCase):
+    def test_mixed_batches_hold_one_batch_per_task(self):
+        batches = [("a", 1), ("b", 2), ("a", 3), ("c", 4), ("b", 5), ("b", 6)]
+
+        self.assertEqual(
+            list(iterate_mixed_batches(iter(batches))),
+            [[("a", 1), ("b", 2)], [("a", 3), ("c", 4), ("b", 5)], [("b", 6)]]
+        )
+
+    def test_no_batches(self):
+        self.assertEqual(list(iterate_mixed_batches(iter([]))), [])
+
+
+class ReshuffleTest(unittest.TestCase):
+    def setUp(self):
+        self.groups = {
+            "task": [
+                create_group([2, 2, 2, 2], [10, 11, 12, 13]),
+                create_group([3, 2, 3], [20, 21, 22]),
+            ]
+        }
+        self.batch_ranges = {"task": [(0, 0, 2), (0, 2, 4), (1, 0, 3)]}
+
+    def get_batch_ids(self, batches):
+        return [batch.samples.ids.tolist() for _, batch in batches.iterate_tasks()]
+
+    def test_reshuffle_keeps_sentences_and_batch_sizes(self):
+        batches = create_batches(self.groups, self.batch_ranges)
+        labels = [group.labels for group in self.groups["task"]]
+
+        batches.reshuffle(1)
+        batch_ids = self.get_batch_ids(batches)
+
+        self.assertEqual(sorted([len(ids) for ids in batch_ids]), [2, 2, 3])
+        self.assertEqual(sorted(sum(batch_ids, [])), [10, 11, 12, 13, 20, 21, 22])
+        # The matrices of the groups are not copied
+        self.assertTrue(all([group.labels is matrix for group, matrix in zip(self.groups["task"], labels)]))
+
+    def test_reshuffle_gathers_the_rows_of_the_batches(self):
+        batches = create_batches(self.groups, self.batch_ranges)
+
+        batches.reshuffle(3)
+
+        for _, batch in batches.iterate_tasks():
+            self.assertEqual(batch.tokens[:, 0].tolist(), batch.samples.ids.tolist())
+            self.assertEqual(batch.tokens.shape[1], batch.sequence_lengths.max())
+
+    def test_reshuffle_is_reproducible(self):
+        first = create_batches(self.groups, dict(self.batch_ranges))
+        first.reshuffle(7)
+        first_ids = self.get_batch_ids(first)
+
+        second = create_batches(
+            {"task": [create_group([2, 2, 2, 2], [10, 11, 12, 13]), create_group([3, 2, 3], [20, 21, 22])]},
+            dict(self.batch_ranges)
+        )
+        second.reshuffle(7)
+
+        self.assertEqual(self.get_batch_ids(second), first_ids)
+
+    def test_reshuffle_groups_by_word_length(self):
+        word_lengths = np.asarray([[5, 1], [2, 2], [7, 3], [1, 1]], dtype=np.int32)
+        groups = {"task": [create_group([2, 2, 2, 2], [0, 1, 2, 3], word_lengths)]}
+        config = Options(character_level_information=Options(group_by_word_length=True))
+        batches = create_batches(groups, {"task": [(0, 0, 4)]}, config)
+
+        batches.reshuffle(5)
+
+        self.assertEqual(self.get_batch_ids(batches), [[3, 1, 0, 2]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+"""Tests for `TaskSampler`"""
+import unittest
+
+import numpy as np
+
+from data.TaskSampler import TaskSampler
+
+
+class TaskSamplerTest(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(0)
+
+    def test_total_and_weights(self):
+        sampler = TaskSampler([1.0, 0.0, 3.0, 2.0])
+
+        self.assertEqual(len(sampler), 4)
+        self.assertAlmostEqual(sampler.total, 6.0)
+        self.assertEqual(sampler.num_positive, 3)
+        self.assertEqual([sampler.get_weight(idx) for idx in range(4)], [1.0, 0.0, 3.0, 2.0])
+
+    def test_set_weight(self):
+        sampler = TaskSampler([1.0, 2.0, 3.0])
+
+        sampler.set_weight(1, 0.0)
+        self.assertAlmostEqual(sampler.total, 4.0)
+        self.assertEqual(sampler.num_positive, 2)
+
+        sampler.set_weight(1, 5.0)
+        self.assertAlmostEqual(sampler.total, 9.0)
+        self.assertEqual(sampler.num_positive, 3)
+
+    def test_sample_skips_tasks_with_weight_zero(self):
+        sampler = TaskSampler([0.0, 1.0, 0.0, 1.0, 0.0])
+
+        drawn = set([sampler.sample() for _ in range(1000)])
+
+        self.assertEqual(drawn, set([1, 3]))
+
+    def test_sample_is_proportional_to_weights(self):
+        sampler = TaskSampler([1.0, 3.0])
+
+        counts = np.bincount([sampler.sample() for _ in range(20000)], minlength=2)
+
+        self.assertAlmostEqual(counts[1] / float(counts.sum()), 0.75, delta=0.02)
+
+    def test_sample_single_task(self):
+        sampler = TaskSampler([2.0])
+
+        self.assertEqual(sampler.sample(), 0)
+
+    def test_sample_without_positive_weights(self):
+        sampler = TaskSampler([1.0, 1.0])
+        sampler.set_weight(0, 0.0)
+        sampler.set_weight(1, 0.0)
+
+        self.assertRaises(ValueError, sampler.sample)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -19,7 +19,7 @@ from config.ExperimentConfig import ExperimentConfig
 from constants import ALIGNMENT_STRATEGY_RANDOM_SAMPLE, ALIGNMENT_STRATEGY_CROP, DIR_MODEL_WEIGHTS, DIR_PREDICTION_OUT, DIR_TENSOR_BOARD, \
     DIR_RUN, DIR_BATCHES_OUT
 from constants import DIR_OUT, DIR_SRC, DIR_DATA
-from constants import DIR_PKL
+from constants import DIR_PKL, DIR_EMBEDDINGS_CACHE, DIR_BATCHES_CACHE
 
 
 def swap_dict(input_dict):
@@ -215,6 +215,10 @@ def setup(path_to_config, num_runs=None, log_level=logging.DEBUG):
     } for idx in range(num_runs)}
 
     pkl_path = os.path.join(parent, DIR_PKL, config.name)
+    # The embeddings cache does not depend on the experiment and is shared by all of them
+    embeddings_cache_path = os.path.join(parent, DIR_PKL, DIR_EMBEDDINGS_CACHE)
+    # Batches are cached by their content, i.e. they are shared by all runs, sessions, and experiments as well
+    batches_cache_path = os.path.join(parent, DIR_PKL, DIR_BATCHES_CACHE)
     src_path = os.path.join(parent, DIR_SRC)
     data_path = os.path.join(parent, DIR_DATA)
 
@@ -223,6 +227,8 @@ def setup(path_to_config, num_runs=None, log_level=logging.DEBUG):
         "experiment_out": experiment_out_path,
         "session_out": session_out_path,
         "pkl": pkl_path,
+        "embeddings_cache": embeddings_cache_path,
+        "batches_cache": batches_cache_path,
         "src": src_path,
         "data": data_path,
         "runs": run_out_paths
@@ -231,6 +237,8 @@ def setup(path_to_config, num_runs=None, log_level=logging.DEBUG):
     # Create experiment-specific folders
     mkpath(out_path)
     mkpath(pkl_path)
+    mkpath(embeddings_cache_path)
+    mkpath(batches_cache_path)
     for path_dict in run_out_paths.values():
         for path in path_dict.values():
             mkpath(path)